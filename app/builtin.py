@@ -1,18 +1,59 @@
 import sys
 import app.file_utils as file_utils
+import app.jobs as jobs
+import app.journal as journal
+import app.search as search
+import app.streams as streams
+import app.variables as variables
 import os
 import readline
 
 PREVLEN = 0 # for -a flag. history -a should append only new commands
+CURRENT = 0 # history number of the running line (set by main), history -s leaves it out
 
-def history(args: list[str]) -> None:
+# Number of loops around the running command (maintained by executor.py),
+# break and continue outside of loops do nothing
+LOOP_DEPTH = 0
+
+
+class LoopControl(Exception):
+    """
+        Raised by break and continue, caught by the enclosing loop. With
+        count > 1 the loop decrements it and passes it to the outer one
+    """
+
+    def __init__(self, kind: str, count: int):
+        super().__init__(kind)
+        self.kind = kind
+        self.count = count
+
+
+def isJournal(fileName: str) -> bool:
+    """
+        True if fileName is $HISTFILE, which gets every command appended anyway
+    """
+
+    if journal.JOURNAL is None:
+        return False
+
+    try:
+        return os.path.samefile(fileName, journal.JOURNAL.path)
+    except OSError:
+        return False
+
+
+def history(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
     """
         Prints out history of commands
 
-        Use "history {num}" to limit history entries
+        Use "history {num}" to limit history entries,
+        "history -s [-f] PATTERN" to find entries containing PATTERN
+        (-f: fuzzy match, tolerates typos)
 
         ARGS:
             args: list[str] - list of arguments
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
     """
     global PREVLEN
 
@@ -22,46 +63,50 @@ def history(args: list[str]) -> None:
         if args[0].isdigit():
             num = int(args[0])
 
-            for i in range(length + 1 - num, length + 1):
-                cmd = readline.get_history_item(i)
+            out.write("".join(f"{i:5} {readline.get_history_item(i)}\n"
+                              for i in range(max(1, length + 1 - num), length + 1)))
+        elif args[0] == "-s":
+            fuzzy = args[1:2] == ["-f"]
+            pattern = " ".join(args[2:] if fuzzy else args[1:])
 
-                sys.stdout.write(f"{i:5} {cmd}\n")
-                sys.stdout.flush()
-        elif args[0] == "-r":
-            try:
-                historyFileName = args[1]
-            except:
-                historyFileName = "./history"
+            if not pattern:
+                err.write("history: -s: pattern expected\n")
+                return 2
 
-            readline.read_history_file(historyFileName)
-        elif args[0] == "-w":
-            try:
-                historyFileName = args[1]
-            except:
-                historyFileName = "./history"
+            matches = search.INDEX.search(pattern, fuzzy, skip=CURRENT)
 
-            readline.write_history_file(historyFileName)
-        elif args[0] == "-a":
+            out.write("".join(f"{i:5} {cmd}\n" for (i, cmd) in matches))
+        elif args[0] in ("-r", "-w", "-a"):
             try:
                 historyFileName = args[1]
             except:
                 historyFileName = "./history"
 
-            # Create file if it does not exists
-            fd = os.open(historyFileName, os.O_CREAT)
-            os.close(fd)
+            historyFile = journal.Journal(historyFileName)
 
-            readline.append_history_file(length-PREVLEN, historyFileName)
-            PREVLEN = length
+            try:
+                if args[0] == "-r":
+                    for cmd in historyFile.tail(journal.limit("HISTSIZE")):
+                        readline.add_history(cmd)
+                elif args[0] == "-w":
+                    historyFile.rewrite([readline.get_history_item(i) for i in range(1, length + 1)])
+                else:
+                    # commands are appended to $HISTFILE as they run, only other files need it
+                    if not isJournal(historyFileName):
+                        # create file even if there's nothing to append
+                        os.close(os.open(historyFileName, os.O_CREAT, 0o600))
+                        historyFile.extend([readline.get_history_item(i) for i in range(PREVLEN + 1, length + 1)])
+
+                    PREVLEN = length
+            except OSError as e:
+                # a directory, a missing directory, no permission
+                err.write(f"history: {historyFileName}: {e.strerror}\n")
+                return 1
     else:
-        for i in range(1, length + 1):
-            cmd = readline.get_history_item(i)
+        out.write("".join(f"{i:5} {readline.get_history_item(i)}\n" for i in range(1, length + 1)))
 
-            sys.stdout.write(f"{i:5} {cmd}\n")
-            sys.stdout.flush()
 
-
-def _exit(args: list[str]) -> None:
+def _exit(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
 
     if not args:
         sys.exit(0)
@@ -71,26 +116,29 @@ def _exit(args: list[str]) -> None:
         sys.exit(exitCode)
 
 
-def _pwd(args: list[str]) -> None:
+def _pwd(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
     """
         Prints current working directory
 
         ARGS:
             args: list[str] - for compatability
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
     """
 
     output, error = os.getcwd(), ""
 
-    sys.stdout.write(output + "\n")
-    sys.stdout.flush()
+    out.write(output + "\n")
 
 
-def _cd(args: list[str]) -> None:
+def _cd(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
     """
         Changes current directory
 
         ARGS:
             args: list[str] - relative path to the current directory or empty list
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
     """
     if not args or args[0] == "~":
         dirName = os.environ.get("HOME", "/")
@@ -99,35 +147,36 @@ def _cd(args: list[str]) -> None:
 
     try:
         os.chdir(dirName)
-        sys.stdout.write('')
-        sys.stdout.flush()
     except:
         error = f"cd: {dirName}: No such file or directory\n"
-        sys.stderr.write(error)
-        sys.stderr.flush()
+        err.write(error)
+        return 1
 
 
-def echo(args: list[str]) -> None:
+def echo(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
     """
         Prints its arguments into stdout
 
         ARGS:
             args: list[str] - strings to print
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
     """
 
     output = ' '.join(args)
 
-    sys.stdout.write(output + '\n')
-    sys.stdout.flush()
+    out.write(output + '\n')
 
 
-def _type(args: list[str]) -> None:
+def _type(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
     """
         Prints type of a program, i.e. if it is a builtin one or can be found
         in one of the directory specified in PATH variable
 
         ARGS:
             args: list[str] - list of arguments. Here, it is list of lenth 1 with command name
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
     """
 
     commandName = args[0]
@@ -136,17 +185,211 @@ def _type(args: list[str]) -> None:
 
     if commandName in BUILTINS:
         output = f"{commandName} is a shell builtin\n"
-        sys.stdout.write(output)
-        sys.stdout.flush()
-    elif commandName in file_utils.EXECUTABLES:
-        fullPath = file_utils.EXECUTABLES[commandName]
+        out.write(output)
+    elif (fullPath := file_utils.locate(commandName, hit=False)) is not None:
         output = f"{commandName} is {fullPath}\n"
-        sys.stdout.write(output)
-        sys.stdout.flush()
+        out.write(output)
     else:
         error = f"{commandName}: not found\n"
-        sys.stderr.write(error)
-        sys.stderr.flush()
+        err.write(error)
+        return 1
+
+def _jobs(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    """
+        Lists background jobs. Finished jobs are listed once and forgotten
+
+        ARGS:
+            args: list[str] - for compatability
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
+    """
+
+    listed = list(jobs.JOBS.values())
+
+    for job in listed:
+        if job.state != "Done":
+            jobs.refreshStopped(job)
+
+    out.write("".join(jobs.formatJob(job) for job in listed))
+
+    for job in listed:
+        if job.state == "Done":
+            jobs.remove(job)
+
+
+def _fg(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    """
+        Continues job in foreground: "fg", "fg %2"
+
+        ARGS:
+            args: list[str] - optional job spec
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
+    """
+
+    if (job := jobs.find(args[0] if args else None)) is None:
+        err.write(f"fg: {args[0] if args else 'current'}: no such job\n")
+        return 1
+
+    # shown before the job takes over the terminal
+    out.write(job.text + "\n")
+    out.flush()
+
+    return jobs.foreground(job)
+
+
+def _bg(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    """
+        Continues stopped job in background: "bg", "bg %2"
+
+        ARGS:
+            args: list[str] - optional job spec
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
+    """
+
+    if (job := jobs.find(args[0] if args else None)) is None:
+        err.write(f"bg: {args[0] if args else 'current'}: no such job\n")
+        return 1
+
+    if job.state == "Running":
+        err.write(f"bg: job {job.id} already in background\n")
+        return 0
+
+    jobs.background(job)
+
+    out.write(f"[{job.id}]{jobs.mark(job)} {job.text} &\n")
+
+
+def _wait(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    """
+        Waits for background jobs: all of them or the ones given as %n or pid
+
+        ARGS:
+            args: list[str] - job specs
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
+    """
+
+    if not args:
+        for job in list(jobs.JOBS.values()):
+            jobs.wait(job)
+        return 0
+
+    status = 0
+
+    for spec in args:
+        if (job := jobs.find(spec)) is None:
+            err.write(f"wait: {spec}: no such job\n")
+            status = 127
+        else:
+            status = jobs.wait(job)
+
+    return status
+
+
+def export(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    """
+        Exports variables to the environment of commands: "export NAME=value", "export NAME".
+        Without arguments lists exported variables
+
+        ARGS:
+            args: list[str] - NAME or NAME=value words
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
+    """
+
+    if not args:
+        out.write("".join(f'declare -x {name}="{value}"\n' for (name, value) in sorted(os.environ.items())))
+        return 0
+
+    status = 0
+
+    for arg in args:
+        name, eq, value = arg.partition('=')
+
+        if not variables.ASSIGNMENT.match(name + '='):
+            err.write(f"export: `{arg}': not a valid identifier\n")
+            status = 1
+            continue
+
+        variables.export(name, value if eq else None)
+
+    return status
+
+
+def _hash(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    """
+        Shows remembered locations of commands and their hits: "hash".
+        "hash -r" forgets them, "hash name" looks name up and remembers it
+
+        ARGS:
+            args: list[str] - "-r" or command names
+            out: OutputStream - stream for the output
+            err: OutputStream - stream for error messages
+    """
+
+    if not args:
+        if not file_utils.HASHED:
+            err.write("hash: hash table empty\n")
+            return 0
+
+        out.write("hits\tcommand\n")
+        out.write("".join(f"{hits:4}\t{fullPath}\n" for (fullPath, hits) in file_utils.HASHED.values()))
+        return 0
+
+    if args[0] == "-r":
+        file_utils.HASHED.clear()
+        args = args[1:]
+
+    status = 0
+
+    for name in args:
+        if name in BUILTINS:
+            continue
+
+        if file_utils.locate(name, hit=False) is None:
+            err.write(f"hash: {name}: not found\n")
+            status = 1
+
+    return status
+
+
+def _true(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    return 0
+
+
+def _false(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    return 1
+
+
+def loopControl(kind: str, args: list[str], err: streams.OutputStream) -> int:
+    """
+        Leaves (break) or restarts (continue) the n-th enclosing loop
+
+        RAISES:
+            LoopControl - caught by the loop
+    """
+
+    count = args[0] if args else "1"
+
+    if not count.isdigit() or int(count) < 1:
+        err.write(f"{kind}: {count}: loop count out of range\n")
+        return 1
+
+    if LOOP_DEPTH == 0:
+        return 0
+
+    raise LoopControl(kind, min(int(count), LOOP_DEPTH))
+
+
+def _break(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    return loopControl("break", args, err)
+
+
+def _continue(args: list[str], out: streams.OutputStream, err: streams.OutputStream) -> int | None:
+    return loopControl("continue", args, err)
+
 
 BUILTINS = {
         "exit": _exit,
@@ -154,5 +397,16 @@ BUILTINS = {
         "type": _type,
         "pwd": _pwd,
         "cd": _cd,
-        "history": history
+        "history": history,
+        "jobs": _jobs,
+        "fg": _fg,
+        "bg": _bg,
+        "wait": _wait,
+        "export": export,
+        "hash": _hash,
+        "true": _true,
+        "false": _false,
+        ":": _true,
+        "break": _break,
+        "continue": _continue
         }
@@ -0,0 +1,395 @@
+import os
+import sys
+import fcntl
+import time
+import signal
+import resource
+import contextlib
+
+import app.parser as parser
+import app.syntax as syntax
+import app.pipes as pipes
+import app.launcher as launcher
+import app.redirects as redirects
+import app.expansion as expansion
+import app.variables as variables
+import app.timing as timing
+import app.jobs as jobs
+import app.builtin as builtin
+import app.trace as trace
+
+# Walks trees of syntax.parse. Everything runs in the shell process but
+# ( ... ) subshells, compound commands inside of pipelines and compound
+# commands sent to background: those need a copy of the shell, so they fork.
+# Simple pipelines go to pipes.runMultipleProc as before. Loops walk the
+# same cached tree on every iteration, only words are expanded anew, so a
+# loop of builtins neither forks nor parses
+
+
+# compound commands run in the shell itself when they are alone in a pipeline
+COMPOUND = (syntax.Group, syntax.If, syntax.For, syntax.While)
+
+
+def run(tree: syntax.CommandList) -> int:
+    """
+        Runs a list: and-or lists one after another, "&" ones in background
+
+        RETURNS:
+            status: int - exit status of the last and-or list
+    """
+
+    status = variables.LAST_STATUS
+
+    for andOr, background in tree.items:
+        if background:
+            runBackground(andOr)
+            status = 0
+        else:
+            status = runAndOr(andOr)
+
+    return status
+
+
+def runAndOr(andOr: syntax.AndOr) -> int:
+    """
+        Runs pipelines of a && / || chain, skipping those the status rules out
+    """
+
+    status = runPipeline(andOr.pipelines[0])
+
+    for op, pipeline in zip(andOr.ops, andOr.pipelines[1:]):
+        if (status == 0) == (op == "&&"):
+            status = runPipeline(pipeline)
+
+    return status
+
+
+def runPipeline(pipeline: syntax.Pipeline) -> int:
+    if not pipeline.commands:
+        # "time" alone
+        sys.stderr.write(timing.report([], pipes.Pipeline(0), 0.0))
+        sys.stderr.flush()
+        return 0
+
+    first = pipeline.commands[0]
+
+    if len(pipeline.commands) == 1 and isinstance(first, COMPOUND):
+        status = runTimed(first) if pipeline.timed else runCompound(first)
+    else:
+        # subshells and compound stages are forked by pipes.startPipeline
+        status = pipes.runMultipleProc(pipeline.commands, pipeline.timed)
+
+    if pipeline.negated:
+        status = int(status == 0)
+        variables.LAST_STATUS = status
+
+    return status
+
+
+def runTimed(node) -> int:
+    """
+        "time" of a compound command run in the shell: CPU times are those
+        of the shell's thread and of the children reaped meanwhile
+    """
+
+    stats = pipes.Pipeline(1, timed=True)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    user, system = timing.threadTimes()
+    stats.started[0] = time.monotonic_ns()
+
+    status = runCompound(node)
+
+    stats.ended[0] = time.monotonic_ns()
+    endUser, endSystem = timing.threadTimes()
+    endChildren = resource.getrusage(resource.RUSAGE_CHILDREN)
+    stats.times[0] = (endUser - user + endChildren.ru_utime - children.ru_utime,
+                      endSystem - system + endChildren.ru_stime - children.ru_stime)
+
+    sys.stderr.write(timing.report([node], stats, (stats.ended[0] - stats.started[0]) / 1e9))
+    sys.stderr.flush()
+
+    return status
+
+
+def runCommand(node) -> int:
+    """
+        Runs compound command in the current process, its redirects are
+        applied by the caller
+    """
+
+    if isinstance(node, syntax.For):
+        return runFor(node)
+
+    if isinstance(node, syntax.While):
+        return runWhile(node)
+
+    if isinstance(node, syntax.If):
+        return runIf(node)
+
+    return run(node.body)
+
+
+def runIf(node: syntax.If) -> int:
+    for condition, body in node.branches:
+        if run(condition) == 0:
+            return run(body)
+
+    if node.orelse is not None:
+        return run(node.orelse)
+
+    # no branch taken: status is 0, not the one of the last condition
+    variables.LAST_STATUS = 0
+
+    return 0
+
+
+def leaveLoop(e: builtin.LoopControl) -> bool:
+    """
+        Handles break/continue caught by a loop
+
+        RETURNS:
+            stop: bool - True if the loop has to end (break)
+
+        RAISES:
+            LoopControl - if it's meant for an outer loop
+    """
+
+    if e.count > 1:
+        e.count -= 1
+        raise e
+
+    return e.kind == "break"
+
+
+def checkInterrupt(status: int) -> None:
+    # Ctrl-C which has killed a command of the loop ends the whole loop
+    if status == 128 + signal.SIGINT:
+        raise KeyboardInterrupt
+
+
+def runFor(node: syntax.For) -> int:
+    # words are expanded once per loop, not per iteration;
+    # without "in" the loop runs over positional parameters, there are none
+    values = expansion.expandWords(node.words) if node.words is not None else []
+    status = 0
+
+    builtin.LOOP_DEPTH += 1
+
+    try:
+        for value in values:
+            variables.assign(node.name, value)
+
+            try:
+                status = run(node.body)
+            except builtin.LoopControl as e:
+                if leaveLoop(e):
+                    break
+
+            checkInterrupt(status)
+    finally:
+        builtin.LOOP_DEPTH -= 1
+
+    variables.LAST_STATUS = status
+
+    return status
+
+
+def runWhile(node: syntax.While) -> int:
+    status = 0
+
+    builtin.LOOP_DEPTH += 1
+
+    try:
+        while True:
+            try:
+                condition = run(node.condition)
+                checkInterrupt(condition)
+
+                if (condition == 0) == node.until:
+                    break
+
+                status = run(node.body)
+            except builtin.LoopControl as e:
+                if leaveLoop(e):
+                    break
+
+            checkInterrupt(status)
+    finally:
+        builtin.LOOP_DEPTH -= 1
+
+    variables.LAST_STATUS = status
+
+    return status
+
+
+def runCompound(node) -> int:
+    """
+        Runs compound command (but a subshell) in the shell, with its redirects
+        applied to the shell's own descriptors for the time of the command
+    """
+
+    if not node.redirects:
+        return runCommand(node)
+
+    try:
+        with redirected(node.redirects):
+            return runCommand(node)
+    except (redirects.RedirectError, OSError) as e:
+        redirects.reportError(e)
+
+    variables.setStatus([1], [None])
+
+    return 1
+
+
+@contextlib.contextmanager
+def redirected(targets: list[parser.Redirect]):
+    """
+        Applies redirects to the shell's descriptors and restores them after
+        the block. Saved copies sit above 10, close-on-exec, out of children's way
+
+        RAISES:
+            RedirectError, OSError - if a redirect can't be applied (nothing is changed then)
+    """
+
+    plan = redirects.compilePlan([parser.Redirect(r.fd, r.op, expansion.expandTarget(r.target)) for r in targets])
+    saved = {}
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    for action in plan:
+        fd = action[2] if action[0] == redirects.DUP2 else action[1]
+
+        if fd not in saved:
+            try:
+                saved[fd] = fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, 10)
+            except OSError:
+                saved[fd] = None # was closed
+
+    try:
+        launcher.applyFileActions(plan)
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        for fd, copy in saved.items():
+            if copy is None:
+                with contextlib.suppress(OSError):
+                    os.close(fd)
+            else:
+                os.dup2(copy, fd)
+                os.close(copy)
+
+
+def runBody(node) -> int:
+    """
+        Runs compound command in a forked shell: its redirects go straight
+        to the descriptors, nothing has to be restored
+    """
+
+    try:
+        plan = redirects.compilePlan([parser.Redirect(r.fd, r.op, expansion.expandTarget(r.target))
+                                      for r in node.redirects])
+        launcher.applyFileActions(plan)
+    except (redirects.RedirectError, OSError) as e:
+        redirects.reportError(e)
+        return 1
+
+    return runCommand(node)
+
+
+def forkShell(body, fileActions: list[tuple], pgroup: int | None = None) -> int:
+    """
+        Runs body() in a forked copy of the shell, which exits with its status
+
+        ARGS:
+            body: callable - returns exit status
+            fileActions: list[tuple] - posix_spawn-style actions applied in the child first
+            pgroup: int | None - process group for the child: 0 - new group, None - shell's group
+
+        RETURNS:
+            pid: int - pid of the child
+    """
+
+    # buffered output of the shell must not be written twice
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    pid = os.fork()
+
+    if pid != 0:
+        return pid
+
+    status = 1
+
+    try:
+        for sig in launcher.DEFAULT_SIGNALS + (signal.SIGINT,):
+            signal.signal(sig, signal.SIG_DFL)
+
+        if pgroup is not None:
+            os.setpgid(0, pgroup)
+
+        # the subshell has no terminal to hand over and no jobs of its own
+        jobs.INTERACTIVE = False
+        jobs.forget()
+
+        launcher.applyFileActions(fileActions)
+        closeInherited()
+        status = body()
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 0
+    except builtin.LoopControl:
+        # break in ( ... ) leaves only the subshell
+        status = 0
+    except (parser.ParseError, expansion.ExpansionError) as e:
+        sys.stderr.write(f"shell: {e}\n")
+    except KeyboardInterrupt:
+        status = 128 + signal.SIGINT
+    finally:
+        with contextlib.suppress(Exception):
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+        os._exit(status)
+
+
+def closeInherited() -> None:
+    """
+        Closes descriptors above 2 a forked shell got from its parent. Unlike
+        a spawned program it never execs, so close-on-exec doesn't help: ends
+        of other pipes of the pipeline would keep its reader from EOF and
+        its writer from SIGPIPE. Only the trace file stays open
+    """
+
+    keep = trace.TRACE_FD
+    limit = os.sysconf("SC_OPEN_MAX")
+
+    if keep is None:
+        os.closerange(3, limit)
+    else:
+        os.closerange(3, keep)
+        os.closerange(keep + 1, limit)
+
+
+def runBackground(andOr: syntax.AndOr) -> None:
+    """
+        Starts and-or list in background and registers it as a job. A single
+        simple pipeline is started directly, anything else by a forked shell
+    """
+
+    pipeline = andOr.pipelines[0]
+
+    if len(andOr.pipelines) == 1 and pipeline.simple and not pipeline.negated and not pipeline.timed:
+        jobs.add(pipes.runBackground(pipeline.commands), andOr.text)
+        return
+
+    started = pipes.Pipeline(1)
+    started.pids[0] = started.pgid = forkShell(
+            lambda: runAndOr(andOr),
+            [(os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0)],
+            pgroup=0)
+
+    variables.setStatus([0], [None])
+    jobs.add(started, andOr.text)
@@ -0,0 +1,262 @@
+import app.parser as parser
+import app.variables as variables
+import app.globbing as globbing
+import app.substitution as substitution
+import app.redirects as redirects
+
+# Words are compiled by the parser into plans (parser.Word: literal strings,
+# parser.Param references, parser.Subst command substitutions and
+# parser.Glob patterns), which are cached along
+# with the parse result. Expansion only walks a plan and substitutes values,
+# the line is never rescanned
+
+IFS_WHITESPACE = " \t\n"
+
+
+class ExpansionError(Exception):
+    pass
+
+
+def expandParam(p: parser.Param) -> str:
+    """
+        Returns value of a parameter reference, applying its operator:
+            ${NAME:-word} / ${NAME-word} - word if NAME is empty / unset
+            ${NAME:=word} / ${NAME=word} - same, and word is assigned to NAME
+            ${NAME:+word} / ${NAME+word} - word if NAME is not empty / is set
+            ${NAME:?word} / ${NAME?word} - error if NAME is empty / unset
+    """
+
+    value = variables.get(p.name, p.index)
+
+    if p.op is None:
+        return value
+
+    # with ":" an empty value counts as missing
+    missing = not value if p.op[0] == ':' else not variables.isSet(p.name)
+    op = p.op[-1]
+
+    if op == '+':
+        return "" if missing else expandWord(p.word)
+
+    if not missing:
+        return value
+
+    word = expandWord(p.word)
+
+    if op == '=':
+        variables.assign(p.name, word)
+    elif op == '?':
+        raise ExpansionError(f"{p.name}: {word or 'parameter null or not set'}")
+
+    return word
+
+
+def expandValue(p: parser.Param | parser.Subst) -> str:
+    if isinstance(p, parser.Subst):
+        return substitution.capture(p.source)
+
+    return expandParam(p)
+
+
+def expandWord(word: str | parser.Word) -> str:
+    """
+        Substitutes parameters and commands of a word. Patterns are left as they are
+
+        ARGS:
+            word: str | Word - literal string or word with parameter references
+    """
+
+    if isinstance(word, str):
+        return word
+
+    return "".join(p if isinstance(p, str) else p.text if isinstance(p, parser.Glob) else expandValue(p)
+                   for p in word.parts)
+
+
+def wordText(word: str | parser.Word) -> str:
+    """
+        Returns a word about as it was written, for error messages
+    """
+
+    if isinstance(word, str):
+        return word
+
+    text = []
+
+    for p in word.parts:
+        if isinstance(p, str):
+            text.append(p)
+        elif isinstance(p, parser.Glob):
+            text.append(p.text)
+        elif isinstance(p, parser.Subst):
+            text.append(f"$({p.source})")
+        elif p.op is None and p.index is None:
+            text.append(f"${p.name}")
+        else:
+            index = f"[{p.index}]" if p.index is not None else ""
+            operand = f"{p.op}{wordText(p.word)}" if p.op is not None else ""
+            text.append(f"${{{p.name}{index}{operand}}}")
+
+    return "".join(text)
+
+
+def expandTarget(word: str | parser.Word, listings: globbing.Listings | None = None) -> str:
+    """
+        Expands redirect target. It's split and globbed like an argument, but it
+        has to stay one word: otherwise it becomes redirects.AmbiguousTarget
+    """
+
+    if isinstance(word, str):
+        return word
+
+    paths = expandPaths(expandFields(word), listings if listings is not None else globbing.Listings())
+
+    if len(paths) != 1:
+        return redirects.AmbiguousTarget(wordText(word))
+
+    return paths[0]
+
+
+def expandFields(word: str | parser.Word) -> list[list[tuple[str, bool]]]:
+    """
+        Expands a word into fields: values of unquoted references and command
+        substitutions are split on whitespace, so "$FILES" is one argument and
+        $FILES or $(ls) may be several.
+        A word consisting of empty unquoted references gives no fields at all
+
+        RETURNS:
+            fields: list - every field is a list of (text, active) pieces,
+                           active (unquoted) text may be a pattern
+    """
+
+    if isinstance(word, str):
+        return [[(word, False)]]
+
+    fields = []
+    current = []        # pieces of the current field
+    hasField = False    # current field exists even if it's empty ("" or quoted reference)
+
+    for p in word.parts:
+        if isinstance(p, str):
+            current.append((p, False))
+            hasField = True
+            continue
+
+        if isinstance(p, parser.Glob):
+            current.append((p.text, True))
+            hasField = True
+            continue
+
+        value = expandValue(p)
+
+        if p.quoted:
+            current.append((value, False))
+            hasField = True
+            continue
+
+        pieces = value.split()
+
+        if not pieces:
+            continue
+
+        # whitespace at the edges ends the field before and starts the one after
+        if value[0] in IFS_WHITESPACE and hasField:
+            fields.append(current)
+            current, hasField = [], False
+
+        current.append((pieces[0], True))
+        hasField = True
+
+        for piece in pieces[1:]:
+            fields.append(current)
+            current = [(piece, True)]
+
+        if value[-1] in IFS_WHITESPACE:
+            fields.append(current)
+            current, hasField = [], False
+
+    if hasField:
+        fields.append(current)
+
+    return fields
+
+
+def expandPaths(fields: list[list[tuple[str, bool]]], listings: globbing.Listings) -> list[str]:
+    """
+        Replaces fields having active pattern characters with matching paths.
+        Patterns without matches stay as they are
+    """
+
+    words = []
+
+    for pieces in fields:
+        if globbing.hasMagic(pieces) and (paths := globbing.expand(pieces, listings)):
+            words.extend(paths)
+        else:
+            words.append("".join(text for (text, _) in pieces))
+
+    return words
+
+
+def expandWords(words: list[str | parser.Word]) -> list[str]:
+    """
+        Expands list of words (for ... in words) with splitting and pathname expansion
+    """
+
+    listings = globbing.Listings()
+    expanded = []
+
+    for word in words:
+        expanded.extend(expandPaths(expandFields(word), listings))
+
+    return expanded
+
+
+def isAssignment(word: str | parser.Word) -> bool:
+    first = word if isinstance(word, str) else word.parts[0]
+
+    return isinstance(first, str) and variables.ASSIGNMENT.match(first) is not None
+
+
+def expandToken(c: parser.Token, listings: globbing.Listings | None = None) -> parser.Token:
+    """
+        Returns token with all parameters and patterns expanded. Tokens come from
+        the parse cache and are shared, so a new one is made instead of changing c
+
+        ARGS:
+            c: Token - parsed command
+            listings: Listings | None - directory cache shared by the whole command line
+
+        RAISES:
+            ExpansionError - on ${NAME:?word} with NAME not set
+            ParseError - on a bad command substitution
+    """
+
+    if c.literal:
+        return c
+
+    if listings is None:
+        listings = globbing.Listings()
+
+    # NAME=$value is neither split nor globbed, as the whole value goes to the variable
+    if isAssignment(c.commandName) and not c.args:
+        words = [expandWord(c.commandName)]
+    elif isinstance(c.commandName, str):
+        words = [c.commandName]
+    else:
+        words = expandPaths(expandFields(c.commandName), listings)
+
+    # plain strings are literal already (patterns come as Words), the common case in loops
+    for a in c.args:
+        if isinstance(a, str):
+            words.append(a)
+        else:
+            words.extend(expandPaths(expandFields(a), listings))
+
+    targets = [parser.Redirect(r.fd, r.op, expandTarget(r.target, listings)) for r in c.redirects]
+
+    if not words:
+        # the whole command expanded to nothing
+        words = [""]
+
+    return parser.Token(words[0], words[1:], targets)
@@ -1,46 +1,350 @@
 import os
+import bisect
+import threading
+from collections import OrderedDict
 
-PATH = os.environ["PATH"]
+# Changed only through setPath (export PATH=..., PATH=...)
+PATH = os.environ.get("PATH", "")
 PATH_LIST = PATH.split(os.pathsep)
 
-def locate(fileName) -> str | None:
+
+def scanDir(dirName: str) -> set[str]:
     """
-        Locates executable file in directories defined in PATH variable
-        
+        Lists names of executable regular files in a directory
+
+        os.scandir gives us the file type from the directory entry itself,
+        so no extra stat is done for other entries (only symlinks are followed).
+        One access() per regular file keeps README, LICENSE.txt and the like
+        out of completion and the snapshot
+
         ARGS:
-            fileName: str - file name
+            dirName: str - directory to scan
 
         RETURNS:
-            fullPath: str | None - full path if file is executable and None otherwise
+            names: set[str] - names of executable files
     """
 
-    if fileName in EXECUTABLES:
-        return EXECUTABLES[fileName]
+    names = set()
+
+    try:
+        with os.scandir(dirName) as it:
+            for entry in it:
+                try:
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        names.add(entry.name)
+                except OSError: pass # broken symlink and so on
+    except OSError: pass
+
+    return names
 
-    return None
 
-def findExes() -> dict[str, str]:
+def dirMtime(dirName: str) -> int | None:
+    """
+        Returns modification time of a directory (in ns) or None if it can't be stat'ed
     """
-        Finds all executible files listed in PATH directories
 
-        RETURNS:
-            executables: dict[str, str] - list absolute pathes to executable files
+    try:
+        return os.stat(dirName).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ExecutableIndex:
+    """
+        Index of executable files found in PATH directories.
+
+        Each directory is remembered together with its mtime, so refresh()
+        rescans only directories that have changed since the last scan.
+        The first scan is meant to be run in the background (see start())
     """
 
-    executables = {}
+    def __init__(self, dirs: list[str]):
+        self.dirs = dirs
+        self.listings = {}      # dir -> (mtime, set of file names)
+        self.executables = {}   # merged view: name -> full path, earlier PATH entries win
+        self.generation = 0     # bumped every time merged view changes
+
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def start(self) -> None:
+        """
+            Runs the first scan in a daemon thread, so the prompt is not blocked
+        """
+
+        thread = threading.Thread(target=self.refresh, daemon=True)
+        thread.start()
+
+    def refresh(self) -> bool:
+        """
+            Rescans directories whose mtime has changed
+
+            RETURNS:
+                changed: bool - True if the index has changed
+        """
+
+        with self.lock:
+            changed = False
+
+            for d in self.dirs:
+                mtime = dirMtime(d)
+                cached = self.listings.get(d)
+
+                if cached is not None and cached[0] == mtime:
+                    continue
+
+                self.listings[d] = (mtime, scanDir(d) if mtime is not None else set())
+                changed = True
+
+            if changed:
+                self._merge()
+
+            self.ready.set()
+
+        return changed
+
+    def setDirs(self, dirs: list[str]) -> None:
+        """
+            Switches the index to new PATH directories. Listings of directories
+            which are still in PATH are kept; if some new directory has never
+            been scanned, the index becomes not ready, so lookups probe PATH
+            until the next refresh() scans it (names() does it on demand)
+        """
+
+        with self.lock:
+            self.dirs = dirs
+            self.listings = {d: self.listings[d] for d in dirs if d in self.listings}
+
+            if self.ready.is_set() and all(d in self.listings for d in dirs):
+                self._merge()
+            else:
+                self.ready.clear()
+
+    def dump(self) -> dict[str, tuple[int | None, list[str]]]:
+        """
+            Returns per-directory listings, so they could be saved into a snapshot
+        """
+
+        return {d: (mtime, sorted(names)) for (d, (mtime, names)) in self.listings.items()}
+
+    def restore(self, listings: dict[str, tuple[int | None, list[str]]]) -> None:
+        """
+            Loads listings saved by dump(). Stale directories will be
+            rescanned by the next refresh(), as their mtime won't match
+        """
+
+        with self.lock:
+            for d in self.dirs:
+                if d in listings:
+                    mtime, names = listings[d]
+                    self.listings[d] = (mtime, set(names))
+
+            self._merge()
+            self.ready.set()
+
+    def _merge(self) -> None:
+        executables = {}
+
+        # reversed, so that earlier PATH directories overwrite later ones
+        for d in reversed(self.dirs):
+            if d in self.listings:
+                for name in self.listings[d][1]:
+                    executables[name] = os.path.join(d, name)
+
+        self.executables = executables
+        self.generation += 1
+
+    def _probe(self, fileName: str) -> str | None:
+        # Used until the first scan is finished: at most one access() per PATH entry
+        for d in self.dirs:
+            fullPath = os.path.join(d, fileName)
+
+            if os.path.isfile(fullPath) and os.access(fullPath, os.X_OK):
+                return fullPath
+
+        return None
+
+    def _find(self, fileName: str) -> str | None:
+        for d in self.dirs:
+            cached = self.listings.get(d)
+
+            if cached is not None and fileName in cached[1]:
+                fullPath = os.path.join(d, fileName)
+
+                if os.access(fullPath, os.X_OK):
+                    return fullPath
+
+        return None
+
+    def locate(self, fileName: str) -> str | None:
+        """
+            Finds full path of an executable
+
+            ARGS:
+                fileName: str - file name
+
+            RETURNS:
+                fullPath: str | None - full path if file is executable and None otherwise
+        """
+
+        if not self.ready.is_set():
+            return self._probe(fileName)
+
+        if (fullPath := self._find(fileName)) is not None:
+            return fullPath
+
+        # Miss: something could have been installed since the last scan
+        if self.refresh():
+            return self._find(fileName)
+
+        # chmod +x doesn't change mtime of the directory, so a file made
+        # executable after the scan is found only by probing
+        return self._probe(fileName)
+
+    def names(self) -> dict[str, str]:
+        """
+            Returns all known executables. If the first scan is not finished yet,
+            waits for it (or does it right here if nobody has started it)
+
+            RETURNS:
+                executables: dict[str, str] - file name -> full path
+        """
+
+        if not self.ready.is_set():
+            self.refresh()
+
+        return self.executables
+
+
+INDEX = ExecutableIndex(PATH_LIST)
+
+# Remembered locations of commands (see the hash builtin): name -> [full path, hits].
+# A hit costs one dict lookup and one access() to check the file is still there
+HASHED = {}
+
+
+def setPath(value: str) -> None:
+    """
+        Changes PATH the shell looks commands up in. Remembered locations are
+        forgotten, the index is rebuilt lazily
+
+        ARGS:
+            value: str - new PATH value
+    """
+    global PATH, PATH_LIST
+
+    PATH = value
+    PATH_LIST = value.split(os.pathsep)
+
+    INDEX.setDirs(PATH_LIST)
+    HASHED.clear()
+
+
+class DirCache:
+    """
+        Bounded LRU cache of directory listings, invalidated by directory mtime.
+
+        Listing is kept sorted, so all names with a given prefix are found with
+        bisect instead of a scan over the whole (possibly huge) directory
+    """
+
+    def __init__(self, maxSize: int = 64):
+        self.maxSize = maxSize
+        self.entries = OrderedDict() # absolute dir -> (mtime, sorted names, set of subdirs)
+
+    def listing(self, dirName: str) -> tuple[list[str], set[str]]:
+        """
+            Lists a directory, reusing the cached listing if the directory hasn't changed
+
+            ARGS:
+                dirName: str - directory to list
+
+            RETURNS:
+                (names, dirs): tuple[list[str], set[str]] - sorted names and names of subdirectories
+        """
+
+        key = os.path.abspath(dirName)
+        mtime = dirMtime(key)
+
+        if mtime is None:
+            self.entries.pop(key, None)
+            return [], set()
+
+        cached = self.entries.get(key)
+
+        if cached is not None and cached[0] == mtime:
+            self.entries.move_to_end(key)
+            return cached[1], cached[2]
+
+        names, dirs = [], set()
 
-    for d in PATH_LIST:
         try:
-            dirList = os.listdir(d)
+            with os.scandir(key) as it:
+                for entry in it:
+                    names.append(entry.name)
+
+                    try:
+                        if entry.is_dir():
+                            dirs.add(entry.name)
+                    except OSError: pass
+        except OSError: pass
+
+        names.sort()
+
+        self.entries[key] = (mtime, names, dirs)
+        self.entries.move_to_end(key)
+
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+        return names, dirs
+
+    def matchings(self, dirName: str, prefix: str):
+        """
+            Lazily yields (name, isDir) for entries of dirName starting with prefix
+
+            ARGS:
+                dirName: str - directory to look in
+                prefix: str - beginning of the name
+        """
+
+        names, dirs = self.listing(dirName)
+
+        for i in range(bisect.bisect_left(names, prefix), len(names)):
+            name = names[i]
+
+            if not name.startswith(prefix):
+                break
+
+            yield name, name in dirs
+
+
+DIR_CACHE = DirCache()
+
+
+def locate(fileName: str, hit: bool = True) -> str | None:
+    """
+        Locates executable file in directories defined in PATH variable.
+        Found location is remembered in HASHED, later lookups skip the index
+
+        ARGS:
+            fileName: str - file name
+            hit: bool - count the lookup as a use of the command (False for type)
+
+        RETURNS:
+            fullPath: str | None - full path if file is executable and None otherwise
+    """
+
+    entry = HASHED.get(fileName)
 
-            for file in dirList:
-                fullPath = os.path.join(d, file)
+    if entry is not None and os.access(entry[0], os.X_OK):
+        entry[1] += hit
+        return entry[0]
 
-                if os.path.isfile(fullPath) and os.access(fullPath, os.X_OK):
-                    executables[file] = fullPath
-        except: pass
-    
-    return executables
+    if (fullPath := INDEX.locate(fileName)) is None:
+        HASHED.pop(fileName, None)
+        return None
 
+    HASHED[fileName] = [fullPath, int(hit)]
 
-EXECUTABLES = findExes()
+    return fullPath
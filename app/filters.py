@@ -0,0 +1,564 @@
+import os
+import re
+import errno
+import mmap
+import stat
+import threading
+
+import app.journal as journal
+import app.streams as streams
+
+# Native cat, head, tail, wc and tee. They run inside of the shell like
+# builtins (on a worker thread in a pipeline), so a filter costs no fork
+# and exec, and data is moved between descriptors by the kernel:
+# sendfile from regular files, splice to and from pipes, mmap to find lines.
+# Options they don't know make the shell run the external program instead,
+# and SHELL_NATIVE_FILTERS=0 turns them off altogether
+
+CHUNK = 1 << 17         # read/write buffer
+SEND_CHUNK = 1 << 30    # most bytes asked from sendfile at once
+SCAN_CHUNK = 1 << 24    # slice of a mapped file counted by wc at once
+
+# errors of the output: the filter stops, there's no use going on with other inputs
+WRITE_ERRORS = {errno.ENOSPC, errno.EFBIG, errno.EDQUOT}
+
+HEAD_TAIL_OPTION = re.compile(r"-([nc])(\d*)|-(\d+)")
+WC_FLAGS = re.compile(r"-[lwcm]+")
+
+
+# Set by the shell on Ctrl-C while a pipeline with filters runs: filters on
+# worker threads don't get KeyboardInterrupt, they check it between chunks
+INTERRUPT = threading.Event()
+
+
+class Interrupted(Exception):
+    pass
+
+
+class Spliced(threading.local):
+    """
+        Bytes moved by splice on the current thread. splice is not counted
+        in wchar of /proc/<pid>/io, "time" adds these to the stage's output
+    """
+    count = 0
+
+
+SPLICED = Spliced()
+
+
+def checkInterrupt() -> None:
+    if INTERRUPT.is_set():
+        raise Interrupted()
+
+
+def enabled() -> bool:
+    return os.environ.get("SHELL_NATIVE_FILTERS", "1") != "0"
+
+
+def isRegular(fd: int) -> bool:
+    try:
+        return stat.S_ISREG(os.fstat(fd).st_mode)
+    except OSError:
+        return False
+
+
+def isPipe(fd: int) -> bool:
+    try:
+        return stat.S_ISFIFO(os.fstat(fd).st_mode)
+    except OSError:
+        return False
+
+
+def writeAll(fd: int, data) -> None:
+    data = memoryview(data)
+
+    while data:
+        data = data[os.write(fd, data):]
+
+
+def copy(inFd: int, outFd: int, count: int | None = None) -> int:
+    """
+        Copies count bytes (everything if None) from inFd to outFd. Tries
+        sendfile (input is a regular file), then splice (one of the ends is
+        a pipe) and falls back to read/write
+
+        RETURNS:
+            copied: int - number of bytes copied
+    """
+
+    left = count
+    copied = 0
+
+    def wanted() -> int:
+        return SEND_CHUNK if left is None else min(left, SEND_CHUNK)
+
+    for method in ("sendfile", "splice", "read"):
+        if method == "sendfile" and not isRegular(inFd):
+            continue
+        if method == "splice" and not (hasattr(os, "splice") and (isPipe(inFd) or isPipe(outFd))):
+            continue
+
+        try:
+            while left is None or left > 0:
+                checkInterrupt()
+
+                if method == "sendfile":
+                    n = os.sendfile(outFd, inFd, None, wanted())
+                elif method == "splice":
+                    n = os.splice(inFd, outFd, min(wanted(), CHUNK * 8))
+                    SPLICED.count += n
+                else:
+                    data = os.read(inFd, min(wanted(), CHUNK))
+                    writeAll(outFd, data)
+                    n = len(data)
+
+                if n == 0:
+                    return copied
+
+                copied += n
+
+                if left is not None:
+                    left -= n
+
+            return copied
+        except OSError as e:
+            # EINVAL/ENOSYS: the pair of descriptors is not supported, try the next way
+            if method == "read" or isinstance(e, BrokenPipeError) or copied:
+                raise
+
+    return copied
+
+
+def inputFailed(command: str, name: str, e: OSError, err: streams.OutputStream, failed: list[str]) -> None:
+    """
+        Reports an input which can't be opened or read. Errors of the output
+        are raised further: they end the filter (see run)
+
+        RAISES:
+            OSError - if e is a write error (BrokenPipeError, ENOSPC, ...)
+    """
+
+    if isinstance(e, BrokenPipeError) or e.errno in WRITE_ERRORS:
+        raise e
+
+    err.write(f"{command}: {name}: {e.strerror}\n")
+    # data goes straight to the descriptor, the message has to go out before the next input
+    err.flush()
+    failed.append(name)
+
+
+def openInputs(names: list[str], inFd: int, err: streams.OutputStream, command: str, failed: list[str]):
+    """
+        Yields (name, fd) of every input ("-" or no names mean inFd). Files that
+        can't be opened are reported, added to failed and skipped
+    """
+
+    for name in names or ["-"]:
+        if name == "-":
+            yield name, inFd
+            continue
+
+        try:
+            fd = os.open(name, os.O_RDONLY)
+        except OSError as e:
+            inputFailed(command, name, e, err, failed)
+            continue
+
+        try:
+            if stat.S_ISDIR(os.fstat(fd).st_mode):
+                inputFailed(command, name, IsADirectoryError(errno.EISDIR, os.strerror(errno.EISDIR)), err, failed)
+                continue
+
+            yield name, fd
+        finally:
+            os.close(fd)
+
+
+# ====================================== cat ===================================
+
+def parseCat(args: list[str]) -> list[str] | None:
+    if any(a.startswith('-') and a != '-' for a in args):
+        return None
+
+    return args
+
+
+def cat(args: list[str], inFd: int, out: streams.OutputStream, err: streams.OutputStream) -> int:
+    failed = []
+    out.flush()
+
+    for name, fd in openInputs(parseCat(args), inFd, err, "cat", failed):
+        try:
+            copy(fd, out.fileno())
+        except OSError as e:
+            inputFailed("cat", name, e, err, failed)
+
+    return 1 if failed else 0
+
+
+# ====================================== head, tail ============================
+
+def parseHeadTail(args: list[str]) -> tuple[str, int, str | None] | None:
+    """
+        Parses "-n N", "-nN", "-N", "-c N" and at most one file
+
+        RETURNS:
+            (unit, count, fileName) | None - unit is "n" (lines) or "c" (bytes);
+                                             None if the arguments are not supported
+    """
+
+    unit, count, files = "n", 10, []
+    i = 0
+
+    while i < len(args):
+        a = args[i]
+        i += 1
+
+        if a == "-" or not a.startswith('-'):
+            files.append(a)
+            continue
+
+        if (match := HEAD_TAIL_OPTION.fullmatch(a)) is None:
+            return None
+
+        option, value, shortCount = match.groups()
+
+        if shortCount is not None:
+            unit, count = "n", int(shortCount)
+            continue
+
+        if not value:
+            if i == len(args) or not args[i].isdigit():
+                return None
+
+            value = args[i]
+            i += 1
+
+        unit, count = option, int(value)
+
+    if len(files) > 1:
+        return None # headers of several files are left to the real program
+
+    return unit, count, files[0] if files else None
+
+
+def headLines(fd: int, outFd: int, count: int) -> None:
+    if count == 0:
+        return
+
+    if isRegular(fd) and (size := os.fstat(fd).st_size) > 0:
+        # find the end of count-th line in the mapping, send the bytes without copying them
+        start = os.lseek(fd, 0, os.SEEK_CUR)
+
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as data:
+            pos = start
+
+            for _ in range(count):
+                pos = data.find(b"\n", pos)
+
+                if pos < 0:
+                    pos = size
+                    break
+
+                pos += 1
+
+        if pos > start:
+            os.lseek(fd, start, os.SEEK_SET)
+            copy(fd, outFd, pos - start)
+        return
+
+    while count > 0 and (data := os.read(fd, CHUNK)):
+        checkInterrupt()
+        end = 0
+
+        while count > 0:
+            nl = data.find(b"\n", end)
+
+            if nl < 0:
+                end = len(data)
+                break
+
+            end = nl + 1
+            count -= 1
+
+        writeAll(outFd, data[:end])
+
+
+def tailPipe(fd: int, unit: str, count: int) -> bytes:
+    """
+        Keeps only the tail of a stream in memory while reading it
+    """
+
+    buffer = bytearray()
+
+    while data := os.read(fd, CHUNK):
+        checkInterrupt()
+        buffer += data
+
+        if len(buffer) > 4 * CHUNK:
+            offset = journal.tailOffset(buffer, count) if unit == "n" else max(0, len(buffer) - count)
+            del buffer[:offset]
+
+    offset = journal.tailOffset(buffer, count) if unit == "n" else max(0, len(buffer) - count)
+
+    return bytes(buffer[offset:]) if count else b""
+
+
+def head(args: list[str], inFd: int, out: streams.OutputStream, err: streams.OutputStream) -> int:
+    unit, count, fileName = parseHeadTail(args)
+    failed = []
+    out.flush()
+
+    for name, fd in openInputs([fileName] if fileName else [], inFd, err, "head", failed):
+        try:
+            if unit == "c":
+                copy(fd, out.fileno(), count)
+            else:
+                headLines(fd, out.fileno(), count)
+        except OSError as e:
+            inputFailed("head", name, e, err, failed)
+
+    return 1 if failed else 0
+
+
+def tail(args: list[str], inFd: int, out: streams.OutputStream, err: streams.OutputStream) -> int:
+    unit, count, fileName = parseHeadTail(args)
+    failed = []
+    out.flush()
+
+    for name, fd in openInputs([fileName] if fileName else [], inFd, err, "tail", failed):
+        try:
+            tailFd(fd, out.fileno(), unit, count)
+        except OSError as e:
+            inputFailed("tail", name, e, err, failed)
+
+    return 1 if failed else 0
+
+
+def tailFd(fd: int, outFd: int, unit: str, count: int) -> None:
+    if not isRegular(fd):
+        writeAll(outFd, tailPipe(fd, unit, count))
+        return
+
+    size = os.fstat(fd).st_size
+
+    if unit == "c":
+        offset = max(0, size - count)
+    elif size == 0 or count == 0:
+        offset = size
+    else:
+        # reverse scan from the end, only the tail of the file is touched
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as data:
+            offset = journal.tailOffset(data, count)
+
+    os.lseek(fd, offset, os.SEEK_SET)
+    copy(fd, outFd)
+
+
+# ====================================== wc ====================================
+
+# UTF-8 continuation bytes, they don't start a character
+CONTINUATION = bytes(range(0x80, 0xc0))
+
+
+def parseWc(args: list[str]) -> tuple[str, list[str]] | None:
+    flags, files = "", []
+
+    for a in args:
+        if a == "-" or not a.startswith('-'):
+            files.append(a)
+        elif WC_FLAGS.fullmatch(a):
+            flags += a[1:]
+        else:
+            return None
+
+    # columns always go in this order, whatever order flags were given in
+    return "".join(f for f in "lwmc" if f in flags) or "lwc", files
+
+
+def countFd(fd: int, flags: str) -> dict[str, int]:
+    counts = dict.fromkeys(flags, 0)
+
+    if flags == "c" and isRegular(fd):
+        counts["c"] = os.fstat(fd).st_size - os.lseek(fd, 0, os.SEEK_CUR)
+        return counts
+
+    inWord = False
+
+    def feed(data) -> None:
+        nonlocal inWord
+
+        if "l" in counts:
+            counts["l"] += data.count(b"\n")
+        if "c" in counts:
+            counts["c"] += len(data)
+        if "m" in counts:
+            counts["m"] += len(data.translate(None, CONTINUATION))
+        if "w" in counts and data:
+            words = data.split()
+            counts["w"] += len(words)
+
+            # a word split between two chunks is counted once
+            if inWord and words and not data[:1].isspace():
+                counts["w"] -= 1
+
+            inWord = not data[-1:].isspace()
+
+    if isRegular(fd) and os.fstat(fd).st_size > 0:
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as data:
+            start = os.lseek(fd, 0, os.SEEK_CUR)
+
+            for pos in range(start, len(data), SCAN_CHUNK):
+                feed(data[pos:pos + SCAN_CHUNK])
+    else:
+        while data := os.read(fd, CHUNK):
+            checkInterrupt()
+            feed(data)
+
+    return counts
+
+
+def wc(args: list[str], inFd: int, out: streams.OutputStream, err: streams.OutputStream) -> int:
+    flags, files = parseWc(args)
+    failed = []
+
+    results = []
+    totalSize = 0       # of regular inputs, for column width
+    regular = True
+
+    for name, fd in openInputs(files, inFd, err, "wc", failed):
+        try:
+            counts = countFd(fd, flags)
+        except OSError as e:
+            inputFailed("wc", name, e, err, failed)
+            continue
+
+        if isRegular(fd):
+            totalSize += os.fstat(fd).st_size
+        else:
+            regular = False
+
+        results.append((name if files else None, counts))
+
+    if len(results) > 1:
+        total = {f: sum(counts[f] for (_, counts) in results) for f in flags}
+        results.append(("total", total))
+
+    # same widths as GNU wc: a lone number is not padded, regular files are
+    # padded to the width of their total size, anything else to 7
+    if len(flags) == 1 and len(results) == 1:
+        width = 1
+    elif regular:
+        width = len(str(totalSize))
+    else:
+        width = 7
+
+    for name, counts in results:
+        line = " ".join(f"{counts[f]:{width}}" for f in flags)
+        out.write(f"{line} {name}\n" if name is not None else line + "\n")
+
+    return 1 if failed else 0
+
+
+# ====================================== tee ===================================
+
+def parseTee(args: list[str]) -> tuple[bool, list[str]] | None:
+    append = False
+    files = []
+
+    for a in args:
+        if a == "-a":
+            append = True
+        elif a.startswith('-') and a != '-':
+            return None
+        else:
+            files.append(a)
+
+    return append, files
+
+
+def tee(args: list[str], inFd: int, out: streams.OutputStream, err: streams.OutputStream) -> int:
+    append, files = parseTee(args)
+    status = 0
+    out.flush()
+
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_APPEND if append else os.O_TRUNC)
+    fds = [out.fileno()]
+
+    for name in files:
+        try:
+            fds.append(os.open(name, flags, 0o644))
+        except OSError as e:
+            err.write(f"tee: {name}: {e.strerror}\n")
+            status = 1
+
+    try:
+        # there's no tee(2) in os, so data is read once and written to every output
+        while data := os.read(inFd, CHUNK):
+            checkInterrupt()
+
+            for fd in fds:
+                writeAll(fd, data)
+    finally:
+        for fd in fds[1:]:
+            os.close(fd)
+
+    return status
+
+
+# name -> (argument parser, implementation); parser returns None for unsupported options
+FILTERS = {
+        "cat": (parseCat, cat),
+        "head": (parseHeadTail, head),
+        "tail": (parseHeadTail, tail),
+        "wc": (parseWc, wc),
+        "tee": (parseTee, tee),
+        }
+
+
+def readsStdin(name: str, args: list[str]) -> bool:
+    """
+        True if the filter reads its standard input (no files or "-" among them)
+    """
+
+    parsed = FILTERS[name][0](args)
+
+    if name == "cat":
+        files = parsed
+    elif name in ("head", "tail"):
+        files = [parsed[2]] if parsed[2] is not None else []
+    elif name == "wc":
+        files = parsed[1]
+    else:
+        return True
+
+    return not files or "-" in files
+
+
+def accepts(name: str, args: list[str]) -> bool:
+    """
+        True if the command can be run by a native filter
+    """
+
+    if name not in FILTERS or not enabled():
+        return False
+
+    return FILTERS[name][0](args) is not None
+
+
+def run(name: str, args: list[str], inFd: int, out: streams.OutputStream, err: streams.OutputStream) -> int:
+    """
+        Runs filter, its errors (a full disk, a directory as stdin of tee)
+        are reported like the real programs do
+
+        RAISES:
+            BrokenPipeError - if the reader is gone (the stage ends "by SIGPIPE")
+    """
+
+    try:
+        return FILTERS[name][1](args, inFd, out, err)
+    except BrokenPipeError:
+        raise
+    except OSError as e:
+        err.write(f"{name}: write error: {e.strerror}\n" if e.errno in WRITE_ERRORS else f"{name}: {e.strerror}\n")
+        return 1
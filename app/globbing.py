@@ -0,0 +1,246 @@
+import os
+import re
+from functools import lru_cache
+
+GLOB_CHARS = re.compile(r"[*?[]")
+
+
+class Listings:
+    """
+        Directory listings made while expanding one command line. Patterns
+        of the same line often walk the same directories (*.c *.h), so every
+        directory is scanned once. Nothing is kept after the line is expanded
+    """
+
+    def __init__(self):
+        self.entries = {} # dir -> (names, subdirectory names, names of symlinks to directories)
+
+    def listing(self, dirName: str) -> tuple[list[str], set[str], set[str]]:
+        if (cached := self.entries.get(dirName)) is not None:
+            return cached
+
+        names, dirs, links = [], set(), set()
+
+        try:
+            with os.scandir(dirName or ".") as it:
+                for entry in it:
+                    names.append(entry.name)
+
+                    try:
+                        # type comes from the directory entry, only symlinks are stat'ed
+                        if entry.is_dir():
+                            dirs.add(entry.name)
+
+                            if entry.is_symlink():
+                                links.add(entry.name)
+                    except OSError: pass
+        except OSError: pass
+
+        self.entries[dirName] = (names, dirs, links)
+
+        return names, dirs, links
+
+
+def translate(pattern: str) -> str:
+    """
+        Translates active (unquoted) part of a pattern into regex: *, ? and [...]
+    """
+
+    out = []
+    i, n = 0, len(pattern)
+
+    while i < n:
+        c = pattern[i]
+        i += 1
+
+        if c == '*':
+            out.append(".*")
+        elif c == '?':
+            out.append(".")
+        elif c == '[':
+            j = i
+
+            if j < n and pattern[j] in "!^":
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+
+            j = pattern.find(']', j)
+
+            if j < 0:
+                out.append(re.escape(c)) # unclosed bracket is a literal char
+                continue
+
+            chars = pattern[i:j].replace('\\', '\\\\')
+            i = j + 1
+
+            if chars[0] in "!^":
+                chars = '^' + chars[1:]
+
+            out.append(f"[{chars}]")
+        else:
+            out.append(re.escape(c))
+
+    return "".join(out)
+
+
+class Component:
+    """
+        One "/"-separated component of a compiled pattern
+    """
+    __slots__ = ("text", "regex", "recursive", "hidden")
+
+    def __init__(self, segments: list[tuple[str, bool]]):
+        self.text = "".join(text for (text, _) in segments)
+        self.recursive = segments == [("**", True)]
+        self.regex = None
+
+        # leading dot has to be matched explicitly
+        self.hidden = self.text.startswith('.')
+
+        if not self.recursive and any(active and GLOB_CHARS.search(text) for (text, active) in segments):
+            regex = "".join(translate(text) if active else re.escape(text) for (text, active) in segments)
+            self.regex = re.compile(regex, re.DOTALL)
+
+    @property
+    def magic(self) -> bool:
+        return self.recursive or self.regex is not None
+
+
+def hasMagic(pieces: list[tuple[str, bool]]) -> bool:
+    return any(active and GLOB_CHARS.search(text) for (text, active) in pieces)
+
+
+@lru_cache(maxsize=256)
+def compilePattern(pieces: tuple[tuple[str, bool], ...]) -> tuple[Component, ...]:
+    """
+        Splits pattern into components. Patterns are compiled once: scripts
+        and loops expand the same words over and over
+
+        ARGS:
+            pieces: tuple - (text, active) pieces of a field; only active
+                            (unquoted) text has glob meaning
+    """
+
+    components = [[]]
+
+    for text, active in pieces:
+        first, *rest = text.split('/')
+
+        if first:
+            components[-1].append((first, active))
+
+        for part in rest:
+            components.append([(part, active)] if part else [])
+
+    return tuple(Component(segments) for segments in components)
+
+
+def join(dirName: str, name: str) -> str:
+    return dirName + name if not dirName or dirName.endswith('/') else dirName + '/' + name
+
+
+def walk(dirName: str, listings: Listings):
+    """
+        Yields dirName and all directories below it (for **). Hidden
+        directories and symlinks to directories are not descended into
+    """
+
+    stack = [dirName]
+
+    while stack:
+        current = stack.pop()
+        yield current
+
+        _, dirs, links = listings.listing(current)
+
+        for name in sorted(dirs - links, reverse=True):
+            if not name.startswith('.'):
+                stack.append(join(current, name) + '/')
+
+
+def expand(pieces: list[tuple[str, bool]], listings: Listings) -> list[str]:
+    """
+        Expands a pattern into sorted list of matching paths. Components are
+        matched left to right, and only directories are kept for the next
+        component, so non-matching subtrees are never listed
+
+        ARGS:
+            pieces: list - (text, active) pieces of the field
+            listings: Listings - directory cache of the current command line
+
+        RETURNS:
+            paths: list[str] - matches, empty if nothing matched
+    """
+
+    components = compilePattern(tuple(pieces))
+
+    # absolute pattern starts with an empty component, "dir/" ends with one
+    if components[0].text == "" and not components[0].magic:
+        paths, components = ["/"], components[1:]
+    else:
+        paths = [""]
+
+    onlyDirs = len(components) > 1 and components[-1].text == "" and not components[-1].magic
+
+    if onlyDirs:
+        components = components[:-1]
+
+    for i, comp in enumerate(components):
+        # the last component matches any file, others (and "dir/") only directories
+        final = i == len(components) - 1 and not onlyDirs
+        found = []
+
+        if comp.recursive:
+            for p in paths:
+                for d in walk(p, listings):
+                    found.append(d)
+
+                    if final:
+                        # trailing ** matches files too
+                        names, dirs, links = listings.listing(d)
+                        found.extend(join(d, name) for name in names
+                                     if (name not in dirs or name in links) and not name.startswith('.'))
+
+            if i == len(components) - 1:
+                # a set: both lists are as long as the tree under "**"
+                starts = set(paths)
+                found = [f for f in found if f not in starts]
+        elif comp.regex is None:
+            # literal component: no listing, only lookup
+            for p in paths:
+                path = join(p, comp.text)
+
+                if final:
+                    if os.path.lexists(path):
+                        found.append(path)
+                elif os.path.isdir(path):
+                    found.append(path + '/')
+        else:
+            match = comp.regex.fullmatch
+
+            for p in paths:
+                names, dirs, _ = listings.listing(p)
+
+                for name in names:
+                    if name.startswith('.') and not comp.hidden:
+                        continue
+
+                    if not match(name):
+                        continue
+
+                    if final:
+                        found.append(join(p, name))
+                    elif name in dirs:
+                        # non-directories can't match the rest, they are pruned here
+                        found.append(join(p, name) + '/')
+
+        if not found:
+            return []
+
+        paths = found
+
+    if onlyDirs:
+        return sorted(paths)
+
+    return sorted(p.rstrip('/') or p for p in paths)
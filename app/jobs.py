@@ -0,0 +1,408 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+
+import app.launcher as launcher
+import app.variables as variables
+
+INTERACTIVE = False # set by main: print job numbers, notices and hand terminal over in fg
+
+JOBS = {} # job number -> Job
+JOBS_LOCK = threading.Lock()
+
+
+class Job:
+    """
+        Background pipeline. Its children are reaped by the event loop thread
+        (see JobLoop) as soon as they exit, builtin stages are joined there too
+    """
+
+    def __init__(self, jobId: int, pipeline, text: str):
+        self.id = jobId
+        self.pipeline = pipeline
+        self.text = text
+        self.pgid = pipeline.pgid
+        self.state = "Running"  # Running, Stopped or Done
+        self.foreground = False # True once fg took the job over
+
+        self.stageOf = {pid: i for (i, pid) in pipeline.pids.items()}
+        self.remaining = set(self.stageOf)  # pids not reaped yet
+        self.threadsLeft = len(pipeline.stages)
+        self.pidfds = {}                    # pid -> pidfd watched by the loop
+        self.done = threading.Event()
+
+    @property
+    def status(self) -> int:
+        return self.pipeline.statuses[-1]
+
+    def lastPid(self) -> int | None:
+        pids = self.pipeline.pids
+
+        return pids[max(pids)] if pids else None
+
+    def record(self, pid: int, waitStatus: int, rusage) -> None:
+        """
+            Stores exit status and resource usage of a reaped child
+        """
+
+        i = self.stageOf[pid]
+        self.pipeline.statuses[i] = launcher.exitStatus(waitStatus)
+        self.pipeline.rusages[i] = rusage
+        self.remaining.discard(pid)
+
+    def describe(self) -> str:
+        if self.state == "Running":
+            return "Running"
+        if self.state == "Stopped":
+            return "Stopped"
+        if self.status == 0:
+            return "Done"
+        if self.status > 128:
+            return signal.strsignal(self.status - 128) or f"Signal {self.status - 128}"
+
+        return f"Exit {self.status}"
+
+
+class JobLoop:
+    """
+        Asyncio event loop on a daemon thread. Children of background jobs are
+        reaped when their pidfd becomes readable, so waiting jobs cost no CPU
+        and the REPL is never blocked. The loop is started with the first job
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def ensureLoop(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+        return self.loop
+
+    def call(self, func, *args):
+        """
+            Runs func on the loop thread and waits for its result
+        """
+        # BEGIN FUNCTION
+        async def wrapper():
+            return func(*args)
+        # END FUNCTION
+
+        return asyncio.run_coroutine_threadsafe(wrapper(), self.ensureLoop()).result()
+
+    def watch(self, job: Job) -> None:
+        """
+            Starts watching children of the job which are not reaped yet (loop thread only)
+        """
+
+        for pid in job.remaining:
+            if pid in job.pidfds:
+                continue
+
+            try:
+                fd = os.pidfd_open(pid)
+            except (AttributeError, OSError):
+                # no pidfd: wait without reaping in a helper thread
+                future = self.loop.run_in_executor(None, waitExited, pid)
+                future.add_done_callback(lambda _, pid=pid: self.onExit(job, pid))
+                continue
+
+            job.pidfds[pid] = fd
+            self.loop.add_reader(fd, self.onExit, job, pid)
+
+    def start(self, job: Job) -> None:
+        """
+            Starts tracking of a new job: its children and builtin threads (loop thread only)
+        """
+
+        self.watch(job)
+
+        for stage in job.pipeline.stages.values():
+            future = self.loop.run_in_executor(None, stage.wait)
+            future.add_done_callback(lambda _: self.onThreadDone(job))
+
+        # jobs with nothing to wait for (e.g. command not found) are done right away
+        self.checkDone(job)
+
+    def unwatch(self, job: Job) -> None:
+        """
+            Stops watching children of the job, so they could be waited for elsewhere
+        """
+
+        for fd in job.pidfds.values():
+            self.loop.remove_reader(fd)
+            os.close(fd)
+
+        job.pidfds.clear()
+
+    def onExit(self, job: Job, pid: int) -> None:
+        if (fd := job.pidfds.pop(pid, None)) is not None:
+            self.loop.remove_reader(fd)
+            os.close(fd)
+
+        if job.foreground or pid not in job.remaining:
+            return
+
+        try:
+            wpid, waitStatus, rusage = os.wait4(pid, os.WNOHANG)
+        except ChildProcessError:
+            return
+
+        if wpid == 0:
+            return
+
+        job.record(pid, waitStatus, rusage)
+        self.checkDone(job)
+
+    def onThreadDone(self, job: Job) -> None:
+        job.threadsLeft -= 1
+        self.checkDone(job)
+
+    def checkDone(self, job: Job) -> None:
+        if job.foreground or job.remaining or job.threadsLeft or job.state == "Done":
+            return
+
+        for i, stage in job.pipeline.stages.items():
+            job.pipeline.statuses[i] = stage.status
+
+        job.state = "Done"
+        job.done.set()
+
+
+def waitExited(pid: int) -> None:
+    """
+        Blocks until child exits, but leaves it for wait4 to reap
+    """
+
+    try:
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+    except ChildProcessError: pass
+
+
+LOOP = JobLoop()
+
+
+def add(pipeline, text: str) -> Job:
+    """
+        Registers started pipeline as a background job
+
+        ARGS:
+            pipeline: pipes.Pipeline - started pipeline
+            text: str - command line to show in jobs
+    """
+
+    with JOBS_LOCK:
+        jobId = max(JOBS, default=0) + 1
+        job = Job(jobId, pipeline, text)
+        JOBS[jobId] = job
+
+    if INTERACTIVE:
+        sys.stdout.write(f"[{jobId}] {job.lastPid() or ''}\n")
+        sys.stdout.flush()
+
+    LOOP.call(LOOP.start, job)
+
+    return job
+
+
+def forget() -> None:
+    """
+        Drops jobs of the shell in its forked copy: they are not the copy's
+        children, and the loop thread reaping them doesn't survive the fork
+    """
+    global JOBS_LOCK, LOOP
+
+    JOBS.clear()
+    JOBS_LOCK = threading.Lock()
+    LOOP = JobLoop()
+
+
+def remove(job: Job) -> None:
+    with JOBS_LOCK:
+        JOBS.pop(job.id, None)
+
+
+def mark(job: Job) -> str:
+    """
+        "+" for the current job, "-" for the previous one
+    """
+
+    ids = sorted(JOBS)
+
+    if ids and job.id == ids[-1]:
+        return "+"
+    if len(ids) > 1 and job.id == ids[-2]:
+        return "-"
+
+    return " "
+
+
+def formatJob(job: Job) -> str:
+    text = job.text + " &" if job.state == "Running" else job.text
+
+    return f"[{job.id}]{mark(job)}  {job.describe():<24}{text}\n"
+
+
+def refreshStopped(job: Job) -> None:
+    """
+        Picks up stops and continues of job's children (e.g. SIGTTIN, kill -STOP).
+        Doesn't reap anything, exits are left to the event loop
+    """
+
+    for pid in list(job.remaining):
+        try:
+            info = os.waitid(os.P_PID, pid, os.WSTOPPED | os.WCONTINUED | os.WNOHANG)
+        except ChildProcessError:
+            continue
+
+        if info is None:
+            continue
+
+        if info.si_code == os.CLD_STOPPED:
+            job.state = "Stopped"
+        elif info.si_code == os.CLD_CONTINUED:
+            job.state = "Running"
+
+
+def notices() -> str:
+    """
+        Returns notices about finished jobs and forgets them. Called before every prompt
+    """
+
+    output = []
+
+    for job in list(JOBS.values()):
+        if job.state == "Done":
+            output.append(formatJob(job))
+            remove(job)
+
+    return "".join(output)
+
+
+def find(spec: str | None) -> Job | None:
+    """
+        Finds job by "%n", "n" or pid. No spec means the current job
+    """
+
+    if not JOBS:
+        return None
+
+    if spec is None or spec in ("%", "%%", "%+"):
+        return JOBS[max(JOBS)]
+
+    if spec == "%-":
+        ids = sorted(JOBS)
+        return JOBS[ids[-2]] if len(ids) > 1 else None
+
+    if spec.startswith('%'):
+        spec = spec[1:]
+        return JOBS.get(int(spec)) if spec.isdigit() else None
+
+    if spec.isdigit():
+        pid = int(spec)
+
+        for job in JOBS.values():
+            if pid in job.stageOf:
+                return job
+
+    return None
+
+
+def handTerminal(pgid: int) -> None:
+    """
+        Makes pgid foreground process group of the terminal (if there's one)
+    """
+
+    if not INTERACTIVE:
+        return
+
+    try:
+        os.tcsetpgrp(sys.stdin.fileno(), pgid)
+    except OSError: pass
+
+
+def foreground(job: Job) -> int:
+    """
+        Continues job in foreground and waits for it
+
+        RETURNS:
+            status: int - exit status of the job (128 + SIGTSTP if it was stopped)
+    """
+
+    job.foreground = True
+    LOOP.call(LOOP.unwatch, job)
+
+    if job.pgid is not None:
+        handTerminal(job.pgid)
+
+        try:
+            os.killpg(job.pgid, signal.SIGCONT)
+        except OSError: pass
+
+    job.state = "Running"
+    stopped = False
+
+    try:
+        for pid in sorted(job.remaining):
+            _, waitStatus, rusage = os.wait4(pid, os.WUNTRACED)
+
+            if os.WIFSTOPPED(waitStatus):
+                stopped = True
+                break
+
+            job.record(pid, waitStatus, rusage)
+    finally:
+        handTerminal(os.getpgrp())
+
+    if stopped:
+        job.state = "Stopped"
+        job.foreground = False
+        LOOP.call(LOOP.watch, job)
+
+        sys.stdout.write("\n" + formatJob(job))
+        sys.stdout.flush()
+
+        return 128 + signal.SIGTSTP
+
+    for i, stage in job.pipeline.stages.items():
+        job.pipeline.statuses[i] = stage.wait()
+
+    job.state = "Done"
+    job.done.set()
+    remove(job)
+
+    variables.setStatus(job.pipeline.statuses, job.pipeline.rusages)
+
+    return job.status
+
+
+def background(job: Job) -> None:
+    """
+        Continues stopped job in background
+    """
+
+    if job.pgid is not None:
+        try:
+            os.killpg(job.pgid, signal.SIGCONT)
+        except OSError: pass
+
+    job.state = "Running"
+
+
+def wait(job: Job) -> int:
+    """
+        Waits for background job to finish and forgets it
+
+        RETURNS:
+            status: int - exit status of the job
+    """
+
+    job.done.wait()
+    remove(job)
+
+    return job.status
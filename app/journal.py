@@ -0,0 +1,148 @@
+import os
+import mmap
+import fcntl
+
+DEFAULT_SIZE = 1000  # HISTSIZE / HISTFILESIZE if they are not set
+COMPACT_EVERY = 100  # appends of one session between compactions
+
+
+def limit(name: str) -> int:
+    """
+        Reads HISTSIZE or HISTFILESIZE. HISTFILESIZE defaults to HISTSIZE
+    """
+
+    value = os.environ.get(name) or (os.environ.get("HISTSIZE") if name == "HISTFILESIZE" else None)
+
+    return int(value) if value and value.isdigit() else DEFAULT_SIZE
+
+
+def tailOffset(data, count: int) -> int:
+    """
+        Scans data backwards and returns offset of the last count lines.
+        Only the tail is touched, so it costs O(tail), not O(file)
+
+        ARGS:
+            data: bytes | mmap - file contents
+            count: int - number of lines to keep
+    """
+
+    pos = len(data)
+
+    # newline ending the last line doesn't start a new one
+    if pos and data[pos - 1] == ord('\n'):
+        pos -= 1
+
+    for _ in range(count):
+        pos = data.rfind(b"\n", 0, pos)
+
+        if pos < 0:
+            return 0
+
+    return pos + 1
+
+
+class Journal:
+    """
+        Append-only history file. Every command is appended as soon as it's run
+        (under an exclusive flock, so concurrent shells interleave whole lines
+        instead of overwriting each other's history). The file is trimmed to
+        HISTFILESIZE lines in place by periodic compaction, and only its tail
+        is ever read
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.appended = 0 # appends since the last compaction
+
+    def append(self, line: str) -> None:
+        self.extend([line])
+
+    def extend(self, lines: list[str]) -> None:
+        if not lines:
+            return
+
+        data = "".join(line + "\n" for line in lines).encode(errors="surrogateescape")
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, data)
+        finally:
+            os.close(fd) # releases the lock
+
+        self.appended += len(lines)
+
+        if self.appended >= COMPACT_EVERY:
+            self.compact()
+
+    def tail(self, count: int) -> list[str]:
+        """
+            Returns the last count lines of the file (mmap + reverse scan)
+        """
+
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return []
+
+        with f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                chunk = data[tailOffset(data, count):]
+
+        return chunk.decode(errors="surrogateescape").splitlines()
+
+    def rewrite(self, lines: list[str]) -> None:
+        """
+            Replaces contents of the file with lines (history -w)
+        """
+
+        data = "".join(line + "\n" for line in lines).encode(errors="surrogateescape")
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o600)
+
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            os.ftruncate(fd, 0)
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+        self.appended = 0
+
+    def compact(self) -> None:
+        """
+            Keeps only the last HISTFILESIZE lines. The file is rewritten in
+            place, not replaced, so other shells' appends are never lost to
+            an unlinked inode
+        """
+
+        self.appended = 0
+
+        try:
+            f = open(self.path, 'r+b')
+        except FileNotFoundError:
+            return
+
+        with f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+
+            with mmap.mmap(f.fileno(), 0) as data:
+                offset = tailOffset(data, limit("HISTFILESIZE"))
+
+                if offset == 0:
+                    return
+
+                size = len(data) - offset
+                data.move(0, offset, size)
+
+            f.truncate(size)
+
+
+JOURNAL = None # Journal of $HISTFILE, set by main in interactive mode
@@ -0,0 +1,109 @@
+import os
+import signal
+
+# File actions use the same tuples as os.posix_spawn:
+#   (os.POSIX_SPAWN_OPEN, fd, path, flags, mode)
+#   (os.POSIX_SPAWN_DUP2, fd, newFd)
+#   (os.POSIX_SPAWN_CLOSE, fd)
+HAS_POSIX_SPAWN = hasattr(os, "posix_spawn")
+
+# Python ignores SIGPIPE and ignored signals survive exec, so children
+# have to get the default handler back (otherwise "yes | head" never ends)
+# (the same goes for SIGTTOU the interactive shell ignores to hand the terminal over)
+DEFAULT_SIGNALS = (signal.SIGPIPE, signal.SIGTTOU)
+
+
+def applyFileActions(fileActions: list[tuple]) -> None:
+    """
+        Applies posix_spawn-style file actions in the current process.
+        Used by the fork+exec fallback
+
+        ARGS:
+            fileActions: list[tuple] - file actions, see above
+    """
+
+    for action in fileActions:
+        kind = action[0]
+
+        if kind == os.POSIX_SPAWN_OPEN:
+            _, fd, path, flags, mode = action
+            fileDesc = os.open(path, flags, mode)
+
+            if fileDesc != fd:
+                os.dup2(fileDesc, fd)
+                os.close(fileDesc)
+        elif kind == os.POSIX_SPAWN_DUP2:
+            os.dup2(action[1], action[2])
+        elif kind == os.POSIX_SPAWN_CLOSE:
+            try:
+                os.close(action[1])
+            except OSError: pass
+
+
+def forkExec(path: str, argv: list[str], fileActions: list[tuple], pgroup: int | None = None) -> int:
+    """
+        Fallback launcher: fork + execv
+
+        RETURNS:
+            pid: int - pid of the child
+    """
+
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            for sig in DEFAULT_SIGNALS:
+                signal.signal(sig, signal.SIG_DFL)
+
+            if pgroup is not None:
+                os.setpgid(0, pgroup)
+
+            applyFileActions(fileActions)
+            os.execv(path, argv)
+        except OSError as e:
+            os.write(2, f"{argv[0]}: {e.strerror}\n".encode())
+
+        os._exit(127)
+
+    return pid
+
+
+def exitStatus(waitStatus: int) -> int:
+    """
+        Converts wait status into shell exit status (128 + N for signal N)
+    """
+
+    code = os.waitstatus_to_exitcode(waitStatus)
+
+    return 128 - code if code < 0 else code
+
+
+def spawn(path: str, argv: list[str], fileActions: list[tuple], pgroup: int | None = None) -> int:
+    """
+        Starts a program. Uses posix_spawn (vfork+exec under the hood, so the
+        shell's memory is not copied) and falls back to fork+exec
+
+        ARGS:
+            path: str - absolute path of the executable (already resolved, no PATH search)
+            argv: list[str] - arguments, including argv[0]
+            fileActions: list[tuple] - dup2/close/open actions applied in the child
+            pgroup: int | None - process group for the child: 0 - new group, None - shell's group
+
+        RETURNS:
+            pid: int - pid of the child
+
+        RAISES:
+            OSError - if the program can't be started (or a redirect file can't be opened)
+    """
+
+    if HAS_POSIX_SPAWN:
+        try:
+            if pgroup is None:
+                return os.posix_spawn(path, argv, os.environ, file_actions=fileActions,
+                                      setsigdef=DEFAULT_SIGNALS)
+
+            return os.posix_spawn(path, argv, os.environ, file_actions=fileActions,
+                                  setsigdef=DEFAULT_SIGNALS, setpgroup=pgroup)
+        except NotImplementedError: pass
+
+    return forkExec(path, argv, fileActions, pgroup)
@@ -1,40 +1,176 @@
 import sys
 import os
+import re
 import readline
 import atexit
+import signal
 
 import app.trie as trie
 import app.parser as parser
-import app.pipes as pipes
 import app.file_utils as file_utils
 import app.builtin as builtin
+import app.snapshot as snapshot
+import app.ranking as ranking
+import app.jobs as jobs
+import app.expansion as expansion
+import app.variables as variables
+import app.trace as trace
+import app.journal as journal
+import app.syntax as syntax
+import app.executor as executor
 
 # ====================================== readline config =======================
 
-readline.parse_and_bind("tab: complete")
 TRIE = trie.Trie()
+TRIE_GENERATION = -1 # generation of file_utils.INDEX the trie was built from
+SNAPSHOT_GENERATION = -1 # generation of file_utils.INDEX restored from the snapshot
 
-commands = list(builtin.BUILTINS.keys()) + list(file_utils.EXECUTABLES.keys())
 
-for c in commands:
-    TRIE.insert(c)
+def loadSnapshot(interactive: bool = True) -> None:
+    """
+        Restores executable index and completion trie from the on-disk snapshot
+        (if there's a valid one) and starts background refresh of the index
+
+        ARGS:
+            interactive: bool - if False, only the index is restored: no trie
+                                and no background scan (misses refresh the index)
+    """
+    global TRIE, TRIE_GENERATION, SNAPSHOT_GENERATION
+
+    if (snap := snapshot.load()) is not None:
+        file_utils.INDEX.restore(snap["dirs"])
+        SNAPSHOT_GENERATION = file_utils.INDEX.generation
+
+        if interactive and snap["builtins"] == sorted(builtin.BUILTINS):
+            TRIE = trie.Trie.load(snap["trie"])
+            TRIE_GENERATION = SNAPSHOT_GENERATION
+
+    # Directories whose mtime doesn't match the snapshot are rescanned here
+    if interactive:
+        file_utils.INDEX.start()
+
+
+def saveSnapshot(interactive: bool = True) -> None:
+    """
+        Writes the snapshot if index or trie has changed since it was loaded
+
+        ARGS:
+            interactive: bool - if False, the snapshot is written only if
+                                lookups have refreshed the index: a script
+                                doesn't scan PATH just to save it
+    """
+
+    if not interactive and (not file_utils.INDEX.ready.is_set()
+                            or file_utils.INDEX.generation == SNAPSHOT_GENERATION):
+        return
+
+    updateTrie()
+
+    if SNAPSHOT_GENERATION == TRIE_GENERATION == file_utils.INDEX.generation:
+        return
+
+    snapshot.save(file_utils.INDEX.dump(), sorted(builtin.BUILTINS), TRIE.dump())
+
+
+def updateTrie() -> None:
+    """
+        Rebuilds completion trie if executable index has changed since the last build
+    """
+    global TRIE, TRIE_GENERATION
+
+    file_utils.INDEX.refresh()
+    executables = file_utils.INDEX.names()
+
+    if TRIE_GENERATION == file_utils.INDEX.generation:
+        return
+
+    newTrie = trie.Trie()
+
+    for c in list(builtin.BUILTINS.keys()) + list(executables.keys()):
+        newTrie.insert(c)
+
+    TRIE, TRIE_GENERATION = newTrie, file_utils.INDEX.generation
+
+# Per-prefix completion cache: readline calls completer once per state,
+# so matches are pulled from the lazy iterator only once per prefix
+COMPLETION_KEY = None
+COMPLETION_ITER = iter(())
+COMPLETION_MATCHES = []
+
+# words are split on blanks and operators only: a path is completed as a whole,
+# so "app/ma" is replaced with "app/main.py", not extended to "app/app/main.py"
+COMPLETER_DELIMS = " \t\n;|&<>()"
+COMMAND_START = re.compile(r"[;|&()]")
+
+
+def commandMatchings(word: str):
+    """
+        Yields completions of a command name (builtins and executables)
+    """
+
+    for match in TRIE.iterMatchings(word):
+        yield match + " "
+
+
+def pathMatchings(word: str, dirPart: str, namePart: str):
+    """
+        Yields completions of a path. Directories get "/" instead of a trailing space
+
+        ARGS:
+            word: str - word to be completed
+            dirPart: str - directory part of the word (up to the last "/")
+            namePart: str - part of the name after the last "/"
+    """
+
+    for name, isDir in file_utils.DIR_CACHE.matchings(dirPart or ".", namePart):
+        # hidden files are shown only if asked for explicitly
+        if name.startswith('.') and not namePart.startswith('.'):
+            continue
+
+        yield dirPart + name + ("/" if isDir else " ")
+
 
 def completer(text: str, state: int) -> str | None:
     """
-        Custom complition function
+        Custom complition function. Completes command names in command
+        position and file paths everywhere else
     """
-    line_buffer = readline.get_line_buffer()
-    cursor_pos = readline.get_endidx()
+    global COMPLETION_KEY, COMPLETION_ITER, COMPLETION_MATCHES
 
-    words = line_buffer[:cursor_pos]
-    word = words.split()[-1]
+    # text is the whole word being completed, see COMPLETER_DELIMS
+    word = text
+    before = readline.get_line_buffer()[:readline.get_begidx()]
 
-    matches = TRIE.getMatchings(word)
+    # only the current command matters
+    words = COMMAND_START.split(before)[-1].split()
 
-    try:
-        return matches[state] + " "
-    except:
-        return None
+    if state == 0:
+        if not words:
+            updateTrie()
+            key = (word, TRIE_GENERATION)
+            matchings = lambda: commandMatchings(word)
+        else:
+            dirPart, _, namePart = word.rpartition('/')
+            dirPart = dirPart + '/' if _ else ""
+
+            # DirCache restats the directory, so a changed listing gets a new key
+            dirName = os.path.abspath(dirPart or ".")
+            key = (word, dirName, file_utils.dirMtime(dirName))
+            matchings = lambda: pathMatchings(word, dirPart, namePart)
+
+        if COMPLETION_KEY != key:
+            COMPLETION_KEY = key
+            COMPLETION_ITER = matchings()
+            COMPLETION_MATCHES = []
+
+    # pull from iterator only as far as readline asks
+    while len(COMPLETION_MATCHES) <= state:
+        try:
+            COMPLETION_MATCHES.append(next(COMPLETION_ITER))
+        except StopIteration:
+            return None
+
+    return COMPLETION_MATCHES[state]
 
 
 def display(substring: str, matches: list[str], maxLen: int) -> None:
@@ -47,6 +183,10 @@ def display(substring: str, matches: list[str], maxLen: int) -> None:
             maxLen: int - maximum length of match
     """
 
+    # most frequently and recently used commands go first
+    names = {m.rstrip(): m for m in matches}
+    matches = [names[n] for n in ranking.RANKING.rank(list(names))]
+
     sys.stdout.write('\n')
     sys.stdout.write(" ".join(matches))
     sys.stdout.write('\n')
@@ -57,44 +197,190 @@ def display(substring: str, matches: list[str], maxLen: int) -> None:
     sys.stdout.flush()                              # make sure everything is written
 
 
-readline.set_completion_display_matches_hook(display)
-readline.set_completer(completer)
+def setupReadline() -> None:
+    """
+        Configures completion and history. Only needed in interactive mode
+    """
+
+    readline.parse_and_bind("tab: complete")
+    readline.set_completer_delims(COMPLETER_DELIMS)
+
+    readline.set_completion_display_matches_hook(display)
+    readline.set_completer(completer)
 
-readline.set_auto_history(False) # auto add doesn't add duplicates
+    readline.set_auto_history(False) # auto add doesn't add duplicates
 
 
+# ====================================== batch mode ============================
+
+USAGE = "usage: shell [-e] [-c command | script]\n"
+
+
+def runLine(rawArgs: str) -> int:
+    """
+        Runs a command line (or several lines of one construct)
+
+        RETURNS:
+            status: int - exit status of the line
+    """
+
+    try:
+        with trace.span("parse"):
+            tree = syntax.parse(rawArgs)
+
+        return executor.run(tree)
+    except (parser.ParseError, expansion.ExpansionError) as e:
+        sys.stderr.write(f"shell: {e}\n")
+        sys.stderr.flush()
+        variables.setStatus([1], [None])
+        return 1
+    except KeyboardInterrupt:
+        # Ctrl-C in a command substitution abandons the whole line
+        variables.setStatus([128 + signal.SIGINT], [None])
+        return 128 + signal.SIGINT
+
+
+def readMore(rawArgs: str, nextLine) -> str:
+    """
+        Appends lines until the command is complete: "a &&", "( cd dir",
+        "{ ...", unclosed $(...)
+
+        ARGS:
+            nextLine: callable - returns the next line, None at the end of input
+    """
+
+    while not syntax.isComplete(rawArgs):
+        if (line := nextLine()) is None:
+            break # runLine reports unexpected end of file
+
+        rawArgs += "\n" + line
+
+    return rawArgs
+
+
+def runBatch(stream, errexit: bool = False) -> int:
+    """
+        Runs commands line by line from a buffered stream. No prompt, no readline
+
+        ARGS:
+            stream: iterable of str - script lines
+            errexit: bool - stop on the first line with non-zero status (like sh -e)
+
+        RETURNS:
+            status: int - exit status of the last line
+    """
+
+    status = 0
+    lines = (line.rstrip('\n') for line in stream)
+
+    for line in lines:
+        status = runLine(readMore(line, lambda: next(lines, None)))
+
+        if errexit and status != 0:
+            break
+
+    return status
+
+
+def runNonInteractive(args: list[str]) -> None:
+    """
+        Parses command line options and runs a script, -c string or stdin.
+        Exits with the status of the last command
+    """
+
+    errexit = False
+    command = None
+
+    while args and args[0].startswith('-') and args[0] != '-':
+        option = args.pop(0)
+
+        if option == "-e":
+            errexit = True
+        elif option == "-c" and args:
+            command = args.pop(0)
+        else:
+            sys.stderr.write(USAGE)
+            sys.exit(2)
+
+    loadSnapshot(interactive=False)
+    atexit.register(saveSnapshot, interactive=False)
+
+    if command is not None:
+        status = runBatch(command.splitlines(), errexit)
+    elif args and args[0] != '-':
+        try:
+            with open(args[0], 'r', buffering=1 << 16) as f:
+                status = runBatch(f, errexit)
+        except OSError as e:
+            sys.stderr.write(f"shell: {args[0]}: {e.strerror}\n")
+            status = 127
+    else:
+        status = runBatch(sys.stdin, errexit)
+
+    sys.stdout.flush()
+    sys.exit(status)
+
+
+# ====================================== REPL ==================================
+
+def continuation() -> str | None:
+    """
+        Reads next line of an unfinished command with the "> " prompt
+    """
+
+    try:
+        return input("> ")
+    except EOFError:
+        return None
 
 def main():
-    # On startup configure history file
-    if HISTFILE := os.environ.get("HISTFILE"):
-        with open(HISTFILE, 'r') as f:
-            for line in f:
-                readline.add_history(line.strip())
+    # Script, -c string or piped stdin: run it without prompt and readline
+    if sys.argv[1:] or not sys.stdin.isatty():
+        runNonInteractive(sys.argv[1:])
 
-        def saveHistory() -> None:
-            """
-                Saves history to the file specified in HISTFILE variable
-            """
+    setupReadline()
+    loadSnapshot()
+    atexit.register(saveSnapshot)
 
-            with open(HISTFILE, 'w') as f:
-                length = readline.get_current_history_length()
+    # job control: shell has to be able to give the terminal to fg jobs and take it back
+    jobs.INTERACTIVE = True
+    signal.signal(signal.SIGTTOU, signal.SIG_IGN)
 
-                for i in range(1, length + 1):
-                    cmd = readline.get_history_item(i)
-                    f.write(cmd + "\n")
+    # On startup load the tail of the history file, new commands are appended to it as they run
+    if HISTFILE := os.environ.get("HISTFILE"):
+        journal.JOURNAL = journal.Journal(HISTFILE)
+        journal.JOURNAL.compact()
 
+        for line in journal.JOURNAL.tail(journal.limit("HISTSIZE")):
+            readline.add_history(line)
+            ranking.RANKING.add(line)
 
-        # Ensures that history would be saved
-        atexit.register(saveHistory)
+        builtin.PREVLEN = readline.get_current_history_length()
 
     while True:
-        # split raw string into command and (if any) "argument string"
-        rawArgs = input("$ ")
+        # notices about background jobs finished since the last prompt
+        if notices := jobs.notices():
+            sys.stdout.write(notices)
+            sys.stdout.flush()
+
+        try:
+            rawArgs = readMore(input("$ "), continuation)
+        except EOFError:
+            sys.stdout.write('\n')
+            break
+        except KeyboardInterrupt:
+            sys.stdout.write('\n')
+            continue
 
         readline.add_history(rawArgs) # I need duplicates to be added
+        builtin.CURRENT = readline.get_current_history_length()
+        ranking.RANKING.add(rawArgs)
+
+        if journal.JOURNAL is not None:
+            journal.JOURNAL.append(rawArgs)
 
-        commands, redirect = parser.getArgs(rawArgs)
-        pipes.runMultipleProc(commands, redirect)
+        if runLine(rawArgs) == 128 + signal.SIGINT:
+            sys.stdout.write('\n') # child was interrupted with Ctrl-C
 
 
 if __name__ == "__main__":
@@ -1,182 +1,644 @@
-def parse(rawArgs: str) -> list[str]:
+import re
+from functools import lru_cache
+
+
+class ParseError(Exception):
+    pass
+
+
+class Incomplete(ParseError):
     """
-        Parses raw string into arguments. Implimented as Finite State Machine
-        
-        ARGS:
-            rawArgs: str - string with argument values
-        RETURNS:
-            args: list[str] - list of arguments
+        Input ends inside of a construct: more lines are needed
     """
-    args = []
-    currentArg = ""
+    pass
+
+# Single-pass scanner. Every alternative consumes a whole run of characters
+# (a quoted string, a run of plain chars, an operator), so the Python-level
+# loop in scan() runs once per token part, not once per char.
+# Unclosed quotes take the rest of the line. Command substitutions nest,
+# so they are not matched by it, see scanParts. "#" starts a comment only
+# at the beginning of a word: echo a#b and echo "a"#b have none
+SCANNER = re.compile(r"""
+      \d*(?:>>|>&|>\||<>|<&|>|<)|&>>?   # redirect: >, 2>>, 2>&1, <, <>, &>, ...
+    | (?<![^\s|&;()<>])\#[^\n]*   # comment, up to the newline
+    | [^\s|'"\\<>&$`;()]+      # run of plain chars
+    | \$(?:[?$\#\d]|\w+|\{[^}]*\})?   # parameter or lone $
+    | [^\S\n]+                # blanks, newline is an operator
+    | &&|\|\||[|;()\n]         # control operator
+    | '[^']*'?                  # single quoted
+    | "(?:[^"\\]|\\.)*"?        # double quoted
+    | \\.?                     # escaped char
+    | &                         # "&" which is not a redirect
+""", re.VERBOSE | re.DOTALL)
+
+# Lines without these characters are split on blanks and pipes by FAST_SCANNER
+SPECIAL_CHARS = re.compile(r"""['"\\<>&$*?[`;()\n#]""")
+FAST_SCANNER = re.compile(r"\|\|?|[^\s|]+")
+
+
+class Op(str):
+    """
+        Control operator (|, ||, &&, ;, &, (, ), newline). A subclass of str,
+        so it compares with plain strings, but a quoted '|' word is never an Op
+    """
+    __slots__ = ()
 
-    inSingleQuote = False
-    inDoubleQuote = False
 
-    i = 0
-    while i < len(rawArgs):
-        char = rawArgs[i]
+OPERATORS = {text: Op(text) for text in ("|", "||", "&&", ";", "&", "(", ")", "\n")}
+PIPE = OPERATORS["|"]
 
-        if inSingleQuote:
-            if char == "'": inSingleQuote = False
-            else:
-                currentArg += char
-        elif inDoubleQuote:
-            if char == '\\' and rawArgs[i+1] in ['"', '\\', '$', '`']:
-                currentArg += rawArgs[i+1]
-                i += 2
-                continue
-            if char == '"': inDoubleQuote = False
-            else:
-                currentArg += char
-        else:
-            if char == "\\":
-                # Can't handle invalid quotes
-                currentArg += rawArgs[i+1]
-                i += 2
-                continue
-            elif char == "'":
-                inSingleQuote = True
-            elif char == '"':
-                inDoubleQuote = True
-            elif char == '|':
-                if currentArg:
-                    args.append(currentArg)
-                    currentArg = ''
-
-                args.append('|')
-            elif char.isdigit(): # head -n 5 >> file is not the same as head -n 5>> file!!!
-                if i + 2 < len(rawArgs) and rawArgs[i+1:i+3] == ">>":
-                    if currentArg:
-                        args.append(currentArg)
-                        currentArg = ''
-
-                    args.append(char + ">>")
-                    i+=3
-                    continue
-                elif i + 1 < len(rawArgs) and rawArgs[i+1] == '>':
-                    if currentArg:
-                        args.append(currentArg)
-                        currentArg = ''
-
-                    args.append(char + '>')
-                    i+=2
-                    continue
-                else:
-                    currentArg += char
+# Pattern characters of pathname expansion
+GLOB_CHARS = re.compile(r"[*?[]")
 
-            elif char in ">":
-                if currentArg:
-                    args.append(currentArg)
-                    currentArg = ''
+# File descriptor a redirect operator applies to if no number is given
+DEFAULT_FD = {">": 1, ">>": 1, ">&": 1, ">|": 1, "<": 0, "<>": 0, "<&": 0, "&>": 1, "&>>": 1}
 
-                if rawArgs[i+1] == '>':
-                    args.append('>>')
-                    i += 2
-                    continue
-                else:
-                    args.append('>')
+# Inside double quotes backslash escapes only these characters
+DOUBLE_QUOTE_ESCAPE = re.compile(r'\\([\\"$`])')
 
-            elif char == " ":
-                if currentArg:
-                    args.append(currentArg)
-                    currentArg = ""
-            else:
-                currentArg += char
+# Parts of double quoted string: escape, parameter, run of other chars
+DOUBLE_QUOTE_PARTS = re.compile(r"""
+      \\([\\"$`])
+    | (\$(?:[?$\#\d]|\w+|\{[^}]*\}))
+    | ([^\\$]+|.)
+""", re.VERBOSE | re.DOTALL)
+
+
+# Start of a command substitution: $(...) or `...`
+SUBST_START = re.compile(r"\$\(|`")
+
+# Inside double quotes: escape or ${...} (both skipped), start of a command substitution
+DOUBLE_QUOTE_SUBST = re.compile(r"\\.|\$\{[^}]*\}|\$\(|`", re.DOTALL)
+
+# Chars that can't open or close anything inside of a substitution body
+BODY_PLAIN = re.compile(r"""[^\\'"`$()]+""")
+
+# Inside backquotes backslash escapes only these characters
+BACKQUOTE_ESCAPE = re.compile(r"\\([\\$`])")
+
+
+# Parts of the word of unquoted ${NAME-word}: single quoted, escape, parameter, plain chars
+OPERAND_PART = re.compile(r"""'[^']*'?|\\.?|\$(?:[?$\#\d]|\w+|\{[^}]*\})?|[^'"\\$`]+""", re.DOTALL)
+
+# Inside of ${...}: name, optional [index], optional operator with a word
+PARAM_BODY = re.compile(r"([?$#]|\w+)(?:\[(\d+|@|\*)\])?(?:(:?[-=+?])(.*))?", re.DOTALL)
+
+
+class Param:
+    """
+        Reference to a parameter: $NAME, ${NAME}, ${NAME:-default}, ${PIPESTATUS[i]}, $?.
+        Unquoted references are split into fields after expansion
+    """
+    __slots__ = ("name", "index", "op", "word", "quoted")
+
+    def __init__(self, text: str, quoted: bool = False):
+        body = text[1:]
+        self.quoted = quoted
+        self.op, self.word = None, None
+
+        if body.startswith('{'):
+            body = body[1:-1]
+
+        match = PARAM_BODY.fullmatch(body)
+
+        if match is None:
+            raise ParseError(f"{text}: bad substitution")
+
+        self.name, index, self.op, word = match.groups()
+        self.index = int(index) if index and index.isdigit() else index
+
+        if self.op is not None:
+            # default/alternative value may reference parameters too,
+            # its expansion is split (or not) along with the whole reference.
+            # Quotes in it are removed unless the reference itself is quoted
+            self.word = makeWord(splitDoubleQuoted(word) if quoted else splitOperand(word))
+
+    def __repr__(self):
+        return f"Param({self.name}, {self.index}, {self.op}, {self.word})"
+
+
+class Subst:
+    """
+        Command substitution: $(source) or `source`. Expands to the output of
+        source with trailing newlines removed, unquoted output is split into
+        fields like an unquoted parameter. The source is parsed when it's run
+    """
+    __slots__ = ("source", "quoted")
+
+    def __init__(self, source: str, quoted: bool = False):
+        self.source = source
+        self.quoted = quoted
+
+    def __repr__(self):
+        return f"Subst({self.source})"
+
+
+class Word:
+    """
+        Word that needs expansion: sequence of literal strings, Params, Substs and Globs
+    """
+    __slots__ = ("parts",)
+
+    def __init__(self, parts: tuple):
+        self.parts = parts
+
+    def __repr__(self):
+        return f"Word{self.parts}"
+
+
+class Glob:
+    """
+        Unquoted text with pattern characters (*, ?, [...]), see globbing.py
+    """
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
 
-        i += 1
+    def __repr__(self):
+        return f"Glob({self.text})"
 
-    # Add the last arguments
-    if currentArg: args.append(currentArg)
 
-    return args
+class Redirect:
+    """
+        Single redirection: "2>>log" is Redirect(2, ">>", "log")
+    """
+    __slots__ = ("fd", "op", "target")
+
+    def __init__(self, fd: int, op: str, target: str | Word):
+        self.fd = fd
+        self.op = op
+        self.target = target
+
+    def __repr__(self):
+        return f"Redirect({self.fd}{self.op}{self.target})"
+
 
 class Token:
-    def __init__(self, commandName: str, args: list[str]):
+    __slots__ = ("commandName", "args", "redirects", "literal")
+
+    def __init__(self, commandName: str | Word, args: list[str | Word], redirects: list[Redirect] = ()):
         self.commandName = commandName
         self.args = args
+        self.redirects = redirects
+
+        # True if no word needs expansion, so token can be run as it is
+        # (words are plain strings or Words; map(type) is the cheap way to check it)
+        self.literal = commandName.__class__ is str and Word not in map(type, args) \
+                        and all(r.target.__class__ is str for r in redirects)
 
     def __repr__(self):
-        return self.commandName
+        return str(self.commandName)
 
-COMMAND = 1
-ARG = 2
-REDIRECT = 3
-FILE = 4
 
-class RawToken:
-    def __init__(self, value, tokenType):
-        self.value = value
-        self.type = tokenType
+def makeWord(parts: list) -> str | Word:
+    """
+        Joins parts of a word. Literal words become plain strings
+    """
 
-    # To debug
-    def __repr__(self):
-        return f"({self.value}, {self.type})"
+    if all(map(str.__instancecheck__, parts)):
+        return "".join(parts)
 
+    merged = []
 
-def tokenize(parsedString: list[str]) -> list[RawToken]:
-    tokens = []
+    for p in parts:
+        if isinstance(p, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += p
+        else:
+            merged.append(p)
 
-    i = 0
-    while i < len(parsedString):
-        currWord = parsedString[i]
+    return Word(tuple(merged))
 
-        if (i == 0) or tokens[-1].value == '|':
-            currToken = RawToken(currWord, COMMAND)
-        elif '>' in currWord: 
-            if not currWord[0].isdigit():
-                currToken = RawToken("1" + currWord, REDIRECT)
+
+def findClosing(raw: str, pos: int, closer: str) -> int:
+    """
+        Finds the end of a command substitution body starting at pos: the
+        matching ")" of "$(" or the next unescaped "`". Quotes, nested
+        substitutions and parentheses inside of "$(...)" are skipped
+
+        RETURNS:
+            end: int - index right after the closing char
+
+        RAISES:
+            ParseError - if the substitution is not closed
+    """
+
+    n = len(raw)
+    i = pos
+
+    if closer == '`':
+        while i < n:
+            if raw[i] == '\\':
+                i += 2
+            elif raw[i] == '`':
+                return i + 1
             else:
-                currToken = RawToken(currWord, REDIRECT)
-        elif '>' in tokens[-1].value:
-            currToken = RawToken(currWord, FILE)
-        elif currWord == '|':
-            currToken = RawToken(currWord, REDIRECT)
+                i += 1
+
+        raise Incomplete("unexpected EOF while looking for matching ``'")
+
+    depth = 0
+
+    while i < n:
+        if match := BODY_PLAIN.match(raw, i):
+            i = match.end()
+            continue
+
+        c = raw[i]
+
+        if c == '\\':
+            i += 2
+        elif c == "'":
+            if (i := raw.find("'", i + 1)) < 0:
+                break
+            i += 1
+        elif c == '"':
+            i = findQuoteEnd(raw, i + 1)
+        elif c == '`':
+            i = findClosing(raw, i + 1, '`')
+        elif raw.startswith("$(", i):
+            i = findClosing(raw, i + 2, ')')
+        elif c == '(':
+            depth += 1
+            i += 1
+        elif c == ')':
+            if depth == 0:
+                return i + 1
+
+            depth -= 1
+            i += 1
         else:
-            currToken = RawToken(currWord, ARG)
+            i += 1
 
-        tokens.append(currToken)
-        i += 1
+    raise Incomplete("unexpected EOF while looking for matching `)'")
 
-    return tokens
 
-def linkTokens(rawTokens: list[RawToken]) -> list[Token]:
-    tokens = []
-    
-    i = 0
+def findQuoteEnd(raw: str, pos: int) -> int:
+    """
+        Finds the end of a double quoted string with its content starting at pos.
+        Unclosed string takes the rest of the line
 
-    while i < len(rawTokens):
-        commandName = rawTokens[i].value
-        argList = []
+        RETURNS:
+            end: int - index right after the closing quote
+    """
 
-        i += 1
-        while i < len(rawTokens) and rawTokens[i].type == ARG:
-            argList.append(rawTokens[i].value)
+    n = len(raw)
+    i = pos
+
+    while i < n:
+        c = raw[i]
+
+        if c == '\\':
+            i += 2
+        elif c == '"':
+            return i + 1
+        elif c == '`':
+            i = findClosing(raw, i + 1, '`')
+        elif raw.startswith("$(", i):
+            i = findClosing(raw, i + 2, ')')
+        else:
             i += 1
 
-        if i < len(rawTokens):
-            currToken = Token(commandName, argList)
+    return n
+
+
+def backquoted(body: str, quoted: bool = False) -> Subst:
+    """
+        Makes substitution of `body`: backslash escapes \\, $ and ` in it
+    """
+
+    return Subst(BACKQUOTE_ESCAPE.sub(r"\1", body) if '\\' in body else body, quoted)
+
+
+def splitDoubleQuoted(content: str) -> list:
+    """
+        Unescapes double quoted string and finds parameters and command
+        substitutions in it
+    """
+
+    if not SUBST_START.search(content):
+        return splitPlainDoubleQuoted(content)
+
+    parts = []
+    start = pos = 0
+
+    while (match := DOUBLE_QUOTE_SUBST.search(content, pos)) is not None:
+        if match.group()[0] == '\\' or match.group().startswith("${"):
+            pos = match.end()
+            continue
+
+        if match.group() == '`':
+            end = findClosing(content, match.end(), '`')
+            subst = backquoted(content[match.end():end - 1], quoted=True)
+        else:
+            end = findClosing(content, match.end(), ')')
+            subst = Subst(content[match.end():end - 1], quoted=True)
+
+        if match.start() > start:
+            parts.extend(splitPlainDoubleQuoted(content[start:match.start()]))
+
+        parts.append(subst)
+        start = pos = end
+
+    if start < len(content):
+        parts.extend(splitPlainDoubleQuoted(content[start:]))
+
+    return parts
+
+
+def splitOperand(word: str) -> list:
+    """
+        Splits word of an unquoted ${NAME-word} like any other word: quotes
+        and escapes are removed, quoted text is literal
+    """
+
+    parts = []
+    pos, n = 0, len(word)
+
+    while pos < n:
+        c = word[pos]
+
+        if word.startswith("$(", pos):
+            end = findClosing(word, pos + 2, ')')
+            parts.append(Subst(word[pos + 2:end - 1]))
+        elif c == '`':
+            end = findClosing(word, pos + 1, '`')
+            parts.append(backquoted(word[pos + 1:end - 1]))
+        elif c == '"':
+            end = findQuoteEnd(word, pos + 1)
+            closed = end - 1 > pos and word[end - 1] == '"'
+            parts.extend(splitDoubleQuoted(word[pos + 1:end - 1 if closed else end]))
+        else:
+            text = OPERAND_PART.match(word, pos).group()
+            end = pos + len(text)
+
+            if c == "'":
+                parts.append(text[1:-1] if len(text) > 1 and text[-1] == "'" else text[1:])
+            elif c == '\\':
+                parts.append(text[1:])
+            elif c == '$' and len(text) > 1:
+                parts.append(Param(text))
+            else:
+                parts.append(text)
+
+        pos = end
 
-            if rawTokens[i].value == "|":
-                tokens.append(currToken)
-                i += 1                      
-            elif '>' in rawTokens[i].value:
-                tokens.append(currToken)
+    return parts
 
-                d = rawTokens[i].value[0] if rawTokens[i].value[0].isdigit() else None
-                mode = 'a' if '>>' in rawTokens[i].value else 'w'
-                fileName = rawTokens[i+1].value
 
-                return tokens, (int(d), mode, fileName)
-    else:
-        currToken = Token(commandName, argList)
-        tokens.append(currToken)
+def splitPlainDoubleQuoted(content: str) -> list:
+    """
+        Unescapes double quoted string (without command substitutions) and finds parameters in it
+    """
+
+    if '$' not in content:
+        return [DOUBLE_QUOTE_ESCAPE.sub(r'\1', content) if '\\' in content else content]
+
+    parts = []
+
+    for escaped, param, other in DOUBLE_QUOTE_PARTS.findall(content):
+        if param:
+            parts.append(Param(param, quoted=True))
+        else:
+            parts.append(escaped or other)
 
-    return tokens, None
+    return parts
 
 
+def splitBackground(rawArgs: str) -> tuple[str, bool]:
+    """
+        Cuts trailing "&" (run in background) off the command line
+
+        RETURNS:
+            (rawArgs, background): tuple[str, bool]
+    """
+
+    stripped = rawArgs.rstrip()
+
+    if not stripped.endswith('&'):
+        return rawArgs, False
+
+    # escaped \& is a literal char
+    body = stripped[:-1]
+    if (len(body) - len(body.rstrip('\\'))) % 2 == 1:
+        return rawArgs, False
+
+    return body, True
+
+
+def scanParts(rawArgs: str) -> list[str]:
+    """
+        Splits command line into token parts. Substitutions "$(...)" and "`...`"
+        (and double quoted strings having them) are found by matching their
+        closing chars, the rest is left to SCANNER
+
+        RAISES:
+            ParseError - if a substitution is not closed
+    """
+
+    if not SUBST_START.search(rawArgs):
+        return SCANNER.findall(rawArgs)
+
+    parts = []
+    pos, n = 0, len(rawArgs)
+
+    while pos < n:
+        if rawArgs.startswith("$(", pos):
+            end = findClosing(rawArgs, pos + 2, ')')
+        elif rawArgs[pos] == '`':
+            end = findClosing(rawArgs, pos + 1, '`')
+        elif rawArgs[pos] == '"':
+            end = findQuoteEnd(rawArgs, pos + 1)
+        else:
+            end = SCANNER.match(rawArgs, pos).end()
+
+        parts.append(rawArgs[pos:end])
+        pos = end
+
+    return parts
+
+
+def lex(rawArgs: str) -> tuple[list, list[tuple[int, int]]]:
+    """
+        Splits raw string into words, redirects and operators in one pass
+
+        ARGS:
+            rawArgs: str - command line (may have several lines)
+
+        RETURNS:
+            (items, spans) - items are words (str or Word, see expansion.py),
+                             Redirects with their targets and Ops; spans are
+                             (start, end) of every item in rawArgs
+
+        RAISES:
+            ParseError - on bad ${...}, unclosed command substitution or
+                         redirect without a target
+    """
+
+    if not SPECIAL_CHARS.search(rawArgs):
+        # fast path: no quotes, escapes, redirects or operators but pipes
+        items, spans = [], []
+
+        for match in FAST_SCANNER.finditer(rawArgs):
+            text = match.group()
+            items.append(OPERATORS[text] if text[0] == '|' else text)
+            spans.append(match.span())
+
+        return items, spans
+
+    items, spans = [], []
+
+    parts = []              # parts of the current word
+    inWord = False          # True if current word has started (it may be empty: '')
+    wordStart = 0           # where the current word (or pending redirect) has started
+    pendingRedirect = None  # redirect waiting for its target
+    pos = 0
+
+    for part in scanParts(rawArgs):
+        partStart = pos
+        pos += len(part)
+        c = part[0]
+
+        if c == '#' and not inWord:
+            # comment: a "#" glued to a word is matched as plain chars instead
+            continue
+
+        if c.isdigit() and part[-1] in "<>&|":
+            if inWord:
+                # digits glued to a word are part of it: echo abc1>file
+                digits = part.rstrip("<>&|")
+                parts.append(digits)
+                part = part[len(digits):]
+                partStart += len(digits)
+
+            c = '>'
+        elif c == '&' and len(part) > 1 and part[1] == '>':
+            c = '>'
+
+        if c == '>' or c == '<' or c.isspace() or part in OPERATORS:
+            if inWord:
+                word = makeWord(parts)
+
+                if pendingRedirect is not None:
+                    items.append(Redirect(*pendingRedirect, word))
+                    pendingRedirect = None
+                else:
+                    items.append(word)
+
+                spans.append((wordStart, partStart))
+                parts, inWord = [], False
+
+            if pendingRedirect is not None and not (c.isspace() and part != '\n'):
+                raise ParseError(f"syntax error near unexpected token `{'newline' if part == chr(10) else part}'")
+
+            if c == '>' or c == '<':
+                op = part.lstrip("0123456789")
+                d = part[:len(part) - len(op)]
+                pendingRedirect = (int(d) if d else DEFAULT_FD[op], op)
+                wordStart = partStart
+            elif part in OPERATORS:
+                items.append(OPERATORS[part])
+                spans.append((partStart, pos))
+
+            continue
+
+        if not inWord and pendingRedirect is None:
+            wordStart = partStart
+
+        if c == "'":
+            part = part[1:-1] if len(part) > 1 and part[-1] == "'" else part[1:]
+        elif c == '"':
+            part = part[1:]
+
+            if part and part[-1] == '"':
+                # quote is closing unless it's escaped by odd number of backslashes
+                content = part[:-1]
+                if (len(content) - len(content.rstrip('\\'))) % 2 == 0:
+                    part = content
+
+            parts.extend(splitDoubleQuoted(part))
+            inWord = True
+            continue
+        elif c == '\\':
+            part = part[1:]
+        elif c == '$' and part.startswith("$("):
+            part = Subst(part[2:-1])
+        elif c == '`':
+            part = backquoted(part[1:-1])
+        elif c == '$' and len(part) > 1:
+            part = Param(part)
+        elif GLOB_CHARS.search(part):
+            part = Glob(part)
+
+        parts.append(part)
+        inWord = True
+
+    # Add the last word
+    if inWord:
+        word = makeWord(parts)
+
+        if pendingRedirect is not None:
+            items.append(Redirect(*pendingRedirect, word))
+        else:
+            items.append(word)
+
+        spans.append((wordStart, pos))
+    elif pendingRedirect is not None:
+        raise ParseError("syntax error near unexpected token `newline'")
+
+    return items, spans
+
+
+def scan(rawArgs: str) -> tuple[list[Token], bool]:
+    """
+        Splits raw string into pipeline of commands in one pass. Lines with
+        lists and groups (;, &&, ( ... )) are parsed by syntax.parse
+
+        ARGS:
+            rawArgs: str - command line
+
+        RETURNS:
+            (tokens, background) - commands of the pipeline (with their redirects)
+                                   and True if the line ends with "&".
+                                   Words with parameters are Word objects, see expansion.py
+
+        RAISES:
+            ParseError - on bad ${...}, unclosed command substitution or
+                         an operator other than "|"
+    """
+
+    rawArgs, background = splitBackground(rawArgs)
+
+    tokens = []
+    words, redirects = [], []
+
+    for item in lex(rawArgs)[0]:
+        cls = item.__class__
+
+        if cls is Op:
+            if item != PIPE:
+                raise ParseError(f"syntax error near unexpected token `{item}'")
+
+            if words:
+                tokens.append(Token(words[0], words[1:], redirects))
+            words, redirects = [], []
+        elif cls is Redirect:
+            redirects.append(item)
+        else:
+            words.append(item)
+
+    if words:
+        tokens.append(Token(words[0], words[1:], redirects))
+
+    return tokens, background
+
+
+@lru_cache(maxsize=1024)
 def getArgs(inputLine: str):
-    parsedString = parse(inputLine)
-    rawTokens = tokenize(parsedString)
-    tokens, redirect = linkTokens(rawTokens)
-    return tokens, redirect
+    """
+        Parses command line. Results are cached by the raw line, as scripts and
+        loops run the same lines over and over. Returned tokens are shared
+        between calls, so they must not be modified
+    """
+
+    return scan(inputLine)
@@ -0,0 +1,104 @@
+import os
+import fcntl
+from functools import lru_cache
+
+import app.variables as variables
+
+# Pipes of a pipeline are made here. By default they are plain pipes with
+# the kernel's 64 KiB buffer. High-volume pipelines (zcat big.log.gz | grep ...)
+# spend much of their time switching between writer and reader, a larger
+# buffer lets each side do more work per wakeup:
+#   SHELL_PIPE_SIZE=1M   - pipe capacity in bytes (k/m suffixes), "max" for
+#                          /proc/sys/fs/pipe-max-size
+#   SHELL_PIPE_MODE=packet - O_DIRECT pipes: every write is a packet, a read
+#                          returns at most one packet. Meant for readers that
+#                          read whole records, anything reading less than
+#                          PIPE_BUF at a time loses the rest of the packet
+# Both are read as shell variables, so they can be set for the session without
+# exporting them, or come from the environment
+
+SIZE_VAR = "SHELL_PIPE_SIZE"
+MODE_VAR = "SHELL_PIPE_MODE"
+
+MAX_SIZE_FILE = "/proc/sys/fs/pipe-max-size"
+DEFAULT_MAX_SIZE = 1 << 20
+
+F_SETPIPE_SZ = getattr(fcntl, "F_SETPIPE_SZ", None)
+F_GETPIPE_SZ = getattr(fcntl, "F_GETPIPE_SZ", None)
+O_DIRECT = getattr(os, "O_DIRECT", 0)
+
+SUFFIXES = {"k": 1 << 10, "m": 1 << 20, "g": 1 << 30}
+
+
+@lru_cache(maxsize=1)
+def maxSize() -> int:
+    """
+        Largest capacity an unprivileged process may give a pipe
+    """
+
+    try:
+        with open(MAX_SIZE_FILE) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return DEFAULT_MAX_SIZE
+
+
+@lru_cache(maxsize=16)
+def parseSize(text: str) -> int | None:
+    """
+        Returns requested capacity of "65536", "256k", "1M" or "max",
+        None if the text is empty or not a size
+    """
+
+    text = text.strip().lower()
+
+    if not text:
+        return None
+
+    if text == "max":
+        return maxSize()
+
+    scale = SUFFIXES.get(text[-1], 1)
+    digits = text[:-1] if scale != 1 else text
+
+    if not digits.isdigit():
+        return None
+
+    return min(int(digits) * scale, maxSize())
+
+
+def makePipe() -> tuple[int, int]:
+    """
+        Creates pipe (both ends close-on-exec) configured by SHELL_PIPE_SIZE
+        and SHELL_PIPE_MODE
+
+        RETURNS:
+            (r, w): tuple[int, int] - read and write ends
+    """
+
+    flags = os.O_CLOEXEC
+
+    if O_DIRECT and variables.get(MODE_VAR) == "packet":
+        flags |= O_DIRECT
+
+    r, w = os.pipe2(flags)
+
+    if F_SETPIPE_SZ is not None and (size := parseSize(variables.get(SIZE_VAR))):
+        try:
+            fcntl.fcntl(w, F_SETPIPE_SZ, size)
+        except OSError:
+            # EPERM: user's total of pipe pages is over the soft limit,
+            # the pipe keeps its default size
+            pass
+
+    return r, w
+
+
+def capacity(fd: int) -> int | None:
+    if F_GETPIPE_SZ is None:
+        return None
+
+    try:
+        return fcntl.fcntl(fd, F_GETPIPE_SZ)
+    except OSError:
+        return None
@@ -1,161 +1,605 @@
 import os
 import signal
+import contextlib
 import sys
+import time
+import threading
 import app.file_utils as file_utils
 import app.builtin as builtin
+import app.parser as parser
+import app.launcher as launcher
+import app.expansion as expansion
+import app.variables as variables
+import app.redirects as redirects
+import app.streams as streams
+import app.globbing as globbing
+import app.timing as timing
+import app.trace as trace
+import app.filters as filters
+import app.pipebuf as pipebuf
+
+# builtins changing the shell itself: as pipeline stages they run in a forked
+# copy of the shell, so "cd /tmp | cat" leaves the shell where it was
+SHELL_STATE_BUILTINS = {"cd", "export", "hash"}
+
+
+def callBuiltin(c: parser.Token, table: redirects.StreamTable) -> int:
+    """
+        Calls builtin (or native filter) and turns its result into exit status
 
-def runMultipleProc(cmds: list[Token], redirect: tuple[str] | None):
+        RETURNS:
+            status: int - exit status of the builtin
     """
-        Creates UNIX pipeline for commands in cmds list.
+
+    with trace.span("builtin", cmd=c.commandName) as span:
+        if c.commandName in builtin.BUILTINS:
+            status = builtin.BUILTINS[c.commandName](c.args, table.out, table.err)
+        else:
+            status = filters.run(c.commandName, c.args, table.inFd, table.out, table.err)
+
+        status = 0 if status is None else status
+        span.set("status", status)
+
+    return status
+
+
+def writeError(c: parser.Token, e: OSError) -> int:
+    """
+        Reports output of a builtin which couldn't be written, like bash does:
+        "echo: write error: No space left on device"
+
+        RETURNS:
+            status: int - exit status of the builtin (1)
+    """
+
+    sys.stderr.write(f"{c.commandName}: write error: {e.strerror}\n")
+    sys.stderr.flush()
+
+    return 1
+
+
+def closeStreams(c: parser.Token, table: redirects.StreamTable, status: int) -> int:
+    """
+        Closes streams of a finished builtin
+
+        RETURNS:
+            status: int - status of the builtin, 1 if its buffered output couldn't be written
+    """
+
+    try:
+        table.close()
+    except OSError as e:
+        return writeError(c, e)
+
+    return status
+
+
+def changesShell(c) -> bool:
+    """
+        True for cd, export, hash, history -r/-a and NAME=value alone:
+        commands which change the shell they run in
+    """
+
+    if not isinstance(c, parser.Token):
+        return False
+
+    if c.commandName == "history":
+        # -r reads into the history list, -a moves the mark of appended commands
+        return c.args[:1] in (["-r"], ["-a"])
+
+    return c.commandName in SHELL_STATE_BUILTINS or (not c.args and variables.ASSIGNMENT.match(c.commandName) is not None)
+
+
+def needsSubshell(c: parser.Token, background: bool) -> bool:
+    """
+        True for a builtin stage which can't run on a thread of the shell:
+        one changing the shell, or any builtin of a background job, where
+        wait, fg or exit would act on the shell itself
+    """
+
+    return changesShell(c) or (background and c.commandName in builtin.BUILTINS)
+
+
+def inProcess(c: parser.Token, piped: bool) -> bool:
+    """
+        True if command is run inside of the shell: a builtin or a native filter.
+        Filters which would read the terminal are left to the real programs,
+        so job control and Ctrl-C keep working for them
 
         ARGS:
-            cmds: list[Token] - list of tokens to be run
-            redirect: tuple[str] - is not None, consists of file desctiptor 
-                                    to be redirectred, file open mode
-                                    and name of the file to be opened
-            rawCommand: str - full command string to be added into HISTORY list
+            c: Token - expanded command
+            piped: bool - stdin of the command is a pipe of the pipeline
     """
 
-    if len(cmds) == 1:
-        c = cmds[0]
-        cName = c.commandName
-        cArgs = c.args
+    if not isinstance(c, parser.Token):
+        # ( ... ) and { ...; } stages are forked
+        return False
 
-        args = [cName, cName] + cArgs
+    if c.commandName in builtin.BUILTINS:
+        return True
 
-        oldD = None
+    if not filters.accepts(c.commandName, c.args):
+        return False
 
-        if redirect is not None:
-            d, mode, fileName = redirect
+    if piped or any(r.fd == 0 for r in c.redirects) or not filters.readsStdin(c.commandName, c.args):
+        return True
 
-            flags = os.O_WRONLY | os.O_CREAT
+    return not os.isatty(0)
 
-            if mode == "a":
-                flags |= os.O_APPEND
-            else:
-                flags |= os.O_TRUNC
 
-            fileDesc = os.open(fileName, flags, 0o644)
-            
-            oldD = os.dup(d)
-            os.dup2(fileDesc, d)
-            os.close(fileDesc)
+class BuiltinStage:
+    """
+        Builtin running inside of a pipeline on a worker thread of the shell
+        process. It writes into its own streams over the pipe end (or redirect
+        files), so shell's sys.stdout is never touched and no fork is needed
+    """
 
-        if cName in builtin.BUILTINS:
-            builtin.BUILTINS[cName](cArgs)
-        elif cName in file_utils.EXECUTABLES:
-            pid = os.fork()
+    def __init__(self, c: parser.Token, table: redirects.StreamTable, timed: bool = False):
+        self.c = c
+        self.table = table
+        self.timed = timed
+        self.status = 0
+        self.ended = 0      # monotonic ns
+        self.times = None   # (user, sys) CPU seconds of the thread
+        self.written = None # bytes written by the thread (only for "time")
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        user, system = timing.threadTimes()
+
+        if self.timed:
+            written = timing.ioWritten("/proc/thread-self/io")
+            spliced = filters.SPLICED.count
+
+        try:
+            self.status = callBuiltin(self.c, self.table)
+            self.table.flush()
+        except SystemExit as e:
+            # exit inside of a pipeline ends only its own stage
+            self.status = e.code if isinstance(e.code, int) else 0
+        except BrokenPipeError:
+            self.status = 128 + signal.SIGPIPE
+        except OSError as e:
+            self.status = writeError(self.c, e)
+        except filters.Interrupted:
+            self.status = 128 + signal.SIGINT
+        except builtin.LoopControl:
+            # a pipeline stage is a subshell: break and continue end only the stage
+            self.status = 0
+        finally:
+            self.status = closeStreams(self.c, self.table, self.status)
+
+            endUser, endSystem = timing.threadTimes()
+            self.times = (endUser - user, endSystem - system)
+
+            if self.timed and written is not None:
+                self.written = timing.ioWritten("/proc/thread-self/io") - written + filters.SPLICED.count - spliced
+
+            self.ended = time.monotonic_ns()
+
+    def wait(self) -> int:
+        self.thread.join()
+        return self.status
+
+
+def builtinStreams(c: parser.Token, outFd: int | None = None, inFd: int | None = None,
+                   capture: streams.CaptureStream | None = None) -> redirects.StreamTable | None:
+    """
+        Builds streams of a builtin: pipe ends (if any) with redirects applied on top
 
-            if pid == 0:
-                os.execlp(*args)
+        ARGS:
+            c: Token - builtin to be run
+            outFd: int | None - write end of the next pipe, owned by the table from now on
+            inFd: int | None - read end of the previous pipe (for filters), owned by the table too
+            capture: CaptureStream | None - in-memory stdout of a command substitution
 
-            os.wait()
-        else:
-            sys.stderr.write(f"{cName}: command not found\n")
+        RETURNS:
+            table: StreamTable | None - None if a redirect failed (error is reported)
+    """
+
+    # builtin writes straight to fd 1 and 2, shell's own buffered output goes first
+    sys.stdout.flush()
+
+    table = redirects.StreamTable(streams.OutputStream(1), streams.OutputStream(2))
+
+    if outFd is not None:
+        table.add(1, streams.OutputStream(outFd, owned=True))
+
+    if inFd is not None:
+        table.add(0, streams.OutputStream(inFd, owned=True))
+
+    if capture is not None:
+        table.add(1, capture)
+
+    try:
+        table.apply(redirects.compilePlan(c.redirects))
+    except (OSError, redirects.RedirectError) as e:
+        redirects.reportError(e)
+        table.close()
+        return None
+
+    return table
+
+
+def startBuiltinStage(c: parser.Token, inFd: int | None, outFd: int | None, timed: bool = False) -> BuiltinStage | None:
+    """
+        Starts builtin (or native filter) pipeline stage on a worker thread
+
+        ARGS:
+            c: Token - builtin to be run
+            inFd: int | None - read end of the previous pipe, owned by the stage from now on
+            outFd: int | None - write end of the next pipe, owned by the stage from now on
+            timed: bool - count bytes the stage writes
+    """
+
+    # nobody reads stdin of a builtin, closing it lets the writer get SIGPIPE
+    if inFd is not None and c.commandName in builtin.BUILTINS:
+        os.close(inFd)
+        inFd = None
+
+    if (table := builtinStreams(c, outFd, inFd)) is None:
+        return None
+
+    return BuiltinStage(c, table, timed)
+
+
+def startStage(c: parser.Token, fileActions: list[tuple], pgroup: int | None = None) -> tuple[int | None, int]:
+    """
+        Starts external command of a pipeline
+
+        ARGS:
+            c: Token - command to be run
+            fileActions: list[tuple] - pipe and redirect actions for the child
+            pgroup: int | None - process group to put the child in (0 - new group)
+
+        RETURNS:
+            (pid, status): tuple[int | None, int] - pid of the child or None and
+                                                    exit status if it couldn't be started
+    """
+
+    cName = c.commandName
+
+    if (fullPath := file_utils.locate(cName)) is None:
+        sys.stderr.write(f"{cName}: command not found\n")
+        sys.stderr.flush()
+        return None, 127
+
+    try:
+        with trace.span("spawn", cmd=cName, path=fullPath) as span:
+            pid = launcher.spawn(fullPath, [cName] + c.args, fileActions, pgroup)
+            span.set("child", pid)
+
+        return pid, 0
+    except OSError as e:
+        # posix_spawn doesn't tell a bad redirect from a bad program
+        if (message := redirects.explainFailure(fileActions)) is not None:
+            sys.stderr.write(message + "\n")
             sys.stderr.flush()
+            return None, 1
+
+        sys.stderr.write(f"{cName}: {e.strerror}\n")
+        sys.stderr.flush()
+        return None, 126
+
+
+class Pipeline:
+    """
+        Started pipeline: children and builtin threads of every stage
+    """
+
+    def __init__(self, size: int, timed: bool = False):
+        self.timed = timed
+        self.statuses = [0] * size
+        self.rusages = [None] * size
+        self.pids = {}      # stage number -> pid
+        self.stages = {}    # stage number -> BuiltinStage
+        self.pgid = None    # process group of a background pipeline
+
+        # for "time": monotonic ns of start and end, CPU times of builtin stages
+        self.started = [0] * size
+        self.ended = [0] * size
+        self.times = [None] * size
+
+        # for "time" too: bytes written by every stage, capacity of every pipe
+        self.written = [None] * size
+        self.capacities = [None] * max(0, size - 1)
+
+
+def runMultipleProc(cmds: list[parser.Token], timed: bool = False):
+    """
+        Creates UNIX pipeline for commands in cmds list.
+
+        Every stage is reaped and its exit status and resource usage are
+        recorded in variables ($? and PIPESTATUS). Upstream stages are not
+        killed: they end on their own (by SIGPIPE if the reader is gone)
+
+        ARGS:
+            cmds: list[Token] - list of tokens to be run, each with its own redirects
+                                (or compound commands, see syntax.py)
+            timed: bool - report times of the pipeline and its stages ("time" keyword)
+
+        RETURNS:
+            status: int - exit status of the last command
+    """
+
+    started = time.monotonic_ns()
+
+    variables.SUBST_STATUS = None
+    cmds = expandCommands(cmds)
+    lone = cmds[0] if len(cmds) == 1 and isinstance(cmds[0], parser.Token) else None
+
+    # status of a command without a command is the one of its last substitution
+    if lone is not None and not lone.commandName and not lone.args:
+        # command expanded to nothing ($EMPTY)
+        status = variables.SUBST_STATUS or 0
+        variables.setStatus([status], [None])
+        return status
+
+    if lone is not None and not lone.args and variables.ASSIGNMENT.match(lone.commandName):
+        # NAME=value alone on the line
+        name, _, value = lone.commandName.partition('=')
+        variables.assign(name, value)
+        status = variables.SUBST_STATUS or 0
+        variables.setStatus([status], [None])
+        return status
+
+    if lone is not None and inProcess(lone, piped=False):
+        pipeline = Pipeline(1, timed=timed)
+        status = runBuiltin(cmds[0], pipeline)
+        variables.setStatus([status], [None])
+    else:
+        pipeline = startPipeline(cmds, timed=timed)
+        status = waitPipeline(pipeline)
+
+    if timed:
+        sys.stderr.write(timing.report(cmds, pipeline, (time.monotonic_ns() - started) / 1e9))
+        sys.stderr.flush()
+
+    return status
 
-        # Return descriptors as they were 
-        if oldD is not None:
-            os.dup2(oldD, d)
-            os.close(oldD)
 
-        return 0
+def expandCommands(cmds: list[parser.Token]) -> list[parser.Token]:
+    """
+        Expands every simple command of a pipeline. Compound commands are
+        expanded by the forked shell running them
+
+        RAISES:
+            ExpansionError - on ${NAME:?word} with NAME not set
+            ParseError - on a bad command substitution
+    """
+
+    with trace.span("expand", stages=len(cmds)):
+        # directories are listed once per command line, however many patterns walk them
+        listings = globbing.Listings()
 
+        return [expansion.expandToken(c, listings) if isinstance(c, parser.Token) else c for c in cmds]
+
+
+def runBuiltin(c: parser.Token, pipeline: Pipeline) -> int:
+    """
+        Runs a lone builtin right in the shell's main thread (cd and exit
+        have to change the shell itself)
+
+        RETURNS:
+            status: int - exit status of the builtin
+    """
+
+    pipeline.started[0] = time.monotonic_ns()
+    # two getrusage calls are most of the cost of "x=1" or ":", skipped unless timed
+    user, system = timing.threadTimes() if pipeline.timed else (0.0, 0.0)
+
+    # redirects go to the builtin's own streams, shell's fds stay as they are
+    if (table := builtinStreams(c)) is None:
+        status = 1
     else:
-        pids = []
-        rs, ws = [], []
+        status = 1
+
+        try:
+            status = callBuiltin(c, table)
+        except KeyboardInterrupt:
+            # Ctrl-C during a long filter (cat of a huge file) ends only the filter
+            status = 128 + signal.SIGINT
+        except OSError as e:
+            # a full buffer is written out while the builtin runs
+            status = writeError(c, e)
+        finally:
+            # exit, break and continue go on after their streams are closed
+            status = closeStreams(c, table, status)
 
-        rPrev, wPrev = None, None
+    if pipeline.timed:
+        endUser, endSystem = timing.threadTimes()
+        pipeline.times[0] = (endUser - user, endSystem - system)
 
-        isLast = False
+    pipeline.ended[0] = time.monotonic_ns()
+    pipeline.statuses[0] = status
 
-        for i, c in enumerate(cmds):
-            rCur, wCur = os.pipe()
-            rs.append(rCur); ws.append(wCur)
+    return status
 
-            if i == len(cmds) - 1:
+
+def runBackground(cmds: list[parser.Token]) -> Pipeline:
+    """
+        Starts pipeline in background (command ending with "&")
+
+        RETURNS:
+            pipeline: Pipeline - started pipeline, to be registered in jobs
+    """
+
+    cmds = expandCommands(cmds)
+
+    variables.setStatus([0], [None])
+
+    return startPipeline(cmds, background=True)
+
+
+def startPipeline(cmds: list[parser.Token], background: bool = False, timed: bool = False,
+                  outFd: int | None = None) -> Pipeline:
+    """
+        Starts all stages of a pipeline without waiting for them
+
+        ARGS:
+            cmds: list[Token] - list of tokens to be run (already expanded),
+                                compound commands are run by forked shells
+            background: bool - put children into their own process group
+                               and detach stdin from the terminal
+            timed: bool - measure what goes through the pipes ("time" keyword)
+            outFd: int | None - stdout of the last stage (command substitution),
+                                owned by the pipeline from now on
+
+        RETURNS:
+            pipeline: Pipeline - started pipeline
+    """
+
+    pipeline = Pipeline(len(cmds), timed)
+    rPrev = None
+
+    for i, c in enumerate(cmds):
+        isLast = i == len(cmds) - 1
+        pipeline.started[i] = pipeline.ended[i] = time.monotonic_ns()
+
+        if not isLast:
+            rCur, wCur = pipebuf.makePipe() # both ends are close-on-exec
+
+            if timed:
+                pipeline.capacities[i] = pipebuf.capacity(wCur)
+        else:
+            rCur, wCur = None, outFd
+
+        inShell = inProcess(c, piped=rPrev is not None)
+
+        if inShell and not needsSubshell(c, background):
+            # stage takes ownership of rPrev and wCur
+            stage = startBuiltinStage(c, rPrev, wCur, timed)
+
+            if stage is not None:
+                pipeline.stages[i] = stage
+            else:
+                pipeline.statuses[i] = 1
+        else:
+            # pipe ends first, so the command's own redirects override them
+            fileActions = []
+            pgroup = None
+
+            if rPrev is not None:
+                fileActions.append((os.POSIX_SPAWN_DUP2, rPrev, 0))
+            elif background:
+                fileActions.append((os.POSIX_SPAWN_OPEN, 0, os.devnull, os.O_RDONLY, 0))
+
+            if wCur is not None:
+                fileActions.append((os.POSIX_SPAWN_DUP2, wCur, 1))
+
+            if background:
+                pgroup = 0 if pipeline.pgid is None else pipeline.pgid
+
+            if not isinstance(c, parser.Token):
+                # compound command applies its own redirects in the forked shell
+                pid, status = executor.forkShell(lambda c=c: executor.runBody(c), fileActions, pgroup), None
+            elif inShell:
+                # already expanded: all its words are plain strings, expanding them again changes nothing
+                pid, status = executor.forkShell(lambda c=c: runMultipleProc([c]), fileActions, pgroup), None
+            else:
+                try:
+                    fileActions.extend(redirects.compilePlan(c.redirects))
+                except redirects.RedirectError as e:
+                    redirects.reportError(e)
+                    pid, status = None, 1
+                else:
+                    pid, status = startStage(c, fileActions, pgroup)
+
+            # Parent doesn't need pipe ends passed to the child
+            if rPrev is not None:
+                os.close(rPrev)
+            if wCur is not None:
                 os.close(wCur)
-                wCur = None
 
-                isLast = True
+            if pid is not None:
+                pipeline.pids[i] = pid
+
+                if background and pipeline.pgid is None:
+                    pipeline.pgid = pid
+            else:
+                pipeline.statuses[i] = status
+
+        rPrev = rCur
+
+    return pipeline
+
 
-            pid = os.fork()
-            pids.append(pid)
+def setInterrupt(signum, frame) -> None:
+    filters.INTERRUPT.set()
 
-            if pids[-1] == 0:
-                cName = c.commandName
-                cArgs = c.args
 
-                args = [cName, cName] + cArgs
+@contextlib.contextmanager
+def forwardInterrupt():
+    """
+        Ctrl-C is meant for the children, the shell itself keeps running.
+        Stages on threads can't be signalled, they are asked to stop instead
+    """
 
-                
-                # overload pipe if there's redirect in the end
-                if isLast and redirect is not None:
-                    d, mode, fileName = redirect
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
 
-                    flags = os.O_WRONLY | os.O_CREAT
+    oldHandler = signal.signal(signal.SIGINT, setInterrupt)
 
-                    if mode == "a":
-                        flags |= os.O_APPEND
-                    else:
-                        flags |= os.O_TRUNC
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, oldHandler)
 
-                    fileDesc = os.open(fileName, flags, 0o644)
-                    
-                    os.dup2(fileDesc, d)
-                    os.close(fileDesc)
+        # nested in another wait (command substitution reading its pipe)
+        # the request stays for the outer one
+        if oldHandler is not setInterrupt:
+            filters.INTERRUPT.clear()
 
-                # Close descriptors
 
-                if rPrev is not None:
-                    os.dup2(rPrev, 0)
-                if wCur is not None:
-                    os.dup2(wCur, 1)
+def waitPipeline(pipeline: Pipeline) -> int:
+    """
+        Reaps every stage, collecting its status and resource usage
 
-                if rPrev is not None:
-                    os.close(rPrev)
-                if wPrev is not None:
-                    os.close(wPrev)
+        RETURNS:
+            status: int - exit status of the last command
+    """
 
-                if wCur is not None:
-                    os.close(wCur)
+    with forwardInterrupt():
+        for i, pid in pipeline.pids.items():
+            with trace.span("wait", child=pid, stage=i) as span:
+                if pipeline.timed:
+                    # /proc/<pid>/io is gone once the child is reaped
+                    os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+                    pipeline.written[i] = timing.ioWritten(f"/proc/{pid}/io")
 
-                os.close(rCur)
+                _, waitStatus, rusage = os.wait4(pid, 0)
+                span.set("status", launcher.exitStatus(waitStatus))
 
-                if cName in builtin.BUILTINS:
-                    builtin.BUILTINS[cName](cArgs)
-                    sys.exit(0)
-                elif cName in file_utils.EXECUTABLES:
-                    os.execlp(*args)
+            # stages are reaped in order, a stage which has finished before
+            # the previous one gets the previous one's end time
+            pipeline.ended[i] = time.monotonic_ns()
+            pipeline.statuses[i] = launcher.exitStatus(waitStatus)
+            pipeline.rusages[i] = rusage
 
-            rPrev, wPrev = rCur, wCur
+        for i, stage in pipeline.stages.items():
+            pipeline.statuses[i] = stage.wait()
+            pipeline.ended[i], pipeline.times[i] = stage.ended, stage.times
+            pipeline.written[i] = stage.written
 
-        # Close all file descriptors in the parent process
-        for r, w in zip(rs, ws):
-            try: # If we try to close alredy closed descriptor
-                os.close(w)
-            except: pass
-            try:
-                os.close(r)
-            except: pass
+        # Ctrl-C ends in-process stages too, even those which have seen EOF first
+        if filters.INTERRUPT.is_set():
+            for i in pipeline.stages:
+                pipeline.statuses[i] = 128 + signal.SIGINT
 
-        # Wait for the last process to end
-        if isLast:
-            pidLst = pids.pop()
-            os.waitpid(pidLst, 0)
+    variables.setStatus(pipeline.statuses, pipeline.rusages)
 
-        # Terminate all other processes
-        for pid in reversed(pids):
-            os.kill(pid, signal.SIGTERM)
-            os.waitpid(pid, 0)
+    return pipeline.statuses[-1]
 
 
 def main():
     inputLine = input("$ ")
 
-    commands, redirect = parser.getArgs(inputLine)
+    commands, _ = parser.getArgs(inputLine)
 
-    runMultipleProc(commands, redirect)
+    runMultipleProc(commands)
 
 
 if __name__ == "__main__":
@@ -164,3 +608,4 @@ if __name__ == "__main__":
     main()
 else:
     import app.builtin as builtin
+    import app.executor as executor
@@ -0,0 +1,81 @@
+import heapq
+
+HALF_LIFE = 200 # number of commands after which a use counts half as much
+TOP_K = 10      # how many ranked candidates are shown in front of the others
+
+
+def commandNames(line: str) -> list[str]:
+    """
+        Cheap extraction of command names from a history line: first word of
+        every pipeline stage. Quotes are not handled, it's only used for ranking
+
+        ARGS:
+            line: str - raw command line
+    """
+
+    names = []
+
+    for stage in line.split('|'):
+        words = stage.split(None, 1)
+
+        if words:
+            names.append(words[0])
+
+    return names
+
+
+class Frecency:
+    """
+        Frequency + recency score of commands.
+
+        Every use adds 1 to the score and the score decays exponentially with
+        the number of commands run since. Decay is applied lazily, so an update
+        touches only the commands of a single line
+    """
+
+    def __init__(self, halfLife: int = HALF_LIFE):
+        self.decay = 0.5 ** (1 / halfLife)
+        self.tick = 0
+        self.scores = {} # name -> (score, tick of the last update)
+
+    def add(self, line: str) -> None:
+        """
+            Accounts commands of a line that was just run (or loaded from history)
+        """
+
+        self.tick += 1
+
+        for name in commandNames(line):
+            score, lastTick = self.scores.get(name, (0.0, self.tick))
+            self.scores[name] = (score * self.decay ** (self.tick - lastTick) + 1, self.tick)
+
+    def score(self, name: str) -> float:
+        if (entry := self.scores.get(name)) is None:
+            return 0.0
+
+        score, lastTick = entry
+
+        return score * self.decay ** (self.tick - lastTick)
+
+    def rank(self, names: list[str], k: int = TOP_K) -> list[str]:
+        """
+            Puts top-k names by score in front, the rest keep their order.
+            Uses bounded heap, so it's O(n log k) instead of a full sort
+
+            ARGS:
+                names: list[str] - candidates
+                k: int - number of ranked candidates
+        """
+
+        used = [n for n in names if n in self.scores]
+        top = heapq.nlargest(k, used, key=self.score)
+
+        if not top:
+            return names
+
+        topSet = set(top)
+
+        return top + [n for n in names if n not in topSet]
+
+
+RANKING = Frecency()
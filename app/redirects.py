@@ -0,0 +1,220 @@
+import os
+import sys
+
+import app.parser as parser
+import app.streams as streams
+
+# Redirection plan is a list of posix_spawn-style file actions:
+#   (os.POSIX_SPAWN_OPEN, fd, path, flags, mode)
+#   (os.POSIX_SPAWN_DUP2, fd, newFd)
+#   (os.POSIX_SPAWN_CLOSE, fd)
+# The same plan is given to posix_spawn, applied by hand in the fork
+# fallback (launcher.applyFileActions) and mapped onto streams for builtins
+
+OPEN, DUP2, CLOSE = os.POSIX_SPAWN_OPEN, os.POSIX_SPAWN_DUP2, os.POSIX_SPAWN_CLOSE
+
+WRITE = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+APPEND = os.O_WRONLY | os.O_CREAT | os.O_APPEND
+
+OPEN_FLAGS = {
+        ">": WRITE,
+        ">|": WRITE,
+        ">>": APPEND,
+        "<": os.O_RDONLY,
+        "<>": os.O_RDWR | os.O_CREAT,
+        "&>": WRITE,
+        "&>>": APPEND,
+        }
+
+
+class RedirectError(Exception):
+    pass
+
+
+class AmbiguousTarget(str):
+    """
+        Redirect target which expanded to no words or to several of them
+        ($EMPTY, $FILES, *.txt). Its text is the target as written
+    """
+    __slots__ = ()
+
+
+def compilePlan(redirects: list[parser.Redirect]) -> list[tuple]:
+    """
+        Compiles redirects of one command into file actions, preserving their order
+
+        ARGS:
+            redirects: list[Redirect] - redirects with expanded targets
+
+        RETURNS:
+            plan: list[tuple] - file actions
+
+        RAISES:
+            RedirectError - if a target is not a valid file descriptor
+    """
+
+    plan = []
+
+    for r in redirects:
+        op, fd, target = r.op, r.fd, r.target
+
+        if isinstance(target, AmbiguousTarget):
+            raise RedirectError(f"{target}: ambiguous redirect")
+
+        if op in (">&", "<&"):
+            if target == "-":
+                plan.append((CLOSE, fd))
+            elif target.isdigit():
+                plan.append((DUP2, int(target), fd))
+            elif op == ">&" and fd == 1:
+                # >& file is the same as &> file
+                plan.append((OPEN, 1, target, WRITE, 0o644))
+                plan.append((DUP2, 1, 2))
+            else:
+                raise RedirectError(f"{target}: ambiguous redirect")
+        elif op in ("&>", "&>>"):
+            plan.append((OPEN, 1, target, OPEN_FLAGS[op], 0o644))
+            plan.append((DUP2, 1, 2))
+        else:
+            plan.append((OPEN, fd, target, OPEN_FLAGS[op], 0o644))
+
+    return plan
+
+
+def isOpen(fd: int) -> bool:
+    try:
+        os.fstat(fd)
+    except OSError:
+        return False
+
+    return True
+
+
+def explainFailure(plan: list[tuple]) -> str | None:
+    """
+        Finds which action of a plan fails: a file which can't be opened or
+        a descriptor to duplicate which is not open. Used only after spawn has
+        failed, to tell a bad redirect from a missing program
+    """
+
+    # descriptors the plan has opened or closed so far, the rest are the shell's
+    opened, closed = set(), set()
+
+    for action in plan:
+        kind, fd = action[0], action[1]
+
+        if kind == OPEN:
+            _, _, path, flags, mode = action
+
+            try:
+                os.close(os.open(path, flags & ~os.O_TRUNC, mode))
+            except OSError as e:
+                return f"{path}: {e.strerror}"
+
+            opened.add(fd)
+            closed.discard(fd)
+        elif kind == DUP2:
+            newFd = action[2]
+
+            if fd in closed or (fd not in opened and not isOpen(fd)):
+                return f"{fd}: Bad file descriptor"
+
+            opened.add(newFd)
+            closed.discard(newFd)
+        else:
+            closed.add(fd)
+            opened.discard(fd)
+
+    return None
+
+
+class StreamTable:
+    """
+        Streams of an in-process builtin after redirects. The plan is applied
+        to a table fd -> stream instead of the real descriptors, so shell's
+        own stdout/stderr are never dup'ed and restored
+    """
+
+    def __init__(self, out: streams.OutputStream, err: streams.OutputStream):
+        self.streams = {1: out, 2: err}
+        self.opened = [] # owned streams, closed after the builtin even if replaced in the table
+
+    def add(self, fd: int, stream: streams.OutputStream) -> None:
+        self.opened.append(stream)
+        self.streams[fd] = stream
+
+    def apply(self, plan: list[tuple]) -> None:
+        """
+            RAISES:
+                OSError - if a file can't be opened
+                RedirectError - if a descriptor is not open
+        """
+
+        for action in plan:
+            kind = action[0]
+
+            if kind == OPEN:
+                _, fd, path, flags, mode = action
+                self.add(fd, streams.OutputStream(os.open(path, flags, mode), owned=True))
+            elif kind == DUP2:
+                _, fd, newFd = action
+
+                if fd not in self.streams:
+                    raise RedirectError(f"{fd}: Bad file descriptor")
+
+                self.streams[newFd] = self.streams[fd]
+            else:
+                # output to a closed descriptor goes nowhere
+                self.add(action[1], streams.OutputStream(os.open(os.devnull, os.O_WRONLY), owned=True))
+
+    @property
+    def inFd(self) -> int:
+        # input is kept in the table only to be closed along with it, nothing is buffered
+        stream = self.streams.get(0)
+
+        return stream.fileno() if stream is not None else 0
+
+    @property
+    def out(self) -> streams.OutputStream:
+        return self.streams[1]
+
+    @property
+    def err(self) -> streams.OutputStream:
+        return self.streams[2]
+
+    def flush(self) -> None:
+        """
+            RAISES:
+                OSError (BrokenPipeError) - if output can't be written
+        """
+
+        self.out.flush()
+        self.err.flush()
+
+    def close(self) -> None:
+        """
+            Closes every stream, even if some of them fail
+
+            RAISES:
+                OSError - the first error of writing out buffered text
+        """
+
+        error = None
+
+        # every stream once: the same stream may sit under several fds
+        for stream in dict.fromkeys([*self.streams.values(), *self.opened]):
+            try:
+                stream.close()
+            except OSError as e:
+                error = error or e
+
+        if error is not None:
+            raise error
+
+
+def reportError(e: Exception) -> None:
+    # an empty file name is still a name: > "" is ": No such file or directory"
+    message = f"{e.filename}: {e.strerror}" if isinstance(e, OSError) and e.filename is not None else str(e)
+
+    sys.stderr.write(message + "\n")
+    sys.stderr.flush()
@@ -0,0 +1,198 @@
+import readline
+from array import array
+from collections import Counter
+
+FUZZY_THRESHOLD = 0.5 # share of query trigrams a fuzzy match must have
+SHORT_PATTERN = 5     # shorter patterns have too few trigrams, they are matched by edit distance
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def editDistance(a: str, b: str) -> int:
+    """
+        Number of inserted, deleted, replaced or swapped adjacent chars
+        turning a into b ("ehco" -> "echo" is 1)
+    """
+
+    previous, current = None, list(range(len(b) + 1))
+
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+
+    return current[-1]
+
+
+class HistoryIndex:
+    """
+        Trigram index over distinct history lines.
+
+        Every distinct line gets an id; postings map a trigram to the array of
+        ids of lines containing it (ids only grow, so the arrays stay sorted).
+        A repeated command only moves its position, postings are not touched.
+        The index follows readline history incrementally (see sync)
+    """
+
+    def __init__(self):
+        self.lines = []     # id -> line
+        self.positions = [] # id -> number of the latest history entry with the line
+        self.ids = {}       # line -> id
+        self.sizes = []     # id -> number of trigrams of the line
+        self.postings = {}  # trigram -> array of ids
+        self.synced = 0     # number of readline history entries indexed
+
+    def add(self, line: str, position: int) -> None:
+        if (lineId := self.ids.get(line)) is not None:
+            self.positions[lineId] = position
+            return
+
+        lineId = len(self.lines)
+        self.ids[line] = lineId
+        self.lines.append(line)
+        self.positions.append(position)
+        grams = trigrams(line)
+        self.sizes.append(len(grams))
+
+        for gram in grams:
+            if (posting := self.postings.get(gram)) is None:
+                posting = self.postings[gram] = array('i')
+
+            posting.append(lineId)
+
+    def sync(self) -> None:
+        """
+            Indexes readline history entries added since the last call
+        """
+
+        length = readline.get_current_history_length()
+
+        if length < self.synced:
+            # history was cleared or truncated, numbers don't match anymore
+            self.__init__()
+
+        for i in range(self.synced + 1, length + 1):
+            if (line := readline.get_history_item(i)) is not None:
+                self.add(line, i)
+
+        self.synced = length
+
+    def candidates(self, grams: set[str]) -> set[int]:
+        """
+            Ids of lines having every trigram. Intersection starts from the
+            rarest trigram, so it's bounded by its posting length
+        """
+
+        postings = []
+
+        for gram in grams:
+            if (posting := self.postings.get(gram)) is None:
+                return set()
+
+            postings.append(posting)
+
+        postings.sort(key=len)
+        result = set(postings[0])
+
+        for posting in postings[1:]:
+            result.intersection_update(posting)
+
+            if not result:
+                break
+
+        return result
+
+    def substring(self, pattern: str) -> list[int]:
+        """
+            Ids of lines containing pattern
+        """
+
+        if len(pattern) < 3:
+            # too short for trigrams: plain scan of distinct lines
+            return [i for (i, line) in enumerate(self.lines) if pattern in line]
+
+        # trigrams only filter, the match is checked on the line itself
+        return [i for i in self.candidates(trigrams(pattern)) if pattern in self.lines[i]]
+
+    def fuzzy(self, pattern: str) -> list[tuple[float, int]]:
+        """
+            Lines sharing at least FUZZY_THRESHOLD of pattern's trigrams, so
+            typos and reordered words still match. They are scored by shared
+            trigrams over all trigrams of both (so a longer line with the same
+            shared ones scores lower). Short patterns, and those no line
+            shares enough trigrams with, are matched by edit distance
+
+            RETURNS:
+                matches: list[tuple[float, int]] - (score in 0..1, id)
+        """
+
+        grams = trigrams(pattern)
+
+        if len(pattern) < SHORT_PATTERN:
+            return self.closeWords(pattern)
+
+        counts = Counter()
+
+        for gram in grams:
+            counts.update(self.postings.get(gram, ()))
+
+        needed = max(1, int(len(grams) * FUZZY_THRESHOLD))
+
+        return [(count / (len(grams) + self.sizes[i] - count), i) for (i, count) in counts.items()
+                if count >= needed] or self.closeWords(pattern)
+
+    def closeWords(self, pattern: str) -> list[tuple[float, int]]:
+        """
+            Lines having a run of words (as many as pattern has) within a third
+            of pattern's length of edit distance from it. A plain scan of
+            distinct lines
+        """
+
+        # a single char may only be found as it is
+        allowed = max(1, len(pattern) // 3) if len(pattern) > 1 else 0
+        width = len(pattern.split())
+        pattern = " ".join(pattern.split())
+        matches = []
+
+        for i, line in enumerate(self.lines):
+            split = line.split()
+            words = [" ".join(split[j:j + width]) for j in range(max(1, len(split) - width + 1))]
+            distance = min((editDistance(pattern, w) for w in words if abs(len(w) - len(pattern)) <= allowed),
+                           default=allowed + 1)
+
+            if distance <= allowed:
+                matches.append((1 - distance / len(pattern), i))
+
+        return matches
+
+    def search(self, pattern: str, fuzzy: bool = False, skip: int = 0) -> list[tuple[int, str]]:
+        """
+            Finds history lines matching pattern
+
+            ARGS:
+                skip: int - history number to leave out (the search command itself)
+
+            RETURNS:
+                matches: list[tuple[int, str]] - (history number, line); substring
+                                                 matches oldest first, fuzzy ones
+                                                 best first (the latest of equal ones)
+        """
+
+        self.sync()
+
+        if fuzzy:
+            ranked = sorted(self.fuzzy(pattern), key=lambda m: (-m[0], -self.positions[m[1]]))
+            matches = [(self.positions[i], self.lines[i]) for (_, i) in ranked]
+        else:
+            matches = sorted((self.positions[i], self.lines[i]) for i in self.substring(pattern))
+
+        return [m for m in matches if m[0] != skip]
+
+INDEX = HistoryIndex()
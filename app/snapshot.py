@@ -0,0 +1,79 @@
+import os
+import marshal
+import hashlib
+
+import app.file_utils as file_utils
+
+# Bump this every time the layout of the snapshot changes
+SNAPSHOT_VERSION = 3
+
+
+def snapshotPath() -> str:
+    """
+        Returns path of the snapshot file for the current PATH value.
+
+        Snapshots live in $XDG_CACHE_HOME/codecrafters-shell (~/.cache by default),
+        one file per PATH value, so shells with different PATHs don't overwrite each other
+    """
+
+    cacheHome = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    key = hashlib.sha1(file_utils.PATH.encode()).hexdigest()[:16]
+
+    return os.path.join(cacheHome, "codecrafters-shell", f"snapshot-v{SNAPSHOT_VERSION}-{key}.bin")
+
+
+def load() -> dict | None:
+    """
+        Reads snapshot of the command index and completion trie
+
+        RETURNS:
+            snapshot: dict | None - None if there's no usable snapshot
+    """
+
+    try:
+        with open(snapshotPath(), 'rb') as f:
+            snapshot = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if not isinstance(snapshot, dict):
+        return None
+
+    if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("path") != file_utils.PATH:
+        return None
+
+    return snapshot
+
+
+def save(listings: dict, builtins: list[str], trieData: tuple) -> None:
+    """
+        Atomically writes snapshot, so concurrent shells never read a half-written file
+
+        ARGS:
+            listings: dict - output of ExecutableIndex.dump (directory -> (mtime, names))
+            builtins: list[str] - builtin names the trie was built with
+            trieData: tuple - output of Trie.dump
+    """
+
+    snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "path": file_utils.PATH,
+            "dirs": listings,
+            "builtins": builtins,
+            "trie": trieData
+            }
+
+    fileName = snapshotPath()
+    tmpName = f"{fileName}.{os.getpid()}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(fileName), exist_ok=True)
+
+        with open(tmpName, 'wb') as f:
+            f.write(marshal.dumps(snapshot))
+
+        os.replace(tmpName, fileName)
+    except OSError:
+        try:
+            os.unlink(tmpName)
+        except OSError: pass
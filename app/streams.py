@@ -0,0 +1,88 @@
+import os
+
+BUFFER_SIZE = 1 << 16
+
+
+class OutputStream:
+    """
+        Output of a builtin: text is collected in memory and written to the
+        file descriptor with os.write in large chunks (when BUFFER_SIZE is
+        reached and on flush). There's no TextIOWrapper and no per-line flush,
+        so "history > file" over a long history costs a few writes
+    """
+
+    def __init__(self, fd: int, owned: bool = False):
+        self.fd = fd
+        self.owned = owned  # close fd along with the stream
+        self.parts = []
+        self.size = 0
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def write(self, text: str) -> int:
+        self.parts.append(text)
+        self.size += len(text)
+
+        if self.size >= BUFFER_SIZE:
+            self.flush()
+
+        return len(text)
+
+    def flush(self) -> None:
+        """
+            RAISES:
+                OSError (BrokenPipeError) - if the descriptor can't be written to
+        """
+
+        if not self.parts:
+            return
+
+        data = memoryview("".join(self.parts).encode(errors="surrogateescape"))
+        self.parts, self.size = [], 0
+
+        while data:
+            data = data[os.write(self.fd, data):]
+
+    def close(self) -> None:
+        """
+            Flushes the stream and closes the descriptor if it's owned
+            (even if the flush has failed)
+
+            RAISES:
+                OSError - if buffered text can't be written ("echo hi > /dev/full")
+        """
+
+        try:
+            self.flush()
+        except OSError:
+            self.parts, self.size = [], 0
+            raise
+        finally:
+            if self.owned and self.fd >= 0:
+                try:
+                    os.close(self.fd)
+                except OSError: pass
+
+                self.fd = -1
+
+
+class CaptureStream(OutputStream):
+    """
+        Output of a builtin run by command substitution. Text stays in memory
+        until the substitution takes it: there's no pipe to write and read
+        back, and no thread to drain it
+    """
+
+    def __init__(self):
+        super().__init__(-1)
+
+    def write(self, text: str) -> int:
+        self.parts.append(text)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
@@ -0,0 +1,164 @@
+import os
+import signal
+
+import app.parser as parser
+import app.syntax as syntax
+import app.launcher as launcher
+import app.pipes as pipes
+import app.executor as executor
+import app.builtin as builtin
+import app.variables as variables
+import app.streams as streams
+
+# Command substitution: $(...) and `...`. Commands run in the shell where
+# the shell allows it:
+#   - lone builtin (echo, pwd, type, ...) is called right here and writes
+#     into memory (streams.CaptureStream), no pipe, thread or fork at all
+#   - anything else is a pipeline whose last stage writes into a pipe read
+#     back with readinto into one growing bytearray, decoded once at the end
+#   - lists and compound commands run in a forked copy of the shell, as
+#     their effect must not leak out of $(...); so do commands which change
+#     the shell (cd, export, hash, NAME=value), forked by pipes.startPipeline
+
+READ_CHUNK = 1 << 16
+
+
+def simplePipeline(tree: syntax.CommandList) -> syntax.Pipeline | None:
+    """
+        Returns the only pipeline of the tree if it's a plain one: no lists,
+        no compound commands, no "!" or "time"
+    """
+
+    if len(tree.items) != 1 or tree.items[0][1]:
+        return None
+
+    andOr = tree.items[0][0]
+    pipeline = andOr.pipelines[0]
+
+    if andOr.ops or not pipeline.simple or pipeline.negated or pipeline.timed:
+        return None
+
+    return pipeline
+
+
+def readAll(fd: int) -> bytearray:
+    """
+        Reads fd up to EOF into a bytearray, doubling it when it's full.
+        Closes fd
+
+        RETURNS:
+            data: bytearray - everything read, trailing newlines removed
+    """
+
+    data = bytearray(READ_CHUNK)
+    size = 0
+
+    with open(fd, "rb", buffering=0) as f:
+        while True:
+            if size == len(data):
+                data.extend(bytes(len(data)))
+
+            with memoryview(data)[size:] as view:
+                n = f.readinto(view)
+
+            if not n:
+                break
+
+            size += n
+
+    # trailing newlines are cut off in place, along with the unused tail
+    while size and data[size - 1] == 0x0A:
+        size -= 1
+
+    del data[size:]
+
+    return data
+
+
+def captureBuiltin(c: parser.Token) -> str:
+    """
+        Calls builtin in the shell's main thread, collecting its output in memory
+    """
+
+    out = streams.CaptureStream()
+
+    if (table := pipes.builtinStreams(c, capture=out)) is None:
+        variables.SUBST_STATUS = 1
+        variables.setStatus([1], [None])
+        return ""
+
+    try:
+        status = pipes.callBuiltin(c, table)
+    except SystemExit as e:
+        # exit ends only the substitution
+        status = e.code if isinstance(e.code, int) else 0
+    except builtin.LoopControl:
+        # so do break and continue
+        status = 0
+    except OSError as e:
+        # its stderr, stdout is in memory
+        status = pipes.writeError(c, e)
+
+    status = pipes.closeStreams(c, table, status)
+
+    variables.SUBST_STATUS = status
+    variables.setStatus([status], [None])
+
+    return out.getvalue().rstrip('\n')
+
+
+def capture(source: str) -> str:
+    """
+        Runs command substitution
+
+        ARGS:
+            source: str - commands inside of $(...)
+
+        RETURNS:
+            output: str - their standard output without trailing newlines
+
+        RAISES:
+            ParseError - if source can't be parsed
+            KeyboardInterrupt - if the commands were interrupted with Ctrl-C,
+                                the whole command line is abandoned
+    """
+
+    tree = syntax.parse(source)
+    pipeline = simplePipeline(tree)
+
+    # lists and compound commands are left to the forked shell as they are
+    cmds = pipes.expandCommands(pipeline.commands) if pipeline is not None else None
+
+    if not tree.items or cmds is not None and len(cmds) == 1 and not cmds[0].commandName and not cmds[0].args:
+        variables.SUBST_STATUS = 0
+        return ""
+
+    if cmds is not None and len(cmds) == 1 and cmds[0].commandName in builtin.BUILTINS \
+            and not pipes.changesShell(cmds[0]):
+        return captureBuiltin(cmds[0])
+
+    r, w = os.pipe()
+
+    with pipes.forwardInterrupt():
+        if cmds is None:
+            body = lambda: executor.run(tree)
+            pid = executor.forkShell(body, [(os.POSIX_SPAWN_DUP2, w, 1)])
+            os.close(w)
+
+            data = readAll(r)
+            _, waitStatus, rusage = os.wait4(pid, 0)
+            status = launcher.exitStatus(waitStatus)
+            variables.setStatus([status], [rusage])
+        else:
+            # the pipeline owns w from now on
+            pipeline = pipes.startPipeline(cmds, outFd=w)
+
+            data = readAll(r)
+            status = pipes.waitPipeline(pipeline)
+
+    variables.SUBST_STATUS = status
+
+    if status == 128 + signal.SIGINT:
+        raise KeyboardInterrupt
+
+    return data.decode(errors="surrogateescape")
@@ -0,0 +1,487 @@
+import re
+from functools import lru_cache
+
+import app.parser as parser
+from app.parser import ParseError, Incomplete, Op, OPERATORS
+
+# Command line grammar on top of parser.lex:
+#   list      : and_or ((";" | "&" | newline) and_or)* [";" | "&"]
+#   and_or    : pipeline (("&&" | "||") newline* pipeline)*
+#   pipeline  : ["time"] ["!"] command ("|" newline* command)*
+#   command   : simple | compound redirect*
+#   compound  : "(" list ")" | "{" list "}"
+#             | "if" list "then" list ("elif" list "then" list)* ["else" list] "fi"
+#             | "for" NAME ["in" word*] (";" | newline) "do" list "done"
+#             | ("while" | "until") list "do" list "done"
+#   simple    : (word | redirect)+
+# Reserved words ("{", "if", "do", "!", "time", ...) are reserved only where
+# a command starts. Trees are cached by the source text and shared, they must
+# not be modified. Loop bodies are parsed once with the loop and only walked
+# on every iteration
+
+SEPARATORS = (OPERATORS[";"], OPERATORS["&"], OPERATORS["\n"])
+NEWLINE = OPERATORS["\n"]
+
+# words ending a list in command position
+LIST_END = frozenset({"}", "then", "elif", "else", "fi", "do", "done"})
+
+NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# words which make a command more than a simple one, or end a list
+RESERVED = LIST_END | {"{", "if", "for", "while", "until", "!", "time"}
+
+
+class Pipeline:
+    """
+        Commands connected with pipes. Commands are parser.Tokens (simple
+        commands) or compound commands (Subshell, Group)
+    """
+    __slots__ = ("commands", "negated", "timed", "text")
+
+    def __init__(self, commands: list, negated: bool, timed: bool, text: str):
+        self.commands = commands
+        self.negated = negated
+        self.timed = timed
+        self.text = text
+
+    @property
+    def simple(self) -> bool:
+        return all(isinstance(c, parser.Token) for c in self.commands)
+
+    def __repr__(self):
+        return f"Pipeline({self.commands})"
+
+
+class AndOr:
+    """
+        Pipelines joined with && and ||: ops[i] stands between pipelines[i] and pipelines[i + 1]
+    """
+    __slots__ = ("pipelines", "ops", "text")
+
+    def __init__(self, pipelines: list[Pipeline], ops: list[str], text: str):
+        self.pipelines = pipelines
+        self.ops = ops
+        self.text = text
+
+    def __repr__(self):
+        return f"AndOr({self.pipelines}, {self.ops})"
+
+
+class CommandList:
+    """
+        And-or lists run one after another; items are (AndOr, background)
+    """
+    __slots__ = ("items",)
+
+    def __init__(self, items: list[tuple[AndOr, bool]]):
+        self.items = items
+
+    def __repr__(self):
+        return f"CommandList({self.items})"
+
+
+class Subshell:
+    """
+        ( list ): runs in a forked copy of the shell
+    """
+    __slots__ = ("body", "redirects", "text")
+
+    def __init__(self, body: CommandList, redirects: list[parser.Redirect], text: str):
+        self.body = body
+        self.redirects = redirects
+        self.text = text
+
+    def __repr__(self):
+        return f"Subshell({self.body})"
+
+
+class Group:
+    """
+        { list; }: runs in the shell itself, redirects apply to the whole list
+    """
+    __slots__ = ("body", "redirects", "text")
+
+    def __init__(self, body: CommandList, redirects: list[parser.Redirect], text: str):
+        self.body = body
+        self.redirects = redirects
+        self.text = text
+
+    def __repr__(self):
+        return f"Group({self.body})"
+
+
+class If:
+    """
+        if/elif branches are (condition, body) pairs, orelse is the else list (or None)
+    """
+    __slots__ = ("branches", "orelse", "redirects", "text")
+
+    def __init__(self, branches: list[tuple[CommandList, CommandList]], orelse: CommandList | None,
+                 redirects: list[parser.Redirect], text: str):
+        self.branches = branches
+        self.orelse = orelse
+        self.redirects = redirects
+        self.text = text
+
+    def __repr__(self):
+        return f"If({self.branches}, {self.orelse})"
+
+
+class For:
+    """
+        for name in words; do body; done. Words are expanded (split and
+        globbed) every time the loop starts
+    """
+    __slots__ = ("name", "words", "body", "redirects", "text")
+
+    def __init__(self, name: str, words: list, body: CommandList, redirects: list[parser.Redirect], text: str):
+        self.name = name
+        self.words = words
+        self.body = body
+        self.redirects = redirects
+        self.text = text
+
+    def __repr__(self):
+        return f"For({self.name}, {self.words}, {self.body})"
+
+
+class While:
+    """
+        while (or until, if until is True) condition; do body; done
+    """
+    __slots__ = ("condition", "body", "until", "redirects", "text")
+
+    def __init__(self, condition: CommandList, body: CommandList, until: bool,
+                 redirects: list[parser.Redirect], text: str):
+        self.condition = condition
+        self.body = body
+        self.until = until
+        self.redirects = redirects
+        self.text = text
+
+    def __repr__(self):
+        return f"While({self.condition}, {self.body}, until={self.until})"
+
+
+class Parser:
+    """
+        Recursive descent over items of parser.lex
+    """
+
+    def __init__(self, rawArgs: str):
+        self.raw = rawArgs
+        self.items, self.spans = parser.lex(rawArgs)
+        self.pos = 0
+
+    def peek(self):
+        return self.items[self.pos] if self.pos < len(self.items) else None
+
+    def atEnd(self) -> bool:
+        return self.pos >= len(self.items)
+
+    def isWord(self, item, words) -> bool:
+        # reserved words are plain unquoted strings
+        return type(item) is str and item in words
+
+    def text(self, start: int) -> str:
+        """
+            Source of items from start up to the current one
+        """
+
+        return self.raw[self.spans[start][0]:self.spans[self.pos - 1][1]]
+
+    def unexpected(self) -> ParseError:
+        if self.atEnd():
+            return Incomplete("syntax error: unexpected end of file")
+
+        item = self.peek()
+
+        return ParseError(f"syntax error near unexpected token `{'newline' if item == NEWLINE else item}'")
+
+    def skipNewlines(self) -> None:
+        while self.peek() == NEWLINE and isinstance(self.peek(), Op):
+            self.pos += 1
+
+    def expect(self, item, isOp: bool) -> None:
+        current = self.peek()
+
+        if current != item or isinstance(current, Op) != isOp:
+            raise self.unexpected()
+
+        self.pos += 1
+
+    def atListEnd(self, ends: set) -> bool:
+        item = self.peek()
+
+        return item is None or (isinstance(item, Op) and item == ")") or self.isWord(item, ends)
+
+    def parseList(self, ends: set = LIST_END, required: bool = False) -> CommandList:
+        """
+            Parses list up to the end of input, ")" or one of ends words
+
+            ARGS:
+                ends: set[str] - reserved words closing the list
+                required: bool - empty list is an error (inside of compound commands)
+        """
+
+        items = []
+        self.skipNewlines()
+
+        while not self.atListEnd(ends):
+            andOr = self.parseAndOr()
+            separator = self.peek()
+            background = False
+
+            if isinstance(separator, Op) and separator in SEPARATORS:
+                background = separator == "&"
+                self.pos += 1
+            elif not self.atListEnd(ends):
+                raise self.unexpected()
+
+            items.append((andOr, background))
+            self.skipNewlines()
+
+        if required and not items:
+            raise self.unexpected()
+
+        return CommandList(items)
+
+    def parseAndOr(self) -> AndOr:
+        start = self.pos
+        pipelines = [self.parsePipeline()]
+        ops = []
+
+        while isinstance(op := self.peek(), Op) and op in ("&&", "||"):
+            self.pos += 1
+            self.skipNewlines()
+            ops.append(str(op))
+            pipelines.append(self.parsePipeline())
+
+        return AndOr(pipelines, ops, self.text(start))
+
+    def parsePipeline(self) -> Pipeline:
+        start = self.pos
+        timed = negated = False
+
+        if self.isWord(self.peek(), ("time",)):
+            timed = True
+            self.pos += 1
+
+            # "time" alone reports zero times
+            if self.atEnd() or isinstance(self.peek(), Op) and self.peek() in SEPARATORS:
+                return Pipeline([], False, True, self.text(start))
+
+        if self.isWord(self.peek(), ("!",)):
+            negated = True
+            self.pos += 1
+
+        commands = [self.parseCommand()]
+
+        while isinstance(op := self.peek(), Op) and op == "|":
+            self.pos += 1
+            self.skipNewlines()
+            commands.append(self.parseCommand())
+
+        return Pipeline(commands, negated, timed, self.text(start))
+
+    def parseRedirects(self) -> list[parser.Redirect]:
+        redirects = []
+
+        while isinstance(self.peek(), parser.Redirect):
+            redirects.append(self.peek())
+            self.pos += 1
+
+        # a compound command can't have arguments: ( ls ) -l
+        if not self.atEnd() and not isinstance(self.peek(), Op):
+            raise self.unexpected()
+
+        return redirects
+
+    def parseCommand(self):
+        start = self.pos
+        item = self.peek()
+
+        if isinstance(item, Op) and item == "(":
+            self.pos += 1
+            body = self.parseList(required=True)
+            self.expect(")", isOp=True)
+
+            return Subshell(body, self.parseRedirects(), self.text(start))
+
+        if self.isWord(item, ("{",)):
+            self.pos += 1
+            body = self.parseList(required=True)
+            self.expect("}", isOp=False)
+
+            return Group(body, self.parseRedirects(), self.text(start))
+
+        if self.isWord(item, ("if",)):
+            return self.parseIf(start)
+
+        if self.isWord(item, ("for",)):
+            return self.parseFor(start)
+
+        if self.isWord(item, ("while", "until")):
+            self.pos += 1
+            condition = self.parseList(required=True)
+            self.expect("do", isOp=False)
+            body = self.parseList(required=True)
+            self.expect("done", isOp=False)
+
+            return While(condition, body, item == "until", self.parseRedirects(), self.text(start))
+
+        return self.parseSimple()
+
+    def parseIf(self, start: int) -> If:
+        branches = []
+        orelse = None
+        keyword = "if"
+
+        while keyword in ("if", "elif"):
+            self.pos += 1
+            condition = self.parseList(required=True)
+            self.expect("then", isOp=False)
+            branches.append((condition, self.parseList(required=True)))
+            keyword = self.peek()
+
+        if self.isWord(keyword, ("else",)):
+            self.pos += 1
+            orelse = self.parseList(required=True)
+
+        self.expect("fi", isOp=False)
+
+        return If(branches, orelse, self.parseRedirects(), self.text(start))
+
+    def parseFor(self, start: int) -> For:
+        self.pos += 1
+        name = self.peek()
+
+        if type(name) is not str or not NAME.fullmatch(name):
+            raise self.unexpected()
+
+        self.pos += 1
+        words = None
+
+        if self.isWord(self.peek(), ("in",)):
+            self.pos += 1
+            words = []
+
+            while (item := self.peek()) is not None and not isinstance(item, Op):
+                if isinstance(item, parser.Redirect):
+                    raise self.unexpected()
+
+                words.append(item)
+                self.pos += 1
+
+        # "for x in a b; do" or "for x in a b" with "do" on the next line
+        if isinstance(self.peek(), Op) and self.peek() in (";", "\n"):
+            self.pos += 1
+        elif words is not None:
+            raise self.unexpected()
+
+        self.skipNewlines()
+        self.expect("do", isOp=False)
+        body = self.parseList(required=True)
+        self.expect("done", isOp=False)
+
+        return For(name, words, body, self.parseRedirects(), self.text(start))
+
+    def parseSimplePipeline(self) -> CommandList | None:
+        """
+            Fast path for the common line: one pipeline of simple commands.
+            Builds the tree in one pass over the items, None if the line has
+            anything else (other operators, reserved words, empty stages)
+        """
+
+        items = self.items
+        commands, words, redirects = [], [], []
+
+        for item in items:
+            cls = item.__class__
+
+            if cls is Op:
+                if item != "|" or not words:
+                    return None
+
+                commands.append(parser.Token(words[0], words[1:], redirects))
+                words, redirects = [], []
+            elif cls is parser.Redirect:
+                redirects.append(item)
+            elif not words and cls is str and item in RESERVED:
+                return None
+            else:
+                words.append(item)
+
+        if not words:
+            # "> file" alone, a trailing "|", an empty line: left to the full parser
+            return None if items else CommandList([])
+
+        commands.append(parser.Token(words[0], words[1:], redirects))
+        text = self.raw[self.spans[0][0]:self.spans[-1][1]]
+        self.pos = len(items)
+
+        return CommandList([(AndOr([Pipeline(commands, False, False, text)], [], text), False)])
+
+    def parseSimple(self) -> parser.Token:
+        words, redirects = [], []
+        items, i = self.items, self.pos
+
+        # the hot loop of parsing: no peek() calls, a class check per item
+        while i < len(items) and (cls := items[i].__class__) is not Op:
+            if cls is parser.Redirect:
+                redirects.append(items[i])
+            else:
+                words.append(items[i])
+
+            i += 1
+
+        self.pos = i
+
+        if not words and not redirects:
+            raise self.unexpected()
+
+        if not words:
+            # "> file" alone: a command which expands to nothing
+            words = [""]
+
+        return parser.Token(words[0], words[1:], redirects)
+
+
+@lru_cache(maxsize=1024)
+def parse(rawArgs: str) -> CommandList:
+    """
+        Parses command line (or several lines) into a tree. Results are cached
+        by the source text, as scripts and loops run the same lines over and over
+
+        RAISES:
+            Incomplete - if the source ends inside of a construct
+            ParseError - on a syntax error
+    """
+
+    p = Parser(rawArgs)
+
+    if (tree := p.parseSimplePipeline()) is not None:
+        return tree
+
+    tree = p.parseList()
+
+    if not p.atEnd():
+        # ")" or "}" without its opening pair
+        raise ParseError(f"syntax error near unexpected token `{p.peek()}'")
+
+    return tree
+
+
+def isComplete(rawArgs: str) -> bool:
+    """
+        False if rawArgs ends inside of a construct and more lines are needed
+    """
+
+    try:
+        parse(rawArgs)
+    except Incomplete:
+        return False
+    except ParseError:
+        pass
+
+    return True
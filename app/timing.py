@@ -0,0 +1,137 @@
+import resource
+
+# resource usage of the calling thread: CPU time of builtins run in-process
+RUSAGE_THREAD = getattr(resource, "RUSAGE_THREAD", None)
+
+
+def threadTimes() -> tuple[float, float]:
+    """
+        Returns (user, sys) CPU seconds of the current thread (of the process if
+        per-thread usage is not supported)
+    """
+
+    usage = resource.getrusage(RUSAGE_THREAD if RUSAGE_THREAD is not None else resource.RUSAGE_SELF)
+
+    return usage.ru_utime, usage.ru_stime
+
+
+def ioWritten(path: str) -> int | None:
+    """
+        Returns wchar (bytes passed to write-like calls) of /proc/<pid>/io
+        or /proc/thread-self/io, None where there is no such file
+    """
+
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                if line.startswith(b"wchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def formatSeconds(seconds: float) -> str:
+    minutes, seconds = divmod(seconds, 60)
+
+    return f"{int(minutes)}m{seconds:.3f}s"
+
+
+def stageUsage(pipeline, i: int) -> tuple[float, float, float, int | None]:
+    """
+        Returns (wall, user, sys, maxrss in KB) of a pipeline stage. Builtins
+        run in the shell, so they have CPU times of their thread and no maxrss.
+        maxrss of a spawned or forked stage starts from the shell's own
+    """
+
+    wall = max(0, pipeline.ended[i] - pipeline.started[i]) / 1e9
+
+    if (rusage := pipeline.rusages[i]) is not None:
+        return wall, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss
+
+    user, system = pipeline.times[i] or (0.0, 0.0)
+
+    return wall, user, system, None
+
+
+def shellMaxrss() -> int:
+    """
+        Returns maxrss of the shell process in KB
+    """
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def commandText(c) -> str:
+    # compound commands ( ... ) and { ...; } keep their source
+    if hasattr(c, "text"):
+        return c.text
+
+    return " ".join([c.commandName] + c.args)
+
+
+def report(cmds: list, pipeline, wall: float) -> str:
+    """
+        Formats output of "time": totals for the whole pipeline like bash does,
+        then a line per stage
+
+        ARGS:
+            cmds: list[Token] - expanded commands of the pipeline
+            pipeline: pipes.Pipeline - finished pipeline
+            wall: float - wall time of the whole pipeline, in seconds
+    """
+
+    stages = [stageUsage(pipeline, i) for i in range(len(cmds))]
+
+    user = sum(s[1] for s in stages)
+    system = sum(s[2] for s in stages)
+    maxrss = max((s[3] for s in stages if s[3] is not None), default=None)
+
+    lines = [
+            "",
+            f"real\t{formatSeconds(wall)}",
+            f"user\t{formatSeconds(user)}",
+            f"sys\t{formatSeconds(system)}",
+            f"maxrss\t{maxrss if maxrss is not None else '-'} KB",
+            ]
+
+    if maxrss is not None:
+        # the kernel carries the high-water mark over fork and exec, so a child
+        # never reports less than the shell had when the child was started
+        lines.append(f"\t(a child's maxrss includes the shell's, now {shellMaxrss()} KB)")
+
+    if len(cmds) > 1:
+        lines.append("stage\treal\t\tuser\t\tsys\t\tmaxrss\tcommand")
+
+        for i, (c, (stageWall, stageUser, stageSys, stageRss)) in enumerate(zip(cmds, stages)):
+            lines.append(f"{i + 1}\t{formatSeconds(stageWall)}\t{formatSeconds(stageUser)}\t"
+                         f"{formatSeconds(stageSys)}\t{stageRss if stageRss is not None else '-'}\t"
+                         f"{commandText(c)}")
+
+    if len(cmds) > 1:
+        lines.append("pipe\tbytes\t\tMB/s\tbuffer")
+
+        for i in range(len(cmds) - 1):
+            lines.append(pipeUsage(pipeline, i, stages[i][0]))
+
+    return "\n".join(lines) + "\n"
+
+
+def pipeUsage(pipeline, i: int, wall: float) -> str:
+    """
+        Formats line of the pipe from stage i to stage i + 1. Bytes are those
+        written by the stage i (its stderr and redirect files included), the
+        rate is over the writer's lifetime
+    """
+
+    written = pipeline.written[i]
+    size = pipeline.capacities[i]
+
+    if written is None:
+        amount = rate = "-"
+    else:
+        amount = str(written)
+        rate = f"{written / wall / 1e6:.1f}" if wall > 0 else "-"
+
+    return f"{i + 1}|{i + 2}\t{amount:<8}\t{rate}\t{size if size is not None else '-'}"
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import threading
+
+# Trace mode: SHELL_TRACE=path appends one JSON object per span to the file:
+#   {"span": "spawn", "start_ns": ..., "end_ns": ..., "dur_ns": ..., "pid": ..., "tid": ..., ...}
+# Timestamps come from time.monotonic_ns, so spans of one shell are comparable
+# with each other (not with the wall clock). Without SHELL_TRACE spans cost one call
+TRACE_FILE = os.environ.get("SHELL_TRACE")
+
+
+class Span:
+    """
+        Measures a block of code: "with trace.span("wait", pid=pid) as s: ..."
+    """
+    __slots__ = ("name", "attrs", "start")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = 0
+
+    def set(self, key: str, value) -> None:
+        """
+            Adds an attribute known only inside of the block (pid, status, ...)
+        """
+
+        self.attrs[key] = value
+
+    def __enter__(self):
+        self.start = time.monotonic_ns()
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        end = time.monotonic_ns()
+
+        record = {
+                "span": self.name,
+                "start_ns": self.start,
+                "end_ns": end,
+                "dur_ns": end - self.start,
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                }
+        record.update(self.attrs)
+
+        if excType is not None:
+            record["error"] = excType.__name__
+
+        write(record)
+
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def set(self, key: str, value) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+TRACE_FD = None
+
+
+def write(record: dict) -> None:
+    """
+        Appends a record as a single write, so lines of concurrent shells
+        and threads don't interleave
+    """
+    global TRACE_FD
+
+    if TRACE_FD is None:
+        TRACE_FD = os.open(TRACE_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC, 0o644)
+
+    os.write(TRACE_FD, (json.dumps(record, default=str) + "\n").encode())
+
+
+def span(name: str, **attrs) -> Span | NullSpan:
+    if TRACE_FILE is None:
+        return NULL_SPAN
+
+    return Span(name, attrs)
@@ -1,6 +1,14 @@
+from typing import Iterator
+
+
 class Node:
-    def __init__(self):
-        self.children = dict()
+    # Edge label is stored in the child node, so one node covers a whole run
+    # of characters instead of a single one (radix / Patricia trie)
+    __slots__ = ("label", "children", "endNode")
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.children = dict() # first char of child label -> child
         self.endNode = False
 
 
@@ -8,36 +16,134 @@ class Trie:
     def __init__(self):
         self.root = Node()
 
+    def _find(self, word: str) -> tuple[Node, str] | None:
+        """
+            Finds the node whose subtree holds all words starting with word
 
-    def getMatchings(self, word: str) -> None | list[str]:
-        # BEGIN FUNCTION
-        def dfs(root: Node, curWord: str = "") -> list[str]:
-            if root.endNode:
-                matches.append(curWord)
-
-            for (child, nextNode) in root.children.items():
-                dfs(nextNode, curWord + child)
-        # END FUNCTION
+            RETURNS:
+                (node, nodeWord) | None - node and the full word it stands for
+                                          (word may end in the middle of node's label)
+        """
 
         curNode = self.root
-        matches = []
-        
-        for char in word:
+        i = 0
+
+        while i < len(word):
             # no matching
-            if char not in curNode.children:
+            if (child := curNode.children.get(word[i])) is None:
+                return None
+
+            label = child.label
+
+            if word.startswith(label, i):
+                i += len(label)
+                curNode = child
+            elif label.startswith(word[i:]):
+                # word ends inside of the label
+                return child, word[:i] + label
+            else:
                 return None
-            curNode = curNode.children[char]
 
-        dfs(curNode, word)
+        return curNode, word
+
+    def iterMatchings(self, word: str) -> Iterator[str]:
+        """
+            Lazily yields all inserted words starting with word
+
+            ARGS:
+                word: str - prefix to be completed
+        """
+
+        if (found := self._find(word)) is None:
+            return
+
+        # iterative DFS, one string concatenation per node (not per char)
+        stack = [found]
+
+        while stack:
+            node, curWord = stack.pop()
+
+            if node.endNode:
+                yield curWord
+
+            # reversed, so children come out in insertion order
+            for child in reversed(node.children.values()):
+                stack.append((child, curWord + child.label))
+
+    def getMatchings(self, word: str) -> None | list[str]:
+        matches = list(self.iterMatchings(word))
 
-        return matches
+        return matches if matches else None
 
     def insert(self, word: str) -> None:
         curNode = self.root
-        for char in word:
-            curNode = curNode.children.setdefault(char, Node())
+        i = 0
+
+        while i < len(word):
+            child = curNode.children.get(word[i])
+
+            if child is None:
+                newNode = Node(word[i:])
+                newNode.endNode = True
+                curNode.children[word[i]] = newNode
+                return
+
+            label = child.label
+
+            # length of common part of the label and the rest of the word
+            j = 0
+            while j < len(label) and i + j < len(word) and label[j] == word[i + j]:
+                j += 1
+
+            if j < len(label):
+                # split the edge: curNode -> middle -> child
+                middle = Node(label[:j])
+                child.label = label[j:]
+                middle.children[child.label[0]] = child
+                curNode.children[word[i]] = middle
+                child = middle
+
+            curNode = child
+            i += j
+
         curNode.endNode = True
 
+    def dump(self) -> tuple:
+        """
+            Serializes trie into nested tuples (label, endNode, children),
+            which can be stored with marshal
+        """
+        # BEGIN FUNCTION
+        def dumpNode(node: Node) -> tuple:
+            return (node.label, node.endNode, tuple(dumpNode(n) for n in node.children.values()))
+        # END FUNCTION
+
+        return dumpNode(self.root)
+
+    @classmethod
+    def load(cls, data: tuple) -> "Trie":
+        """
+            Restores trie from the output of Trie.dump
+        """
+        # BEGIN FUNCTION
+        def loadNode(data: tuple) -> Node:
+            label, endNode, children = data
+
+            node = Node(label)
+            node.endNode = endNode
+
+            for childData in children:
+                child = loadNode(childData)
+                node.children[child.label[0]] = child
+
+            return node
+        # END FUNCTION
+
+        trie = cls()
+        trie.root = loadNode(data)
+
+        return trie
+
 def main():
     root = Trie()
 
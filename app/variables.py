@@ -0,0 +1,110 @@
+import os
+import re
+import resource
+
+import app.file_utils as file_utils
+
+# "NAME=value" word
+ASSIGNMENT = re.compile(r"[A-Za-z_][A-Za-z0-9_]*=")
+
+# Special parameters of the last foreground pipeline
+LAST_STATUS = 0     # $?
+PIPESTATUS = [0]    # ${PIPESTATUS[@]}, one exit status per stage
+RUSAGE = [None]     # resource usage per stage (None for builtins run in-process)
+
+# Status of the last command substitution of the command being expanded,
+# it becomes $? of a command which is only an assignment: x=$(false)
+SUBST_STATUS = None
+
+SHELL_VARS = {}     # variables which are not exported (exported ones live in os.environ)
+
+
+def setStatus(statuses: list[int], rusages: list[resource.struct_rusage | None]) -> None:
+    """
+        Records exit statuses and resource usage of the pipeline that has just finished
+
+        ARGS:
+            statuses: list[int] - exit status of every stage
+            rusages: list[struct_rusage | None] - resource usage of every stage
+    """
+    global LAST_STATUS, PIPESTATUS, RUSAGE
+
+    LAST_STATUS = statuses[-1] if statuses else 0
+    PIPESTATUS = statuses
+    RUSAGE = rusages
+
+
+def get(name: str, index: int | str | None = None) -> str:
+    """
+        Returns value of a parameter as a string. Unset parameters are empty
+
+        ARGS:
+            name: str - parameter name ("?", "$", "PIPESTATUS", variable name)
+            index: int | str | None - array index, "@"/"*" for all elements
+    """
+
+    if name == "?":
+        return str(LAST_STATUS)
+
+    if name == "$":
+        return str(os.getpid())
+
+    if name == "#":
+        return "0" # no positional parameters
+
+    if name == "PIPESTATUS":
+        if index in ("@", "*"):
+            return " ".join(map(str, PIPESTATUS))
+
+        i = 0 if index is None else index
+
+        return str(PIPESTATUS[i]) if i < len(PIPESTATUS) else ""
+
+    if (value := SHELL_VARS.get(name)) is not None:
+        return value
+
+    return os.environ.get(name, "")
+
+
+def isSet(name: str) -> bool:
+    if name in ("?", "$", "#", "PIPESTATUS"):
+        return True
+
+    return name in SHELL_VARS or name in os.environ
+
+
+def setEnv(name: str, value: str) -> None:
+    """
+        Sets exported variable. Changing PATH resets command lookup
+    """
+
+    os.environ[name] = value
+    SHELL_VARS.pop(name, None)
+
+    if name == "PATH":
+        file_utils.setPath(value)
+
+
+def assign(name: str, value: str) -> None:
+    """
+        NAME=value: exported variables stay exported
+    """
+
+    if name in os.environ:
+        setEnv(name, value)
+    else:
+        SHELL_VARS[name] = value
+
+
+def export(name: str, value: str | None = None) -> None:
+    """
+        export NAME[=value]: moves variable into the environment of children
+    """
+
+    if value is None:
+        value = SHELL_VARS.get(name, os.environ.get(name))
+
+        if value is None:
+            return
+
+    setEnv(name, value)
@@ -0,0 +1,83 @@
+"""
+    Runs the whole benchmark suite and writes results as JSON, so runs of
+    different versions can be diffed with benchmarks.compare
+
+    Run from the repository root:
+        python -m benchmarks [-o results.json] [--quick] [name ...]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import benchmarks.bench_parser as bench_parser
+import benchmarks.bench_pipe as bench_pipe
+import benchmarks.bench_spawn as bench_spawn
+import benchmarks.bench_startup as bench_startup
+import benchmarks.bench_trie as bench_trie
+
+# name -> (main, arguments of a quick run)
+SUITE = {
+        "startup": (bench_startup.main, {"repeat": 3}),
+        "parser": (bench_parser.main, {"repeat": 2000}),
+        "trie": (bench_trie.main, {"repeat": 1}),
+        "spawn": (bench_spawn.main, {"repeat": 10}),
+        "pipe": (bench_pipe.main, {"sizeMb": 32}),
+        }
+
+
+def gitRevision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    argParser = argparse.ArgumentParser(prog="python -m benchmarks")
+    argParser.add_argument("names", nargs="*", help=f"benchmarks to run: {', '.join(SUITE)} (all by default)")
+    argParser.add_argument("-o", "--output", help="write JSON results into the file (stdout by default)")
+    argParser.add_argument("--quick", action="store_true", help="fewer repetitions, for smoke runs")
+    args = argParser.parse_args()
+
+    if unknown := [name for name in args.names if name not in SUITE]:
+        argParser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = {}
+
+    for name in args.names or SUITE:
+        func, quickArgs = SUITE[name]
+
+        # human-readable lines go to stderr, JSON to the output
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            print(f"== {name}")
+            results[name] = func(**quickArgs) if args.quick else func()
+        finally:
+            sys.stdout = stdout
+
+    report = {
+            "revision": gitRevision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+            "results": results,
+            }
+
+    text = json.dumps(report, indent=2, sort_keys=True) + "\n"
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+    Parser microbenchmark: lines/sec of the legacy three-pass parser against
+    the single-pass scanner and syntax.parse, the entry point the shell runs.
+    "parse" skips the tree cache (every line is new), "parse_cached" is a
+    line run again, as in loops and scripts
+
+    Run from the repository root:
+        python -m benchmarks.bench_parser
+"""
+import time
+
+import app.parser as parser
+import app.syntax as syntax
+import benchmarks.legacy_parser as legacy_parser
+
+LINES = [
+        "echo hello world",
+        "ls -la /usr/local/bin | grep python | wc -l",
+        "cat 'file with spaces.txt' \"another \\\"quoted\\\" one\" > out.txt",
+        "head -n 5 /var/log/syslog 2>> errors.log",
+        "echo 'single' \"double\" plain\\ escaped mixed'quo'\"tes\"",
+        "grep -rn TODO src | sort | uniq -c | sort -rn | head -n 20",
+        ]
+
+
+def measure(func, lines: list[str], repeat: int) -> float:
+    """
+        Returns throughput of func in lines/sec
+    """
+
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        for line in lines:
+            func(line)
+
+    elapsed = time.perf_counter() - start
+
+    return repeat * len(lines) / elapsed
+
+
+def main(repeat: int = 20000) -> dict[str, float]:
+    results = {
+            "legacy_getArgs": measure(legacy_parser.getArgs, LINES, repeat),
+            "scan": measure(parser.scan, LINES, repeat),
+            "parse": measure(syntax.parse.__wrapped__, LINES, repeat),
+            "parse_cached": measure(syntax.parse, LINES, repeat),
+            }
+
+    for name, linesPerSec in results.items():
+        print(f"{name:16} {linesPerSec:12,.0f} lines/sec")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+    Pipe throughput: megabytes per second pushed through "head | cat | cat"
+    pipelines started by pipes.runMultipleProc. The *_ext variants run the
+    external programs (SHELL_NATIVE_FILTERS=0), with default pipes and with
+    pipes enlarged to the system maximum (SHELL_PIPE_SIZE=max)
+
+    Run from the repository root:
+        python -m benchmarks.bench_pipe
+"""
+import os
+import time
+
+import app.parser as parser
+import app.pipes as pipes
+
+SIZE_MB = 256
+
+
+def measure(stages: int, sizeMb: int, env: dict[str, str] | None = None) -> float:
+    """
+        Returns throughput in MB/s of a pipeline of head and stages cats
+
+        ARGS:
+            env: dict | None - environment variables set while the pipeline runs
+    """
+
+    line = f"head -c {sizeMb * 1024 * 1024} /dev/zero" + " | cat" * stages + " > /dev/null"
+    commands, _ = parser.getArgs(line)
+
+    saved = {name: os.environ.get(name) for name in env or {}}
+    os.environ.update(env or {})
+
+    try:
+        start = time.perf_counter()
+        pipes.runMultipleProc(commands)
+
+        return sizeMb / (time.perf_counter() - start)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+def main(sizeMb: int = SIZE_MB) -> dict[str, float]:
+    external = {"SHELL_NATIVE_FILTERS": "0"}
+
+    results = {f"pipe_{stages}cat_MBps": measure(stages, sizeMb) for stages in (1, 4)}
+    results["pipe_4cat_ext_MBps"] = measure(4, sizeMb, external)
+    results["pipe_4cat_ext_max_MBps"] = measure(4, sizeMb, {**external, "SHELL_PIPE_SIZE": "max"})
+
+    for name, mbps in results.items():
+        print(f"{name:24} {mbps:10.1f} MB/s")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+    Spawn latency of pipes.runMultipleProc: pipelines of 1 to 16 stages of
+    "true" and of "cat" (fed from /dev/null). Both are called by their full
+    paths: plain "true" is a builtin and "cat" a native filter, they would
+    run in the shell and spawn nothing
+
+    Run from the repository root:
+        python -m benchmarks.bench_spawn
+"""
+import time
+import shutil
+
+import app.syntax as syntax
+import app.pipes as pipes
+
+STAGES = (1, 2, 4, 8, 16)
+
+TRUE = shutil.which("true") or "/bin/true"
+CAT = shutil.which("cat") or "/bin/cat"
+
+LINES = {}
+
+for n in STAGES:
+    LINES[f"true_{n}"] = " | ".join([TRUE] * n)
+    LINES[f"cat_{n}"] = f"{CAT} < /dev/null" + f" | {CAT}" * (n - 1)
+
+
+def measure(line: str, repeat: int) -> float:
+    """
+        Returns mean latency of running line, in milliseconds
+    """
+
+    commands = syntax.parse(line).items[0][0].pipelines[0].commands
+
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        pipes.runMultipleProc(commands)
+
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(repeat: int = 100) -> dict[str, float]:
+    results = {f"{name}_ms": measure(line, repeat) for (name, line) in LINES.items()}
+
+    for name, ms in results.items():
+        print(f"{name:12} {ms:8.3f} ms")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
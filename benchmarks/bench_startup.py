@@ -0,0 +1,81 @@
+"""
+    Startup time of the shell: from exec of the interpreter to the first
+    prompt (interactive, in a pseudo terminal) and to exit of "-c true" (batch)
+
+    Run from the repository root:
+        python -m benchmarks.bench_startup
+"""
+import os
+import pty
+import sys
+import time
+import select
+import signal
+import statistics
+import subprocess
+
+
+def firstPrompt(timeout: float = 10.0) -> float:
+    """
+        Starts interactive shell in a pty and returns seconds until "$ " is printed
+    """
+
+    start = time.perf_counter()
+    pid, fd = pty.fork()
+
+    if pid == 0:
+        os.execv(sys.executable, [sys.executable, "-m", "app.main"])
+
+    output = b""
+    elapsed = None
+
+    try:
+        while time.perf_counter() - start < timeout:
+            ready, _, _ = select.select([fd], [], [], timeout)
+
+            if not ready:
+                break
+
+            try:
+                output += os.read(fd, 4096)
+            except OSError:
+                break
+
+            if b"$ " in output:
+                elapsed = time.perf_counter() - start
+                break
+    finally:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        os.close(fd)
+
+    if elapsed is None:
+        raise RuntimeError("shell didn't print a prompt")
+
+    return elapsed
+
+
+def batch() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", "app.main", "-c", "true"], check=True)
+
+    return time.perf_counter() - start
+
+
+def main(repeat: int = 10) -> dict[str, float]:
+    # the first run may write the snapshot, it's not counted
+    firstPrompt()
+
+    results = {
+            "interactive_ms": statistics.median(firstPrompt() for _ in range(repeat)) * 1000,
+            "batch_ms": statistics.median(batch() for _ in range(repeat)) * 1000,
+            }
+
+    for name, ms in results.items():
+        print(f"{name:16} {ms:8.1f} ms")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+    Completion latency: Trie.getMatchings for short prefixes over tries of
+    1k, 10k and 50k command names
+
+    Run from the repository root:
+        python -m benchmarks.bench_trie
+"""
+import random
+import string
+import time
+
+import app.trie as trie
+
+SIZES = (1000, 10000, 50000)
+
+
+def makeNames(count: int, seed: int = 0) -> list[str]:
+    """
+        Command-like names: shared prefixes (git-, python3.), digits and dashes
+    """
+
+    rng = random.Random(seed)
+    stems = ["git", "python3", "x86_64-linux-gnu", "lib", "apt", "docker", "k"]
+    names = set()
+
+    while len(names) < count:
+        stem = rng.choice(stems)
+        tail = "".join(rng.choices(string.ascii_lowercase + "-.0123456789", k=rng.randint(2, 12)))
+        names.add(stem + "-" + tail)
+
+    return sorted(names)
+
+
+def measure(size: int, repeat: int) -> float:
+    """
+        Returns mean latency of getMatchings in microseconds. Prefixes are
+        1 to 6 chars of existing names, so both huge and tiny subtrees are hit
+    """
+
+    names = makeNames(size)
+    t = trie.Trie()
+
+    for name in names:
+        t.insert(name)
+
+    rng = random.Random(1)
+    prefixes = [name[:rng.randint(1, 6)] for name in rng.sample(names, 100)]
+
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        for prefix in prefixes:
+            t.getMatchings(prefix)
+
+    return (time.perf_counter() - start) / (repeat * len(prefixes)) * 1e6
+
+
+def main(repeat: int = 5) -> dict[str, float]:
+    results = {f"getMatchings_{size // 1000}k_us": measure(size, repeat) for size in SIZES}
+
+    for name, us in results.items():
+        print(f"{name:22} {us:10.1f} us")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
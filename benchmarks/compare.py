@@ -0,0 +1,61 @@
+"""
+    Compares two result files of the benchmark suite and flags regressions
+
+    Run from the repository root:
+        python -m benchmarks.compare old.json new.json [--threshold 10]
+
+    Exit status is 1 if any metric got worse by more than threshold percent
+"""
+import argparse
+import json
+import sys
+
+
+def higherIsBetter(group: str, metric: str) -> bool:
+    # parser results are lines/sec and pipe results MB/s, everything else is latency
+    return group == "parser" or metric.endswith("MBps")
+
+
+def flatten(report: dict) -> dict[tuple[str, str], float]:
+    return {(group, metric): value
+            for (group, metrics) in report["results"].items()
+            for (metric, value) in metrics.items()}
+
+
+def main() -> int:
+    argParser = argparse.ArgumentParser(prog="python -m benchmarks.compare")
+    argParser.add_argument("old")
+    argParser.add_argument("new")
+    argParser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown, percent")
+    args = argParser.parse_args()
+
+    with open(args.old) as f:
+        old = flatten(json.load(f))
+    with open(args.new) as f:
+        new = flatten(json.load(f))
+
+    regressions = 0
+
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+
+        if before == 0:
+            continue
+
+        change = (after - before) / before * 100
+
+        # positive "worse" means slower, whatever the unit is
+        worse = -change if higherIsBetter(*key) else change
+        flag = "REGRESSION" if worse > args.threshold else ""
+        regressions += bool(flag)
+
+        print(f"{key[0]:8} {key[1]:24} {before:14.3f} {after:14.3f} {change:+8.1f}%  {flag}")
+
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key[0]:8} {key[1]:24} only in {'old' if key in old else 'new'}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import os
+import sys
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# a hang (a pipe end left open somewhere) fails the test instead of blocking the run
+TIMEOUT = 10
+
+
+def shell(command: str, cwd: str = ROOT, env: dict | None = None) -> subprocess.CompletedProcess:
+    """
+        Runs command line with "shell -c", returns finished process with text output
+    """
+
+    env = dict(os.environ, PYTHONPATH=ROOT, **(env or {}))
+
+    return subprocess.run([sys.executable, "-m", "app.main", "-c", command], cwd=cwd, env=env,
+                          stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=TIMEOUT)
+
+
+class ShellTest(unittest.TestCase):
+    """
+        Runs commands in cwd (the repository unless a test case changes it)
+    """
+    cwd = ROOT
+
+    def assertOutput(self, command: str, expected: str, status: int = 0, stderr: str | None = None):
+        result = shell(command, self.cwd)
+
+        self.assertEqual(result.stdout, expected, result.stderr)
+        self.assertEqual(result.returncode, status)
+
+        if stderr is not None:
+            self.assertEqual(result.stderr, stderr)
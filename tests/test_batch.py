@@ -0,0 +1,69 @@
+import os
+import sys
+import subprocess
+import tempfile
+import unittest
+
+from tests.shell import ROOT, TIMEOUT, ShellTest
+
+SCRIPT = """#!/usr/bin/env shell
+# a comment line
+echo a #c
+echo b#c "#q" '#s' \\#e # tail
+    # indented comment
+if true; then # after a keyword
+    echo yes # in a body
+fi
+false
+echo not reached
+"""
+
+
+def run(*args: str, stdin: str = "") -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", "app.main", *args], cwd=ROOT, input=stdin,
+                          env=dict(os.environ, PYTHONPATH=ROOT), capture_output=True, text=True,
+                          timeout=TIMEOUT)
+
+
+def runScript(text: str, *options: str) -> subprocess.CompletedProcess:
+    with tempfile.NamedTemporaryFile("w", suffix=".sh") as f:
+        f.write(text)
+        f.flush()
+
+        return run(*options, f.name)
+
+
+class ScriptTest(unittest.TestCase):
+    def test_shebang_and_comments(self):
+        result = runScript(SCRIPT)
+
+        self.assertEqual(result.stdout, "a\nb#c #q #s #e\nyes\nnot reached\n")
+        self.assertEqual(result.stderr, "")
+
+    def test_errexit(self):
+        result = runScript(SCRIPT, "-e")
+
+        self.assertEqual(result.stdout, "a\nb#c #q #s #e\nyes\n")
+        self.assertEqual(result.returncode, 1)
+
+    def test_missing_script(self):
+        result = run("/nonexistent/script.sh")
+
+        self.assertEqual(result.returncode, 127)
+
+    def test_stdin(self):
+        result = run(stdin="echo piped # c\nexit 4\n")
+
+        self.assertEqual((result.stdout, result.returncode), ("piped\n", 4))
+
+
+class CommandStringTest(ShellTest):
+    def test_lines_and_comments(self):
+        self.assertOutput("echo a # comment\n# only a comment\necho b", "a\nb\n")
+
+    def test_status(self):
+        self.assertOutput("exit 5", "", status=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from tests.shell import ROOT, TIMEOUT
+
+
+def run(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", *args], cwd=ROOT, capture_output=True, text=True, timeout=TIMEOUT)
+
+
+class SuiteTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def write(self, name: str, results: dict) -> str:
+        path = os.path.join(self.dir, name)
+
+        with open(path, "w") as f:
+            json.dump({"results": results}, f)
+
+        return path
+
+    def test_quick_run(self):
+        path = os.path.join(self.dir, "out.json")
+        result = run("benchmarks", "--quick", "-o", path, "parser")
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+        with open(path) as f:
+            report = json.load(f)
+
+        self.assertTrue(report["quick"])
+        self.assertEqual(sorted(report["results"]["parser"]), ["legacy_getArgs", "parse", "parse_cached", "scan"])
+
+    def test_compare(self):
+        old = self.write("old.json", {"parser": {"parse": 100.0}, "spawn": {"true_ms": 1.0}})
+
+        # fewer lines/sec and more milliseconds are both regressions
+        for results, status in (({"parser": {"parse": 105.0}, "spawn": {"true_ms": 0.9}}, 0),
+                                ({"parser": {"parse": 80.0}, "spawn": {"true_ms": 1.0}}, 1),
+                                ({"parser": {"parse": 100.0}, "spawn": {"true_ms": 1.5}}, 1)):
+            with self.subTest(results=results):
+                result = run("benchmarks.compare", old, self.write("new.json", results))
+
+                self.assertEqual(result.returncode, status, result.stdout)
+                self.assertEqual("REGRESSION" in result.stdout, bool(status))
+
+
+if __name__ == "__main__":
+    unittest.main()
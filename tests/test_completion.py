@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+import app.file_utils as file_utils
+import app.main as main
+
+
+class PathCompletionTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+        for name in ("alpha.txt", "alps", ".hidden", "beta"):
+            open(os.path.join(self.dir, name), "w").close()
+
+        os.mkdir(os.path.join(self.dir, "albums"))
+
+    def test_matchings(self):
+        cache = file_utils.DirCache()
+
+        self.assertEqual(list(cache.matchings(self.dir, "al")),
+                         [("albums", True), ("alpha.txt", False), ("alps", False)])
+        self.assertEqual(list(cache.matchings(self.dir, "x")), [])
+        self.assertEqual(list(cache.matchings(os.path.join(self.dir, "missing"), "")), [])
+
+    def test_listing_is_cached_until_directory_changes(self):
+        cache = file_utils.DirCache()
+        names, _ = cache.listing(self.dir)
+
+        self.assertIs(cache.listing(self.dir)[0], names)
+
+        open(os.path.join(self.dir, "gamma"), "w").close()
+        os.utime(self.dir, ns=(0, 0))  # mtime must change even on coarse clocks
+
+        self.assertIn("gamma", cache.listing(self.dir)[0])
+
+    def test_bounded(self):
+        cache = file_utils.DirCache(maxSize=1)
+        cache.listing(self.dir)
+        cache.listing(os.path.join(self.dir, "albums"))
+
+        self.assertEqual(list(cache.entries), [os.path.join(self.dir, "albums")])
+
+    def test_path_matchings(self):
+        word = self.dir + "/al"
+
+        self.assertEqual(list(main.pathMatchings(word, self.dir + "/", "al")),
+                         [f"{self.dir}/albums/", f"{self.dir}/alpha.txt ", f"{self.dir}/alps "])
+        # hidden files only when asked for
+        self.assertNotIn(f"{self.dir}/.hidden ", main.pathMatchings(self.dir + "/", self.dir + "/", ""))
+        self.assertEqual(list(main.pathMatchings(self.dir + "/.", self.dir + "/", ".")), [f"{self.dir}/.hidden "])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+
+from tests.shell import ShellTest
+
+
+class ParameterTest(ShellTest):
+    def test_references(self):
+        self.assertOutput("X=1; echo $X ${X}x \"$X\" '$X' \\$X", "1 1x 1 $X $X\n")
+        self.assertOutput("false; echo $?; true | false; echo ${PIPESTATUS[0]} ${PIPESTATUS[1]}", "1\n0 1\n")
+
+    def test_operators(self):
+        self.assertOutput("E=; echo [${E:-d}] [${E-d}] [${U-d}] [${U+a}] [${E+a}]", "[d] [] [d] [] [a]\n")
+        self.assertOutput("echo ${N:=assigned}; echo $N", "assigned\nassigned\n")
+        self.assertOutput("echo ${N:?is missing}; echo never", "", status=1)
+
+    def test_quoted_defaults(self):
+        self.assertOutput("echo ${UNSET-\"q r\"} ${X:-'a b'} ${X:-a\\ b}", "q r a b a b\n")
+        self.assertOutput("echo ${X:-\"it's\"} ${X:-'say \"hi\"'}", "it's say \"hi\"\n")
+        self.assertOutput("Y=y; echo ${Y:+\"alt $Y\"} ${X:-\"$Y\"}", "alt y y\n")
+        # inside double quotes single quotes stay, as in bash
+        self.assertOutput("echo \"${X:-'a b'}\"", "'a b'\n")
+
+    def test_substitution_in_default(self):
+        self.assertOutput("echo ${X:-$(echo sub)} ${X:-`echo bq`} \"${X:-$(echo q)}\"", "sub bq q\n")
+
+
+class SplittingTest(ShellTest):
+    def test_unquoted_values_are_split(self):
+        self.assertOutput("V='a   b'; for w in $V; do echo \"<$w>\"; done", "<a>\n<b>\n")
+        self.assertOutput("V='a   b'; for w in \"$V\"; do echo \"<$w>\"; done", "<a   b>\n")
+
+    def test_empty_values_vanish(self):
+        self.assertOutput("E=; for w in $E x \"$E\"; do echo \"<$w>\"; done", "<x>\n<>\n")
+
+    def test_assignment_is_not_split(self):
+        self.assertOutput("V='a   b'; W=$V; echo \"$W\"", "a   b\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import app.file_utils as file_utils
+
+
+def touch(path: str, mode: int) -> None:
+    with open(path, "w") as f:
+        f.write("#!/bin/sh\n")
+
+    os.chmod(path, mode)
+
+
+class ExecutableIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        self.first, self.second = os.path.join(tmp.name, "a"), os.path.join(tmp.name, "b")
+        os.mkdir(self.first)
+        os.mkdir(self.second)
+
+        touch(os.path.join(self.first, "tool"), 0o755)
+        touch(os.path.join(self.second, "tool"), 0o755)
+        touch(os.path.join(self.second, "LICENSE.txt"), 0o644)
+        os.mkdir(os.path.join(self.second, "subdir"))
+
+        self.index = file_utils.ExecutableIndex([self.first, self.second])
+
+    def test_only_executables(self):
+        self.assertEqual(self.index.names(), {"tool": os.path.join(self.first, "tool")})
+        self.assertEqual(self.index.dump()[self.second][1], ["tool"])
+        self.assertIsNone(self.index.locate("LICENSE.txt"))
+
+    def test_new_and_changed_files(self):
+        self.index.refresh()
+        touch(os.path.join(self.second, "new"), 0o755)
+        os.utime(self.second, ns=(0, 0))  # mtime must change even on coarse clocks
+
+        self.assertEqual(self.index.locate("new"), os.path.join(self.second, "new"))
+
+        # chmod +x leaves mtime of the directory as it is
+        os.chmod(os.path.join(self.second, "LICENSE.txt"), 0o755)
+
+        self.assertEqual(self.index.locate("LICENSE.txt"), os.path.join(self.second, "LICENSE.txt"))
+
+    def test_probe_before_first_scan(self):
+        self.assertFalse(self.index.ready.is_set())
+        self.assertEqual(self.index.locate("tool"), os.path.join(self.first, "tool"))
+        self.assertIsNone(self.index.locate("subdir"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from tests.shell import ShellTest
+
+
+class FilterTest(ShellTest):
+    """
+        Native cat/head/tail/wc/tee, compared with what the real programs print
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = self.tmp.name
+
+        with open(os.path.join(self.cwd, "lines"), "w") as f:
+            f.write("".join(f"line {i}\n" for i in range(1, 21)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cat(self):
+        self.assertOutput("cat lines - lines < lines | wc -l", "60\n")
+        self.assertOutput("echo piped | cat", "piped\n")
+
+    def test_head_tail(self):
+        self.assertOutput("head -n 2 lines", "line 1\nline 2\n")
+        self.assertOutput("head -3 lines | tail -n 1", "line 3\n")
+        self.assertOutput("tail -n 2 lines", "line 19\nline 20\n")
+        self.assertOutput("cat lines | tail -c 8", "line 20\n")
+
+    def test_wc(self):
+        self.assertOutput("wc -l lines", "20 lines\n")
+        self.assertOutput("cat lines | wc -w", "40\n")
+
+    def test_tee(self):
+        self.assertOutput("echo a | tee copy > /dev/null; cat copy", "a\n")
+        self.assertOutput("echo b | tee -a copy | cat; cat copy", "b\na\nb\n")
+
+    def test_errors_are_reported_in_order(self):
+        self.assertOutput("cat lines nofile lines 2>&1 | head -n 22 | tail -n 3",
+                          "line 20\ncat: nofile: No such file or directory\nline 1\n")
+
+    def test_directory_input(self):
+        for command in ("cat", "wc", "tail -n 1", "head -n 1"):
+            with self.subTest(command=command):
+                name = command.split()[0]
+                self.assertOutput(f"{command} < /; echo $?", "1\n", stderr=f"{name}: -: Is a directory\n")
+
+        self.assertOutput("cat < / | wc -l; echo ${PIPESTATUS[@]}", "0\n1 0\n")
+
+    def test_full_disk(self):
+        self.assertOutput("cat lines > /dev/full; echo $?", "1\n",
+                          stderr="cat: write error: No space left on device\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
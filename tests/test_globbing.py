@@ -0,0 +1,79 @@
+import os
+import re
+import tempfile
+import unittest
+
+import app.globbing as globbing
+from tests.shell import ShellTest
+
+
+def expand(pattern: str) -> list[str]:
+    return globbing.expand([(pattern, True)], globbing.Listings())
+
+
+class TranslateTest(unittest.TestCase):
+    def test_patterns(self):
+        for pattern, matching, other in (("*.c", "a.c", "a.h"), ("?.c", "a.c", "ab.c"), ("[!a].c", "b.c", "a.c"),
+                                         ("[]x]", "]", "y"), ("a[", "a[", "a")):
+            with self.subTest(pattern=pattern):
+                regex = re.compile(globbing.translate(pattern), re.DOTALL)
+
+                self.assertIsNotNone(regex.fullmatch(matching))
+                self.assertIsNone(regex.fullmatch(other))
+
+
+class ExpandTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+        for d in ("src/sub/deep", ".hidden"):
+            os.makedirs(d)
+
+        for name in ("a.c", "b.c", "b.h", ".dot.c", "src/m.c", "src/sub/n.c", "src/sub/deep/o.c", ".hidden/p.c"):
+            open(name, "w").close()
+
+        os.symlink("src", "link")
+
+    def test_components(self):
+        self.assertEqual(expand("*.c"), ["a.c", "b.c"])
+        self.assertEqual(expand(".*.c"), [".dot.c"])
+        self.assertEqual(expand("*/*.c"), ["link/m.c", "src/m.c"])
+        self.assertEqual(expand("*/"), ["link/", "src/"])
+        self.assertEqual(expand("nothing*"), [])
+
+    def test_recursive(self):
+        # hidden directories and symlinks to directories are not descended into
+        self.assertEqual(expand("**/*.c"), ["a.c", "b.c", "src/m.c", "src/sub/deep/o.c", "src/sub/n.c"])
+
+    def test_quoted_pieces_are_literal(self):
+        self.assertEqual(globbing.expand([("*", False), (".c", True)], globbing.Listings()), [])
+        self.assertFalse(globbing.hasMagic([("*.c", False)]))
+
+    def test_absolute(self):
+        self.assertEqual(expand(os.path.join(os.getcwd(), "*.h")), [os.path.join(os.getcwd(), "b.h")])
+
+
+class GlobTest(ShellTest):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cwd = tmp.name
+
+        for name in ("a.c", "b.c", "x y.c"):
+            open(os.path.join(tmp.name, name), "w").close()
+
+    def test_arguments(self):
+        self.assertOutput("echo *.c; echo '*'.c nomatch*", "a.c b.c x y.c\n*.c nomatch*\n")
+        self.assertOutput("for f in *.c; do echo \"<$f>\"; done", "<a.c>\n<b.c>\n<x y.c>\n")
+
+    def test_expanded_values(self):
+        self.assertOutput("P='*.c'; echo $P; echo \"$P\"", "a.c b.c x y.c\n*.c\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
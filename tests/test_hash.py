@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tests.shell import ShellTest, shell
+
+LS, CAT = shutil.which("ls"), shutil.which("cat")
+
+
+class HashTest(ShellTest):
+    def test_hits(self):
+        self.assertOutput("hash", "", stderr="hash: hash table empty\n")
+        self.assertOutput("ls > /dev/null; ls > /dev/null; hash", f"hits\tcommand\n   2\t{LS}\n")
+
+    def test_forget_and_remember(self):
+        self.assertOutput("ls > /dev/null; hash -r; hash cat; hash", f"hits\tcommand\n   0\t{CAT}\n")
+        self.assertOutput("hash nosuch; echo $?", "1\n", stderr="hash: nosuch: not found\n")
+
+    def test_path_change_forgets(self):
+        self.assertOutput("ls > /dev/null; export PATH=/nonexistent; hash", "", stderr="hash: hash table empty\n")
+
+    def test_moved_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = os.path.join(tmp, "a"), os.path.join(tmp, "b")
+            os.mkdir(first)
+            os.mkdir(second)
+
+            for d in (first, second):
+                with open(os.path.join(d, "tool"), "w") as f:
+                    f.write(f"#!/bin/sh\necho {os.path.basename(d)}\n")
+
+                os.chmod(os.path.join(d, "tool"), 0o755)
+
+            # the remembered location is gone: the command is looked up again
+            result = shell(f"tool; rm {first}/tool; tool; hash", env={"PATH": f"{first}:{second}:/usr/bin:/bin"})
+
+            self.assertEqual(result.stdout.splitlines()[:2], ["a", "b"], result.stderr)
+            self.assertIn(f"   1\t{second}/tool", result.stdout.splitlines())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import time
+import unittest
+
+from tests.shell import ROOT, ShellTest, shell
+
+
+class BackgroundTest(ShellTest):
+    def test_runs_concurrently(self):
+        started = time.monotonic()
+
+        self.assertOutput("sleep 0.5 & sleep 0.5 & sleep 0.5 & echo started; wait; echo done", "started\ndone\n")
+        self.assertLess(time.monotonic() - started, 1.4)
+
+    def test_wait_status(self):
+        self.assertOutput("sh -c 'exit 4' & wait %1; echo $?", "4\n")
+        self.assertOutput("wait %7; echo $?", "127\n", stderr="wait: %7: no such job\n")
+
+    def test_jobs(self):
+        result = shell("sleep 0.3 & jobs; wait; jobs")
+
+        self.assertEqual(result.stdout, "[1]+  Running                 sleep 0.3 &\n")
+
+    def test_isolation(self):
+        # background jobs are subshells
+        self.assertOutput("cd / & wait; pwd", f"{ROOT}\n")
+        self.assertOutput("x=1 & wait; echo \"[$x]\"", "[]\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import app.journal as journal
+from tests.shell import ShellTest
+
+
+class TailOffsetTest(unittest.TestCase):
+    def test_last_lines(self):
+        data = b"a\nb\nc\n"
+
+        self.assertEqual(data[journal.tailOffset(data, 2):], b"b\nc\n")
+        self.assertEqual(journal.tailOffset(data, 5), 0)
+        # the last line may have no newline
+        self.assertEqual(journal.tailOffset(b"a\nb", 1), 2)
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "history")
+        self.journal = journal.Journal(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_missing_file_is_empty(self):
+        self.assertEqual(self.journal.tail(10), [])
+
+    def test_append_and_tail(self):
+        self.journal.append("echo 1")
+        self.journal.extend(["echo 2", "echo 3"])
+
+        self.assertEqual(self.journal.tail(2), ["echo 2", "echo 3"])
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_rewrite(self):
+        self.journal.extend(["old 1", "old 2"])
+        self.journal.rewrite(["new"])
+
+        self.assertEqual(self.journal.tail(10), ["new"])
+
+    def test_compaction_keeps_histfilesize_lines(self):
+        with mock.patch.dict(os.environ, {"HISTFILESIZE": "5"}):
+            self.journal.extend([f"cmd {i}" for i in range(journal.COMPACT_EVERY)])
+
+        self.assertEqual(self.journal.tail(100), [f"cmd {i}" for i in range(journal.COMPACT_EVERY - 5, journal.COMPACT_EVERY)])
+
+    def test_concurrent_journals_keep_whole_lines(self):
+        other = journal.Journal(self.path)
+        self.journal.append("first")
+        other.append("second")
+        self.journal.append("third")
+
+        self.assertEqual(other.tail(10), ["first", "second", "third"])
+
+
+class HistoryFileTest(ShellTest):
+    def test_file_errors(self):
+        self.assertOutput("history -r /; echo $?", "1\n", stderr="history: /: Is a directory\n")
+        self.assertOutput("history -w /nonexistent/x; echo $?", "1\n",
+                          stderr="history: /nonexistent/x: No such file or directory\n")
+
+    def test_write_and_read(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "saved")
+
+            self.assertOutput(f"history -w {path}; history -r {path}; echo $?", "0\n")
+            self.assertTrue(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
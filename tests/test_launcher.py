@@ -0,0 +1,64 @@
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+from unittest import mock
+
+import app.launcher as launcher
+from tests.shell import ShellTest
+
+ECHO, SH = shutil.which("echo"), shutil.which("sh")
+
+
+class SpawnTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out = os.path.join(tmp.name, "out")
+
+    def run_spawn(self, argv: list[str], pgroup: int | None = None) -> int:
+        actions = [(os.POSIX_SPAWN_OPEN, 1, self.out, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644),
+                   (os.POSIX_SPAWN_DUP2, 1, 2)]
+        pid = launcher.spawn(argv[0], argv, actions, pgroup)
+        _, waitStatus = os.waitpid(pid, 0)
+
+        return launcher.exitStatus(waitStatus)
+
+    def output(self) -> str:
+        with open(self.out) as f:
+            return f.read()
+
+    def test_file_actions(self):
+        self.assertEqual(self.run_spawn([SH, "-c", "echo out; echo err >&2; exit 3"]), 3)
+        self.assertEqual(self.output(), "out\nerr\n")
+
+    def test_fork_fallback(self):
+        with mock.patch.object(launcher, "HAS_POSIX_SPAWN", False):
+            self.assertEqual(self.run_spawn([ECHO, "forked"]), 0)
+
+        self.assertEqual(self.output(), "forked\n")
+
+    def test_new_process_group(self):
+        self.run_spawn([SH, "-c", "ps -o pgid= -p $$; ps -o pgid= -p $PPID"], pgroup=0)
+        child, parent = self.output().split()
+
+        self.assertNotEqual(child, parent)
+
+    def test_sigpipe_restored(self):
+        # the shell ignores SIGPIPE, its children must not
+        self.assertEqual(self.run_spawn([SH, "-c", "kill -PIPE $$"]), 128 + signal.SIGPIPE)
+
+    def test_missing_program(self):
+        self.assertRaises(OSError, launcher.spawn, "/nonexistent", ["/nonexistent"], [])
+
+
+class ExternalCommandTest(ShellTest):
+    def test_status_and_signals(self):
+        self.assertOutput("sh -c 'exit 7'; echo $?", "7\n")
+        self.assertOutput("yes | head -2", "y\ny\n")
+        self.assertOutput("sh -c 'kill -TERM $$'; echo $?", "143\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import tempfile
+import unittest
+
+from tests.shell import ShellTest
+
+
+class LoopTest(ShellTest):
+    def test_for(self):
+        self.assertOutput("for i in a 'b c'; do echo \"<$i>\"; done", "<a>\n<b c>\n")
+
+    def test_while_until(self):
+        self.assertOutput("x=; while [ \"$x\" != aaa ]; do x=a$x; done; echo $x", "aaa\n")
+        self.assertOutput("until true; do echo never; done; echo $?", "0\n")
+
+    def test_break_continue(self):
+        self.assertOutput("for i in 1 2 3 4; do if [ $i = 2 ]; then continue; fi; "
+                          "if [ $i = 4 ]; then break; fi; echo $i; done", "1\n3\n")
+        self.assertOutput("for i in 1 2; do for j in a b; do echo $i$j; break 2; done; done", "1a\n")
+
+    def test_if(self):
+        self.assertOutput("if false; then echo a; elif true; then echo b; else echo c; fi", "b\n")
+        self.assertOutput("if false; then echo a; fi; echo $?", "0\n")
+
+    def test_body_is_expanded_every_time(self):
+        # the tree is parsed once, words are expanded on every iteration
+        self.assertOutput("x=; for i in 1 2 3; do x=$x$i; done; echo $x $i", "123 3\n")
+
+    def test_redirected_loop(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "out")
+
+            self.assertOutput(f"for i in 1 2; do echo $i; done > {path}; cat {path}", "1\n2\n")
+
+    def test_status(self):
+        self.assertOutput("while false; do :; done; echo $?", "0\n")
+        self.assertOutput("if true; then false; fi; echo $?", "1\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+import app.parser as parser
+
+
+class LexTest(unittest.TestCase):
+    def test_fast_path(self):
+        items, spans = parser.lex("ls -l|wc")
+
+        self.assertEqual(items, ["ls", "-l", "|", "wc"])
+        self.assertIsInstance(items[2], parser.Op)
+        self.assertEqual(spans, [(0, 2), (3, 5), (5, 6), (6, 8)])
+
+    def test_quotes_and_redirects(self):
+        items, spans = parser.lex("echo 'a b' x\"y\"z 2>>log >&2 &")
+
+        self.assertEqual(items[:3], ["echo", "a b", "xyz"])
+        self.assertEqual([(r.fd, r.op, r.target) for r in items[3:5]], [(2, ">>", "log"), (1, ">&", "2")])
+        self.assertIsInstance(items[5], parser.Op)
+        self.assertEqual(spans[3], (17, 23))
+
+    def test_quoted_operator_is_a_word(self):
+        items, _ = parser.lex("echo '|' \\;")
+
+        self.assertEqual(items, ["echo", "|", ";"])
+        self.assertFalse(any(isinstance(item, parser.Op) for item in items))
+
+    def test_words_needing_expansion(self):
+        _, home, pattern, quoted = parser.lex("echo $HOME *.py '*.py'")[0]
+
+        self.assertIsInstance(home.parts[0], parser.Param)
+        self.assertIsInstance(pattern.parts[0], parser.Glob)
+        self.assertEqual(quoted, "*.py")
+
+    def test_errors(self):
+        self.assertRaises(parser.ParseError, parser.lex, "echo >")
+        self.assertRaises(parser.ParseError, parser.lex, "echo ${A B}")
+
+
+class ScanTest(unittest.TestCase):
+    def test_pipeline(self):
+        tokens, background = parser.scan("cat < in | sort -r > out &")
+
+        self.assertTrue(background)
+        self.assertEqual([(t.commandName, t.args) for t in tokens], [("cat", []), ("sort", ["-r"])])
+        self.assertEqual([r.target for t in tokens for r in t.redirects], ["in", "out"])
+        self.assertTrue(all(t.literal for t in tokens))
+
+    def test_lists_are_left_to_syntax(self):
+        self.assertRaises(parser.ParseError, parser.scan, "ls; ls")
+
+    def test_cache(self):
+        self.assertIs(parser.getArgs("ls | wc"), parser.getArgs("ls | wc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
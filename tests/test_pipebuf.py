@@ -0,0 +1,73 @@
+import fcntl
+import os
+import unittest
+from unittest import mock
+
+import app.pipebuf as pipebuf
+import app.variables as variables
+from tests.shell import ShellTest, shell
+
+
+class ParseSizeTest(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(pipebuf.parseSize("65536"), 65536)
+        self.assertEqual(pipebuf.parseSize("256k"), 256 << 10)
+        self.assertEqual(pipebuf.parseSize(" 1M "), min(1 << 20, pipebuf.maxSize()))
+        self.assertEqual(pipebuf.parseSize("max"), pipebuf.maxSize())
+        self.assertEqual(pipebuf.parseSize("100g"), pipebuf.maxSize())
+
+    def test_not_a_size(self):
+        for text in ("", "k", "1.5m", "big"):
+            with self.subTest(text=text):
+                self.assertIsNone(pipebuf.parseSize(text))
+
+
+@unittest.skipIf(pipebuf.F_SETPIPE_SZ is None, "pipe size can't be changed here")
+class MakePipeTest(unittest.TestCase):
+    def pipe(self, **values: str) -> tuple[int, int]:
+        with mock.patch.dict(variables.SHELL_VARS, values):
+            r, w = pipebuf.makePipe()
+
+        self.addCleanup(os.close, r)
+        self.addCleanup(os.close, w)
+
+        return r, w
+
+    def test_default(self):
+        r, w = self.pipe()
+
+        self.assertEqual(pipebuf.capacity(w), 65536)
+        self.assertTrue(fcntl.fcntl(r, fcntl.F_GETFD) & fcntl.FD_CLOEXEC)
+
+    def test_size(self):
+        _, w = self.pipe(SHELL_PIPE_SIZE="256k")
+
+        self.assertEqual(pipebuf.capacity(w), 256 << 10)
+
+    @unittest.skipUnless(pipebuf.O_DIRECT, "no packet pipes")
+    def test_packet_mode(self):
+        r, w = self.pipe(SHELL_PIPE_MODE="packet")
+
+        os.write(w, b"first")
+        os.write(w, b"second")
+
+        # every write is a packet of its own
+        self.assertEqual(os.read(r, 100), b"first")
+        self.assertEqual(os.read(r, 100), b"second")
+
+
+class PipelineTest(ShellTest):
+    def test_buffer_size(self):
+        self.assertOutput("SHELL_PIPE_SIZE=1m; yes | head -c 3000000 | wc -c", "3000000\n")
+        self.assertOutput("SHELL_PIPE_SIZE=oops; echo a | cat", "a\n")
+
+    @unittest.skipIf(pipebuf.F_SETPIPE_SZ is None, "pipe size can't be changed here")
+    def test_size_in_time_report(self):
+        # the last column of the pipe line of "time" is the buffer size
+        report = shell("SHELL_PIPE_SIZE=256k; time yes | head -1").stderr.splitlines()
+
+        self.assertEqual(report[-1].split("\t")[-1], str(256 << 10))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import os
+import tempfile
+import unittest
+
+from tests.shell import ROOT, ShellTest
+
+
+class StageIsolationTest(ShellTest):
+    # stages of a pipeline are subshells: builtins changing the shell don't reach it
+
+    def test_shell_state(self):
+        self.assertOutput("cd / | cat; pwd", f"{ROOT}\n")
+        self.assertOutput("export ZZ=1 | cat; echo \"[$ZZ]\"", "[]\n")
+        self.assertOutput("x=1 | cat; echo \"[$x]\"", "[]\n")
+
+    def test_history(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "saved")
+
+            with open(path, "w") as f:
+                f.write("one\ntwo\n")
+
+            self.assertOutput(f"history -r {path} | cat; history", "")
+            self.assertOutput(f"history -r {path}; history", "    1 one\n    2 two\n")
+
+    def test_output(self):
+        self.assertOutput("pwd | cat", f"{ROOT}\n")
+        self.assertOutput("echo a b | wc -w", "2\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
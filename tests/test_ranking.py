@@ -0,0 +1,42 @@
+import unittest
+
+import app.ranking as ranking
+
+
+class CommandNamesTest(unittest.TestCase):
+    def test_stages(self):
+        self.assertEqual(ranking.commandNames("git log | grep fix |  wc -l"), ["git", "grep", "wc"])
+        self.assertEqual(ranking.commandNames("  "), [])
+
+
+class FrecencyTest(unittest.TestCase):
+    def test_frequent_first(self):
+        f = ranking.Frecency()
+
+        for line in ("grep a", "gzip b", "grep c"):
+            f.add(line)
+
+        self.assertEqual(f.rank(["git", "gzip", "grep"]), ["grep", "gzip", "git"])
+
+    def test_recent_beats_old(self):
+        f = ranking.Frecency(halfLife=2)
+
+        for line in ["make"] * 5 + ["cargo"] * 3:
+            f.add(line)
+
+        # 5 older uses of make have decayed below 3 latest uses of cargo
+        self.assertGreater(f.score("cargo"), f.score("make"))
+        self.assertEqual(f.rank(["make", "cargo"]), ["cargo", "make"])
+
+    def test_top_k(self):
+        f = ranking.Frecency()
+
+        for line in ("c", "c", "b"):
+            f.add(line)
+
+        self.assertEqual(f.rank(["a", "b", "c", "d"], k=1), ["c", "a", "b", "d"])
+        self.assertEqual(f.rank(["x", "y"]), ["x", "y"])
+
+
+if __name__ == "__main__":
+    unittest.main()
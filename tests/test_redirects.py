@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+import app.parser as parser
+import app.redirects as redirects
+from tests.shell import ShellTest
+
+
+class CompilePlanTest(unittest.TestCase):
+    def test_actions(self):
+        plan = redirects.compilePlan([parser.Redirect(2, ">>", "log"), parser.Redirect(1, ">&", "2"),
+                                      parser.Redirect(0, "<&", "-")])
+
+        self.assertEqual(plan, [(redirects.OPEN, 2, "log", redirects.APPEND, 0o644),
+                                (redirects.DUP2, 2, 1), (redirects.CLOSE, 0)])
+
+    def test_ambiguous(self):
+        for r in (parser.Redirect(2, ">&", "file"), parser.Redirect(1, ">", redirects.AmbiguousTarget("$EMPTY"))):
+            with self.subTest(redirect=r):
+                self.assertRaises(redirects.RedirectError, redirects.compilePlan, [r])
+
+
+class ExplainFailureTest(unittest.TestCase):
+    def test_missing_file(self):
+        plan = [(redirects.OPEN, 0, "/nonexistent/x", os.O_RDONLY, 0)]
+
+        self.assertEqual(redirects.explainFailure(plan), "/nonexistent/x: No such file or directory")
+
+    def test_descriptors(self):
+        r, w = os.pipe()
+        self.addCleanup(os.close, r)
+        self.addCleanup(os.close, w)
+
+        free = max(r, w) + 1
+
+        self.assertIsNone(redirects.explainFailure([(redirects.DUP2, w, 1), (redirects.DUP2, 1, 2)]))
+        self.assertEqual(redirects.explainFailure([(redirects.DUP2, free, 1)]), f"{free}: Bad file descriptor")
+        self.assertEqual(redirects.explainFailure([(redirects.CLOSE, w), (redirects.DUP2, w, 1)]),
+                         f"{w}: Bad file descriptor")
+
+        # a descriptor opened by the plan itself can be duplicated
+        self.assertIsNone(redirects.explainFailure([(redirects.OPEN, free, os.devnull, os.O_RDONLY, 0),
+                                                    (redirects.DUP2, free, 0)]))
+
+
+class RedirectTest(ShellTest):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cwd = tmp.name
+
+    def test_files(self):
+        self.assertOutput("echo a > f; echo b >> f; ls f nothing 2> err > out; cat f err out", "a\nb\n"
+                          "ls: cannot access 'nothing': No such file or directory\nf\n")
+        self.assertOutput("cat < f 2>&1 | wc -l", "2\n")
+
+    def test_bad_descriptor(self):
+        for command in ("ls >&3", "echo a >&3"):
+            with self.subTest(command=command):
+                self.assertOutput(f"{command}; echo $?", "1\n", stderr="3: Bad file descriptor\n")
+
+    def test_ambiguous(self):
+        self.assertOutput("ls > $EMPTY; echo $?", "1\n", stderr="$EMPTY: ambiguous redirect\n")
+        self.assertOutput("F='a b'; echo a > $F; echo $?", "1\n", stderr="$F: ambiguous redirect\n")
+        self.assertOutput("echo a > \"$EMPTY\"; echo $?", "1\n", stderr=": No such file or directory\n")
+        self.assertOutput("F='a b'; echo a > \"$F\"; cat 'a b'", "a\n")
+
+    def test_globbed_target(self):
+        self.assertOutput("touch one.txt; echo a > *.txt; cat one.txt", "a\n")
+        self.assertOutput("touch two.txt; echo a > *.txt; echo $?", "1\n", stderr="*.txt: ambiguous redirect\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import readline
+import unittest
+
+import app.search as search
+
+HISTORY = ["echo hello", "ls -la", "git status", "echo world", "grep foo bar", "git stash pop", "ls -la"]
+
+
+class EditDistanceTest(unittest.TestCase):
+    def test_distance(self):
+        self.assertEqual(search.editDistance("ehco", "echo"), 1) # swapped chars count once
+        self.assertEqual(search.editDistance("kitten", "sitting"), 3)
+        self.assertEqual(search.editDistance("", "abc"), 3)
+
+
+class HistoryIndexTest(unittest.TestCase):
+    def setUp(self):
+        readline.clear_history()
+
+        for line in HISTORY:
+            readline.add_history(line)
+
+        self.index = search.HistoryIndex()
+
+    def tearDown(self):
+        readline.clear_history()
+
+    def test_substring_oldest_first(self):
+        self.assertEqual(self.index.search("echo"), [(1, "echo hello"), (4, "echo world")])
+        # a repeated line is found once, at its latest position
+        self.assertEqual(self.index.search("-la"), [(7, "ls -la")])
+
+    def test_fuzzy_ranks_by_shared_trigrams(self):
+        self.assertEqual(self.index.search("git stauts", fuzzy=True)[0], (3, "git status"))
+
+    def test_short_typos(self):
+        self.assertEqual(self.index.search("ehco", fuzzy=True), [(4, "echo world"), (1, "echo hello")])
+        self.assertEqual(self.index.search("grpe foo", fuzzy=True), [(5, "grep foo bar")])
+
+    def test_skip_running_line(self):
+        readline.add_history("history -s -f hist")
+
+        self.assertEqual(self.index.search("hist", fuzzy=True, skip=8), [])
+        self.assertEqual(self.index.search("history", skip=8), [])
+
+    def test_follows_history(self):
+        self.index.search("echo")
+        readline.add_history("echo again")
+
+        self.assertEqual(self.index.search("again"), [(8, "echo again")])
+
+        readline.clear_history()
+        self.assertEqual(self.index.search("echo"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
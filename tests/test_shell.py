@@ -0,0 +1,50 @@
+import unittest
+
+from tests.shell import ROOT, ShellTest
+
+
+class AndOrTest(ShellTest):
+    def test_short_circuit(self):
+        self.assertOutput("true && echo a || echo b", "a\n")
+        self.assertOutput("false && echo a || echo b", "b\n")
+        self.assertOutput("false || false && echo a", "", status=1)
+
+    def test_status(self):
+        self.assertOutput("false || true; echo $?", "0\n")
+        self.assertOutput("true && false", "", status=1)
+        self.assertOutput("! false && echo negated", "negated\n")
+
+
+class SubshellTest(ShellTest):
+    def test_isolation(self):
+        self.assertOutput("( cd / ; x=1 ; export Y=2 ); pwd; echo \"[$x][$Y]\"", f"{ROOT}\n[][]\n")
+
+    def test_group_runs_in_shell(self):
+        self.assertOutput("{ cd / ; x=1; }; pwd; echo $x", "/\n1\n")
+
+    def test_exit_status(self):
+        self.assertOutput("( exit 3 ); echo $?", "3\n")
+
+    def test_group_redirect(self):
+        self.assertOutput("{ echo a; echo b; } | wc -l", "2\n")
+
+
+class CompoundStageTest(ShellTest):
+    # a forked shell must not keep ends of other pipes of the pipeline open
+
+    def test_reader_gets_eof(self):
+        self.assertOutput("pwd | ( tr a-z A-Z )", ROOT.upper() + "\n")
+        self.assertOutput("echo hi | for i in 1; do cat; done", "hi\n")
+        self.assertOutput("echo hi | { cat; }", "hi\n")
+
+    def test_writer_gets_sigpipe(self):
+        self.assertOutput("( yes ) | head -1; echo end", "y\nend\n")
+        self.assertOutput("{ yes; } | head -1", "y\n")
+        self.assertOutput("x=$( ( yes ) | head -2 ); echo $x", "y y\n")
+
+    def test_loop_in_pipeline(self):
+        self.assertOutput("for i in 1 2 3; do echo $i; done | wc -l", "3\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
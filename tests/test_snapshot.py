@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import app.file_utils as file_utils
+import app.snapshot as snapshot
+import app.trie as trie
+from tests.shell import shell
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        self.cache = os.path.join(tmp.name, "cache")
+        self.bin = os.path.join(tmp.name, "bin")
+        os.mkdir(self.bin)
+
+        self.path = f"{self.bin}{os.pathsep}{os.environ.get('PATH', '')}"
+
+        patcher = mock.patch.dict(os.environ, XDG_CACHE_HOME=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(file_utils, "PATH", self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_save_and_load(self):
+        t = trie.Trie()
+        t.insert("tool")
+
+        snapshot.save({self.bin: (1, ["tool"])}, ["cd"], t.dump())
+        snap = snapshot.load()
+
+        self.assertEqual(snap["dirs"], {self.bin: (1, ["tool"])})
+        self.assertEqual(snap["builtins"], ["cd"])
+        self.assertEqual(trie.Trie.load(snap["trie"]).dump(), t.dump())
+
+    def test_other_path(self):
+        snapshot.save({}, [], trie.Trie().dump())
+
+        with mock.patch.object(file_utils, "PATH", self.bin):
+            self.assertIsNone(snapshot.load())
+
+    def test_script_saves_refreshed_index(self):
+        # a stale snapshot: bin was empty when it was taken
+        snapshot.save({self.bin: (0, [])}, [], trie.Trie().dump())
+
+        tool = os.path.join(self.bin, "newtool")
+
+        with open(tool, "w") as f:
+            f.write("#!/bin/sh\necho new\n")
+
+        os.chmod(tool, 0o755)
+
+        env = {"PATH": self.path, "XDG_CACHE_HOME": self.cache}
+        result = shell("newtool", env=env)
+
+        self.assertEqual(result.stdout, "new\n", result.stderr)
+        self.assertEqual(snapshot.load()["dirs"][self.bin][1], ["newtool"])
+
+        # nothing has changed: the snapshot is left as it is
+        saved = os.stat(snapshot.snapshotPath()).st_mtime_ns
+        shell("newtool; echo again", env=env)
+
+        self.assertEqual(os.stat(snapshot.snapshotPath()).st_mtime_ns, saved)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import unittest
+
+import app.streams as streams
+from tests.shell import ShellTest
+
+
+class OutputStreamTest(unittest.TestCase):
+    def setUp(self):
+        self.r, self.w = os.pipe()
+
+    def tearDown(self):
+        os.close(self.r)
+
+        try:
+            os.close(self.w)
+        except OSError: pass
+
+    def test_buffered_until_flush(self):
+        out = streams.OutputStream(self.w)
+        out.write("a")
+        out.write("b\n")
+        os.set_blocking(self.r, False)
+
+        self.assertRaises(BlockingIOError, os.read, self.r, 10)
+
+        out.flush()
+        self.assertEqual(os.read(self.r, 10), b"ab\n")
+
+    def test_full_buffer_is_written(self):
+        out = streams.OutputStream(self.w)
+        out.write("x" * streams.BUFFER_SIZE)
+
+        self.assertEqual(len(os.read(self.r, streams.BUFFER_SIZE)), streams.BUFFER_SIZE)
+
+    def test_close_owned(self):
+        out = streams.OutputStream(self.w, owned=True)
+        out.write("last")
+        out.close()
+
+        self.assertEqual(os.read(self.r, 10), b"last")
+        self.assertEqual(os.read(self.r, 10), b"") # the write end is closed
+
+    def test_close_reports_write_error(self):
+        out = streams.OutputStream(os.open("/dev/full", os.O_WRONLY), owned=True)
+        out.write("lost")
+
+        with self.assertRaises(OSError):
+            out.close()
+
+        self.assertEqual(out.fd, -1) # closed anyway
+
+
+class WriteErrorTest(ShellTest):
+    def test_lone_builtin(self):
+        self.assertOutput("echo hi > /dev/full; echo $?", "1\n", stderr="echo: write error: No space left on device\n")
+
+    def test_pipeline_stage(self):
+        self.assertOutput("pwd > /dev/full | cat; echo ${PIPESTATUS[@]}", "1 0\n",
+                          stderr="pwd: write error: No space left on device\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
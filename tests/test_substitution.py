@@ -0,0 +1,34 @@
+import unittest
+
+from tests.shell import ROOT, ShellTest
+
+
+class SubstitutionTest(ShellTest):
+    def test_builtin(self):
+        self.assertOutput("echo [$(echo a b)] `pwd`", f"[a b] {ROOT}\n")
+
+    def test_pipeline_and_nesting(self):
+        self.assertOutput("echo $(echo $(echo inner) | tr a-z A-Z)", "INNER\n")
+
+    def test_status(self):
+        self.assertOutput("x=$(exit 3); echo $?", "3\n")
+
+    def test_isolation(self):
+        self.assertOutput("echo $(cd /; pwd) $(pwd)", f"/ {ROOT}\n")
+
+    def test_compound_stage(self):
+        self.assertOutput("echo $(echo sub | ( tr a-z A-Z ))", "SUB\n")
+
+    def test_splitting(self):
+        self.assertOutput("x=$(printf 'a\\n\\n\\n'); echo \"[$x]\"", "[a]\n")
+        self.assertOutput("echo \"$(printf 'a   b')\"; echo $(printf 'a   b')", "a   b\na b\n")
+
+    def test_stderr_is_not_captured(self):
+        self.assertOutput("echo $(echo err >&2) out", "out\n", stderr="err\n")
+
+    def test_writer_gets_sigpipe(self):
+        self.assertOutput("echo $(yes | head -3)", "y y y\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+
+import app.parser as parser
+import app.syntax as syntax
+
+
+def pipelines(tree: syntax.CommandList) -> list[syntax.Pipeline]:
+    return [p for andOr, _ in tree.items for p in andOr.pipelines]
+
+
+class ListTest(unittest.TestCase):
+    def test_separators(self):
+        tree = syntax.parse("echo a; echo b & echo c\necho d")
+
+        self.assertEqual([background for _, background in tree.items], [False, True, False, False])
+        self.assertEqual([p.commands[0].args for p in pipelines(tree)], [["a"], ["b"], ["c"], ["d"]])
+
+    def test_and_or(self):
+        andOr = syntax.parse("true && echo a || echo b").items[0][0]
+
+        self.assertEqual(andOr.ops, ["&&", "||"])
+        self.assertEqual(len(andOr.pipelines), 3)
+
+    def test_newline_after_operator(self):
+        andOr = syntax.parse("true &&\n\necho a").items[0][0]
+
+        self.assertEqual(andOr.ops, ["&&"])
+
+    def test_pipeline(self):
+        pipeline = syntax.parse("time ! ls | grep x | wc -l").items[0][0].pipelines[0]
+
+        self.assertTrue(pipeline.timed)
+        self.assertTrue(pipeline.negated)
+        self.assertEqual([c.commandName for c in pipeline.commands], ["ls", "grep", "wc"])
+        self.assertTrue(pipeline.simple)
+
+    def test_simple_pipeline(self):
+        andOr, background = syntax.parse("  ls -l $HOME | grep x 2> err  ").items[0]
+        ls, grep = andOr.pipelines[0].commands
+
+        self.assertFalse(background)
+        self.assertEqual(andOr.text, "ls -l $HOME | grep x 2> err")
+        self.assertFalse(ls.literal)
+        self.assertTrue(grep.literal)
+        self.assertEqual(grep.redirects[0].target, "err")
+        self.assertEqual(syntax.parse("").items, [])
+
+        # reserved words and empty stages are left to the full parser
+        self.assertIsInstance(syntax.parse("ls | { cat; }").items[0][0].pipelines[0].commands[1], syntax.Group)
+        self.assertRaises(parser.Incomplete, syntax.parse, "ls |")
+        self.assertRaises(parser.ParseError, syntax.parse, "| ls")
+
+    def test_quoted_operators_are_words(self):
+        c = syntax.parse("echo ';' '&&' \"|\"").items[0][0].pipelines[0].commands[0]
+
+        self.assertEqual(c.args, [";", "&&", "|"])
+
+
+class CompoundTest(unittest.TestCase):
+    def test_subshell_and_group(self):
+        sub, group = syntax.parse("( cd /tmp ) | { cat; } > out").items[0][0].pipelines[0].commands
+
+        self.assertIsInstance(sub, syntax.Subshell)
+        self.assertIsInstance(group, syntax.Group)
+        self.assertEqual(group.redirects[0].target, "out")
+        self.assertEqual(group.text, "{ cat; } > out")
+
+    def test_if(self):
+        node = syntax.parse("if false; then echo a; elif true; then echo b; else echo c; fi").items[0][0] \
+            .pipelines[0].commands[0]
+
+        self.assertIsInstance(node, syntax.If)
+        self.assertEqual(len(node.branches), 2)
+        self.assertIsNotNone(node.orelse)
+
+    def test_for(self):
+        node = syntax.parse("for i in a b c\ndo echo $i; done").items[0][0].pipelines[0].commands[0]
+
+        self.assertIsInstance(node, syntax.For)
+        self.assertEqual(node.name, "i")
+        self.assertEqual(node.words, ["a", "b", "c"])
+
+    def test_for_without_in(self):
+        node = syntax.parse("for i; do :; done").items[0][0].pipelines[0].commands[0]
+
+        self.assertIsNone(node.words)
+
+    def test_until(self):
+        node = syntax.parse("until false; do break; done").items[0][0].pipelines[0].commands[0]
+
+        self.assertIsInstance(node, syntax.While)
+        self.assertTrue(node.until)
+
+    def test_reserved_words_only_in_command_position(self):
+        c = syntax.parse("echo if then { done").items[0][0].pipelines[0].commands[0]
+
+        self.assertIsInstance(c, parser.Token)
+        self.assertEqual(c.args, ["if", "then", "{", "done"])
+
+    def test_trees_are_cached(self):
+        self.assertIs(syntax.parse("for i in 1 2; do echo $i; done"),
+                      syntax.parse("for i in 1 2; do echo $i; done"))
+
+
+class ErrorTest(unittest.TestCase):
+    def test_incomplete(self):
+        for source in ("if true; then", "echo a &&", "( echo a", "for i in 1 2", "echo $(ls", "while true; do :;"):
+            with self.subTest(source=source):
+                self.assertRaises(parser.Incomplete, syntax.parse, source)
+                self.assertFalse(syntax.isComplete(source))
+
+    def test_syntax_errors(self):
+        for source in (")", "echo a; }", "&& echo a", "( ) ", "if true; fi", "( ls ) -l", "for 1x in a; do :; done"):
+            with self.subTest(source=source):
+                self.assertRaises(parser.ParseError, syntax.parse, source)
+                self.assertTrue(syntax.isComplete(source))
+
+
+if __name__ == "__main__":
+    unittest.main()
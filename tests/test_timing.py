@@ -0,0 +1,45 @@
+import types
+import unittest
+
+import app.parser as parser
+import app.timing as timing
+from tests.shell import shell
+
+
+def finished(rusages, times):
+    n = len(rusages)
+
+    return types.SimpleNamespace(started=[0] * n, ended=[2 * 10**9] * n, rusages=rusages, times=times,
+                                 written=[100] * n, capacities=[65536] * n)
+
+
+class ReportTest(unittest.TestCase):
+    def test_stages(self):
+        child = types.SimpleNamespace(ru_utime=0.5, ru_stime=0.25, ru_maxrss=4000)
+        cmds = [parser.Token("sleep", ["1"]), parser.Token("echo", ["a"])]
+
+        lines = timing.report(cmds, finished([child, None], [None, (0.25, 0.0)]), 2.0).splitlines()
+
+        self.assertEqual(lines[1:5], ["real\t0m2.000s", "user\t0m0.750s", "sys\t0m0.250s", "maxrss\t4000 KB"])
+        self.assertIn("includes the shell's", lines[5])
+        self.assertEqual(lines[7].split("\t")[-2:], ["4000", "sleep 1"])
+        self.assertEqual(lines[8].split("\t")[-2:], ["-", "echo a"])
+        self.assertEqual(lines[10], "1|2\t100     \t0.0\t65536")
+
+    def test_builtin_only(self):
+        lines = timing.report([parser.Token("echo", [])], finished([None], [(0.0, 0.0)]), 0.0).splitlines()
+
+        self.assertEqual(lines[-1], "maxrss\t- KB")
+
+
+class TimeKeywordTest(unittest.TestCase):
+    def test_report_goes_to_stderr(self):
+        result = shell("time echo hi | cat")
+
+        self.assertEqual((result.stdout, result.returncode), ("hi\n", 0))
+        self.assertIn("\nreal\t", result.stderr)
+        self.assertIn("\nstage\t", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+import app.trie as trie
+
+
+def build(*words: str) -> trie.Trie:
+    t = trie.Trie()
+
+    for word in words:
+        t.insert(word)
+
+    return t
+
+
+class TrieTest(unittest.TestCase):
+    def test_prefixes(self):
+        t = build("git", "gitk", "grep", "gzip", "git-lfs")
+
+        self.assertEqual(sorted(t.iterMatchings("g")), ["git", "git-lfs", "gitk", "grep", "gzip"])
+        self.assertEqual(sorted(t.iterMatchings("git")), ["git", "git-lfs", "gitk"])
+        self.assertEqual(list(t.iterMatchings("gr")), ["grep"])
+        self.assertIsNone(t.getMatchings("x"))
+
+    def test_prefix_inside_of_label(self):
+        # "pyth" ends in the middle of the edge "python"
+        t = build("python3", "python3.13")
+
+        self.assertEqual(sorted(t.iterMatchings("pyth")), ["python3", "python3.13"])
+        self.assertEqual(t.getMatchings("pythx"), None)
+
+    def test_edges_are_compressed(self):
+        t = build("abc", "abd", "xyz")
+
+        self.assertEqual(sorted(t.root.children), ["a", "x"])
+        self.assertEqual(t.root.children["a"].label, "ab")
+        self.assertEqual(t.root.children["x"].label, "xyz")
+
+    def test_word_splitting_an_edge(self):
+        # "ab" is a word itself, ending where an edge is split
+        t = build("abc", "ab")
+
+        self.assertEqual(sorted(t.iterMatchings("a")), ["ab", "abc"])
+        self.assertEqual(list(t.iterMatchings("abc")), ["abc"])
+
+    def test_dump_and_load(self):
+        t = build("cat", "cd", "cut")
+        loaded = trie.Trie.load(t.dump())
+
+        self.assertEqual(sorted(loaded.iterMatchings("c")), ["cat", "cd", "cut"])
+        self.assertEqual(loaded.dump(), t.dump())
+
+
+if __name__ == "__main__":
+    unittest.main()
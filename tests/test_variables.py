@@ -0,0 +1,32 @@
+import unittest
+
+import app.variables as variables
+from tests.shell import ShellTest
+
+
+class StatusTest(unittest.TestCase):
+    def test_pipestatus(self):
+        variables.setStatus([1, 0, 3], [None] * 3)
+
+        self.assertEqual(variables.get("?"), "3")
+        self.assertEqual(variables.get("PIPESTATUS", "@"), "1 0 3")
+        self.assertEqual(variables.get("PIPESTATUS"), "1")
+        self.assertEqual(variables.get("PIPESTATUS", 2), "3")
+        self.assertEqual(variables.get("PIPESTATUS", 5), "")
+
+
+class PipelineStatusTest(ShellTest):
+    def test_every_stage_is_reaped(self):
+        self.assertOutput("false | true | sh -c 'exit 3'; echo $? ${PIPESTATUS[@]}", "3 1 0 3\n")
+        self.assertOutput("true | false; echo $?; echo ${PIPESTATUS[0]}", "1\n0\n")
+
+    def test_signals(self):
+        # yes is killed by SIGPIPE once head exits
+        self.assertOutput("yes | head -1 > /dev/null; echo ${PIPESTATUS[@]}", "141 0\n")
+
+    def test_negation(self):
+        self.assertOutput("! true | false; echo $? ${PIPESTATUS[@]}", "0 0 1\n")
+
+
+if __name__ == "__main__":
+    unittest.main()